@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+import numpy as np
+import pandas as pd
+from CH4MOD import CH4Flux_batch, CH4_COLUMNS, AGGREGATE_COLUMNS
+from ClimateStore import ClimateStore
+from Regional import load_manifest, save_manifest
+from ResultStore import FORMATS, open_result, open_writer, write_result
+
+# 气温文件命名规则，按站点和年份定位，例如 长沙气温2003.txt
+TAIR_PATTERN = "{Station}气温{Year}.txt"
+# 参数文件没有 Station 列时使用的站点
+DEFAULT_STATION = "长沙"
+# 参数文件必需的列（Station 可省略）
+PARAM_COLUMNS = ('GrainYield', 'SoilSand', 'OMN', 'OMS', 'WaterRegime', 'StartDay', 'EndDay', 'Year')
+# 进程池与线程池；线程池只在使用显式 Generator 的路径上使用（CH4MOD 中的 FORCING_CACHE 说明）
+EXECUTORS = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}
+# 断点目录中每个已完成分块的结果文件，合并到 output 后仍保留，删除断点目录即可重新开始
+PART_PATTERN = "part-{:06d}.npz"
+
+
+def load_tair(path):
+    # 每行一个日均气温（℃）
+    return np.loadtxt(path, dtype=float, ndmin=1).ravel()
+
+
+def season_tair(series, start, end, doy):
+    # doy=False 时与 Run.py 一致，从文件第一行起取生长季天数；
+    # doy=True 时文件为全年逐日气温，按 StartDay..EndDay 截取
+    if doy:
+        return series[start - 1:end]
+    return series[:end - start + 1]
+
+
+def validate_chunk(chunk):
+    # 读入后立即检查一个分块，出错时报告原文件行号（从 0 起，不含表头）；气温覆盖天数在 run_chunk 中检查
+    missing = [name for name in PARAM_COLUMNS if name not in chunk]
+    if missing:
+        raise ValueError(f"parameter file is missing columns {missing}")
+    bad = chunk.index[chunk[list(PARAM_COLUMNS)].isna().any(axis=1)]
+    if len(bad):
+        raise ValueError(f"rows {bad[:10].tolist()}: missing values")
+    bad = chunk.index[~chunk['WaterRegime'].isin([1, 2, 3, 4, 5])]
+    if len(bad):
+        raise ValueError(f"rows {bad[:10].tolist()}: WaterRegime must be 1-5")
+    bad = chunk.index[chunk['StartDay'] > chunk['EndDay']]
+    if len(bad):
+        raise ValueError(f"rows {bad[:10].tolist()}: StartDay is after EndDay")
+
+
+def run_chunk(chunk, pattern=TAIR_PATTERN, station=DEFAULT_STATION, doy=False, seed=None, chunk_id=0,
+              store=None, columns=None, dtype=None, aggregate=False):
+    # 一个分块内的所有行合并为一次 CH4Flux_batch 调用，返回逐日长表（Row 为原文件行号）。
+    # 给定 store（ClimateStore）时从内存映射气温库取数，否则按 pattern 读取文本文件；
+    # columns/dtype 只保留部分列并指定精度，aggregate=True 时每行只输出季节汇总（AGGREGATE_COLUMNS）
+    rows = chunk.index.to_numpy()
+    start = chunk['StartDay'].to_numpy(dtype=np.int64)
+    end = chunk['EndDay'].to_numpy(dtype=np.int64)
+    dur = end - start + 1
+    stations = chunk['Station'] if 'Station' in chunk else pd.Series(station, index=chunk.index)
+
+    tair = np.full((len(chunk), int(dur.max())), np.nan)
+    series = {}
+    for k, (st, year) in enumerate(zip(stations, chunk['Year'])):
+        if store is not None:
+            path = f"{st}/{year}"
+            t = season_tair(store.series(st, year), start[k], end[k], doy)
+        else:
+            path = pattern.format(Station=st, Year=year)
+            if path not in series:
+                series[path] = load_tair(path)
+            t = season_tair(series[path], start[k], end[k], doy)
+        if len(t) < dur[k]:
+            raise ValueError(f"row {rows[k]}: {path} covers {len(t)} of {dur[k]} days")
+        tair[k, :dur[k]] = t
+
+    rng = np.random.default_rng(None if seed is None else [seed, chunk_id])
+    result = CH4Flux_batch(start, end, chunk['WaterRegime'].to_numpy(), chunk['SoilSand'].to_numpy(),
+                           tair, chunk['OMS'].to_numpy(), chunk['OMN'].to_numpy(),
+                           chunk['GrainYield'].to_numpy(), rng=rng, columns=columns, dtype=dtype,
+                           aggregate=aggregate)
+    if aggregate:
+        return pd.DataFrame({'Row': rows, **result})
+    valid = np.arange(tair.shape[1]) < dur[:, np.newaxis]
+    out = {'Row': np.repeat(rows, dur)}
+    out.update((name, values[valid]) for name, values in result.items())
+    return pd.DataFrame(out)
+
+
+def _simulate_chunk(params, tair, seed, chunk_id, kwargs):
+    rng = np.random.default_rng(None if seed is None else [seed, chunk_id])
+    return CH4Flux_batch(params['StartDay'], params['EndDay'], params['WaterRegime'], params['SoilSand'], tair,
+                         params['OMS'], params['OMN'], params['GrainYield'], rng=rng, **kwargs)
+
+
+def simulate_rows(params, Tair, workers=None, chunk_size=1000, seed=None, executor='thread', **kwargs):
+    # 进程内的批量执行器：params 为 {列名: 数组}（GrainYield、SoilSand、OMN、OMS、WaterRegime、StartDay、EndDay），
+    # Tair 为 (行 x 日) 或一条共用序列，kwargs 传给 CH4Flux_batch。按 chunk_size 行分块，每块使用由
+    # (seed, 块号) 派生的 Generator，结果按行顺序拼接，与 workers 和 executor 无关。
+    # executor='thread' 时用线程池：CH4Flux_batch 每天对整块数组做 NumPy 运算，运算期间释放 GIL，
+    # 各线程不共享随机状态；'process' 时用进程池（需要序列化参数与结果）
+    params = {name: np.asarray(params[name]) for name in ('GrainYield', 'SoilSand', 'OMN', 'OMS', 'WaterRegime',
+                                                          'StartDay', 'EndDay')}
+    n = len(params['StartDay'])
+    Tair = np.asarray(Tair, dtype=float)
+    jobs = []
+    for k, lo in enumerate(range(0, n, chunk_size)):
+        sl = slice(lo, lo + chunk_size)
+        jobs.append(({name: values[sl] for name, values in params.items()}, Tair[sl] if Tair.ndim == 2 else Tair,
+                     seed, k, kwargs))
+    if workers == 1:
+        parts = [_simulate_chunk(*args) for args in jobs]
+    else:
+        with EXECUTORS[executor](max_workers=workers) as pool:
+            parts = list(pool.map(_simulate_chunk, *zip(*jobs)))
+    if kwargs.get('aggregate'):
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    # 逐日结果各块的列数为块内最长生长季，拼接时补 NaN
+    ndays = int((params['EndDay'] - params['StartDay']).max()) + 1
+    out = {}
+    for name in parts[0]:
+        values = np.full((n, ndays), np.nan, dtype=parts[0][name].dtype)
+        for (_, _, _, k, _), part in zip(jobs, parts):
+            values[k * chunk_size:k * chunk_size + len(part[name]), :part[name].shape[1]] = part[name]
+        out[name] = values
+    return out
+
+
+def run_batch(param_file, output, pattern=TAIR_PATTERN, station=DEFAULT_STATION, workers=None,
+              chunk_size=1000, doy=False, seed=None, store=None, columns=None, dtype=None, aggregate=False,
+              fmt=None, checkpoint=None, executor='process', progress=print):
+    # 按 chunk_size 行流式读取参数表，每块校验后分发到进程池，同时在途的分块不超过进程数的两倍，
+    # 内存占用与参数文件大小无关。store 可为 ClimateStore 或其目录，子进程各自映射同一文件；
+    # fmt 为结果格式（ResultStore.FORMATS），默认按 output 的扩展名判断。
+    # 不给 checkpoint 时分块完成即追加写入 output；给定断点目录时每块结果先写为目录中的一个文件，
+    # 并把分块号记入 manifest.json，重新运行时跳过已完成的分块（参数文件或运行选项改变时重新开始），
+    # 全部完成后按分块顺序合并到 output。executor='thread' 时用线程池代替进程池（每块使用独立的 Generator）
+    if isinstance(store, str):
+        store = ClimateStore(store)
+    kwargs = dict(pattern=pattern, station=station, doy=doy, seed=seed, store=store, columns=columns,
+                  dtype=dtype, aggregate=aggregate)
+    manifest = None
+    if checkpoint is not None:
+        manifest = open_checkpoint(checkpoint, param_file, chunk_size, kwargs)
+        finished = set(manifest['done'])
+    writer = open_writer(output, fmt) if checkpoint is None else None
+
+    t0 = time.perf_counter()
+    done = 0
+    skipped = 0
+
+    def write(k, frame, n_rows):
+        nonlocal done
+        if checkpoint is None:
+            writer.append(frame)
+        else:
+            path = os.path.join(checkpoint, PART_PATTERN.format(k))
+            # 先写临时文件再替换，中断时目录中不会留下不完整的分块
+            write_result(frame, path + '.tmp.npz')
+            os.replace(path + '.tmp.npz', path)
+            manifest['done'].append(k)
+            manifest['rows'] += n_rows
+            save_manifest(checkpoint, manifest)
+        done += n_rows
+        if progress is not None:
+            elapsed = time.perf_counter() - t0
+            progress(f"{done} rows, {done / elapsed:.1f} rows/s")
+
+    def chunks():
+        nonlocal skipped
+        for k, chunk in enumerate(pd.read_csv(param_file, chunksize=chunk_size)):
+            if checkpoint is not None and k in finished:
+                skipped += len(chunk)
+                continue
+            validate_chunk(chunk)
+            yield k, chunk
+
+    try:
+        if workers == 1:
+            for k, chunk in chunks():
+                write(k, run_chunk(chunk, chunk_id=k, **kwargs), len(chunk))
+        else:
+            limit = 2 * (workers or os.cpu_count() or 1)
+            with EXECUTORS[executor](max_workers=workers) as pool:
+                pending = {}
+                for k, chunk in chunks():
+                    pending[pool.submit(run_chunk, chunk, chunk_id=k, **kwargs)] = (k, len(chunk))
+                    if len(pending) >= limit:
+                        for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                            k_done, n_rows = pending.pop(future)
+                            write(k_done, future.result(), n_rows)
+                for future in as_completed(pending):
+                    k_done, n_rows = pending.pop(future)
+                    write(k_done, future.result(), n_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if checkpoint is not None:
+        with open_writer(output, fmt) as writer:
+            for k in sorted(manifest['done']):
+                part = open_result(os.path.join(checkpoint, PART_PATTERN.format(k)))
+                writer.append({name: part[name] for name in part.columns})
+    elapsed = time.perf_counter() - t0
+    return {'rows': done, 'skipped': skipped, 'seconds': elapsed,
+            'rows_per_s': done / elapsed if elapsed > 0 else float('inf')}
+
+
+def open_checkpoint(checkpoint, param_file, chunk_size, kwargs):
+    # 断点记录与 Regional.run_region 相同：manifest.json 中保存运行选项和已完成的分块号
+    store = kwargs['store']
+    config = {'param_file': os.path.abspath(param_file), 'size': os.path.getsize(param_file),
+              'mtime': os.path.getmtime(param_file), 'chunk_size': chunk_size,
+              **{name: value for name, value in kwargs.items() if name not in ('store', 'dtype')},
+              'store': store.path if store is not None else None,
+              'dtype': None if kwargs['dtype'] is None else np.dtype(kwargs['dtype']).name}
+    config = json.loads(json.dumps(config))
+    os.makedirs(checkpoint, exist_ok=True)
+    manifest = load_manifest(checkpoint)
+    if manifest is None or manifest['config'] != config:
+        for name in os.listdir(checkpoint):
+            if name.startswith('part-'):
+                os.remove(os.path.join(checkpoint, name))
+        manifest = {'config': config, 'done': [], 'rows': 0}
+        save_manifest(checkpoint, manifest)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按 run.csv 的每一行并行运行 CH4MOD")
+    parser.add_argument('param_file', nargs='?', default='run.csv', help="参数 CSV 文件")
+    parser.add_argument('-o', '--output', default='result_batch.txt',
+                        help="结果文件，按扩展名选择格式：.txt（制表符分隔）、.csv、.npz、.parquet，无扩展名为 npy 目录")
+    parser.add_argument('--format', choices=FORMATS, default=None, help="结果格式，默认按 --output 的扩展名判断")
+    parser.add_argument('--pattern', default=TAIR_PATTERN, help="气温文件路径模板，可用 {Station} 与 {Year}")
+    parser.add_argument('--station', default=DEFAULT_STATION, help="参数文件无 Station 列时使用的站点名")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="每个任务包含的行数")
+    parser.add_argument('--doy', action='store_true', help="气温文件为全年数据，按 StartDay..EndDay 截取")
+    parser.add_argument('--seed', type=int, default=None, help="随机数种子")
+    parser.add_argument('--climate-store', default=None, help="ClimateStore.py 生成的气温库目录，替代文本气温文件")
+    parser.add_argument('--columns', default=None,
+                        help=f"只输出这些列（逗号分隔），可选 {','.join(CH4_COLUMNS)}")
+    parser.add_argument('--float32', action='store_true', help="以 float32 保存结果")
+    parser.add_argument('--aggregate', action='store_true',
+                        help=f"每行只输出季节汇总：{','.join(AGGREGATE_COLUMNS)}")
+    parser.add_argument('--threads', action='store_true', help="用线程池代替进程池（同一种子下结果相同）")
+    parser.add_argument('--checkpoint', default=None, metavar='DIR',
+                        help="断点目录：逐块保存结果并记录进度，中断后以相同参数重新运行可从断点继续")
+    args = parser.parse_args(argv)
+    columns = args.columns.split(',') if args.columns else None
+    if columns is not None and not set(columns) <= set(CH4_COLUMNS):
+        parser.error(f"未知的列: {','.join(sorted(set(columns) - set(CH4_COLUMNS)))}")
+
+    stats = run_batch(args.param_file, args.output, pattern=args.pattern, station=args.station,
+                      workers=args.workers, chunk_size=args.chunk_size, doy=args.doy, seed=args.seed,
+                      store=args.climate_store, columns=columns, dtype=np.float32 if args.float32 else None,
+                      aggregate=args.aggregate, fmt=args.format, checkpoint=args.checkpoint,
+                      executor='thread' if args.threads else 'process')
+    if stats['skipped']:
+        print(f"跳过断点中已完成的 {stats['skipped']} 行")
+    print(f"完成 {stats['rows']} 行，用时 {stats['seconds']:.2f} s，{stats['rows_per_s']:.1f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
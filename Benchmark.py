@@ -0,0 +1,340 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from CH4MOD import (CH4Flux_day, CH4Flux_array, CH4Flux_batch, CH4_COLUMNS, EhSmthDecrease, FillWaterPtn,
+                    RiceRootBiomass, RiceRootBiomassIter)
+from BatchRun import simulate_rows
+from Cache import LRUCache
+
+# 根系生物量求解的容差（g/m2），见 CH4MOD.RiceRootBiomass
+ROOT_ABS_TOL = 1e-7
+ROOT_REL_TOL = 1e-6
+
+# 基准输出：run.csv 第一行参数 + 长沙气温2003，各水分模式和生长季长度在固定种子下的结果，
+# 由优化前的原始 CH4MOD.py（逐日 DataFrame 循环、不动点迭代求根系生物量）生成，种子和输入一并存入文件
+GOLDEN_FILE = 'golden.npz'
+GOLDEN_SEED = 2003
+GOLDEN_START = 160
+GOLDEN_CASES = [(ip, dur) for ip in (1, 2, 3, 4, 5) for dur in (90, 121)]
+# 与根系生物量无关的列只允许舍入误差；Wroot、Ebl、Ep、E 的容差由 ROOT_ABS_TOL 传播得到，见 golden_tolerance
+GOLDEN_RTOL = 1e-12
+GOLDEN_ATOL = 1e-12
+TAIR_FILE = '长沙气温2003.txt'
+BASE = dict(sand=30, OMS=1300, OMN=1600, GY=4000)
+
+
+def best_time(fn, repeat=5, number=1):
+    # 多次重复取最短耗时，返回单次调用的秒数
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def load_tair():
+    return np.loadtxt(TAIR_FILE)
+
+
+def check_root_accuracy(W=None):
+    # 将 Newton 求解与原不动点迭代逐点比较，超出容差时抛出 AssertionError
+    if W is None:
+        W = np.concatenate([[0.0], np.logspace(-3, 4, 5000)])
+    W = np.asarray(W, dtype=float)
+    ref = np.array([RiceRootBiomassIter(w) for w in W])
+    vec = RiceRootBiomass(W)
+    scl = np.array([RiceRootBiomass(w) for w in W])
+    abs_err = np.abs(vec - ref)
+    big = W >= 1
+    rel_err = abs_err[big] / ref[big]
+    assert abs_err.max() < ROOT_ABS_TOL, f"RiceRootBiomass abs error {abs_err.max():.3g}"
+    assert rel_err.max() < ROOT_REL_TOL, f"RiceRootBiomass rel error {rel_err.max():.3g}"
+    assert np.allclose(vec, scl, rtol=1e-12, atol=0), "RiceRootBiomass scalar and array paths differ"
+    return {'max_abs_err': float(abs_err.max()), 'max_rel_err': float(rel_err.max())}
+
+
+def golden_run(ip, dur, Tair, model=None):
+    # model 为提供 CH4Flux_day 的模块，默认为当前的 CH4MOD
+    np.random.seed(GOLDEN_SEED)
+    run = CH4Flux_day if model is None else model.CH4Flux_day
+    return run(GOLDEN_START, GOLDEN_START + dur - 1, ip, BASE['sand'], Tair, BASE['OMS'], BASE['OMN'], BASE['GY'])
+
+
+def load_model(path):
+    # 从文件导入另一版本的 CH4MOD（如 git show <提交>:CH4MOD.py 导出的原始版本）
+    spec = importlib.util.spec_from_file_location('CH4MOD_reference', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def update_golden(model_file, path=GOLDEN_FILE):
+    # 用 model_file 中的 CH4Flux_day 生成基准输出，同时记录种子、参数和气温，便于复现
+    model = load_model(model_file)
+    Tair = load_tair()
+    cases = {f"ip{ip}_dur{dur}": golden_run(ip, dur, Tair, model)[CH4_COLUMNS].to_numpy() for ip, dur in GOLDEN_CASES}
+    np.savez_compressed(path, seed=GOLDEN_SEED, start=GOLDEN_START, tair=Tair,
+                        params=np.array([BASE[k] for k in ('sand', 'OMS', 'OMN', 'GY')], dtype=float),
+                        source_sha256=np.array(hashlib.sha256(open(model_file, 'rb').read()).hexdigest()), **cases)
+
+
+def golden_tolerance(expected):
+    # 每个元素的绝对容差。Newton 与原不动点迭代的根系生物量相差不超过 ROOT_ABS_TOL，
+    # 只通过 CH4EmissionBbl 影响结果：|dEbl/dWr| = 0.7 ln(Tsoil) P / Wr^2（达到 0.9P 上限时为 0），
+    # Ep = P Fw min(0.55, 1 - Ebl/P) 的变化不超过 Fw |dEbl| <= |dEbl|，E = Ebl + Ep 不超过 2 |dEbl|
+    col = dict(zip(CH4_COLUMNS, expected.T))
+    tol = GOLDEN_ATOL + GOLDEN_RTOL * np.abs(expected)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where((col['Wroot'] > 0) & (col['Tsoil'] > 0),
+                         0.7 * np.abs(np.log(col['Tsoil'])) * np.abs(col['P']) / col['Wroot'] ** 2, 0.0)
+    ebl = slope * ROOT_ABS_TOL
+    for name, extra in (('Wroot', ROOT_ABS_TOL), ('Ebl', ebl), ('Ep', ebl), ('E', 2 * ebl)):
+        tol[:, CH4_COLUMNS.index(name)] += extra
+    return tol
+
+
+def check_golden(path=GOLDEN_FILE):
+    # 固定种子下 CH4Flux_day 与原始模型的基准输出逐元素比较（容差见 golden_tolerance）；
+    # 单田块 CH4Flux_batch 与 CH4Flux_day 比较；
+    # result_py.txt 中与随机数无关的列（DAT、W、Tsoil、Cr、Wroot）与当前结果比较
+    worst = 0.0
+    with np.load(path) as golden:
+        Tair = golden['tair']
+        assert int(golden['seed']) == GOLDEN_SEED and int(golden['start']) == GOLDEN_START, \
+            f"{path} was generated with other settings"
+        for ip, dur in GOLDEN_CASES:
+            expected = golden[f"ip{ip}_dur{dur}"]
+            actual = golden_run(ip, dur, Tair)[CH4_COLUMNS].to_numpy()
+            diff = np.abs(actual - expected)
+            bad = (diff > golden_tolerance(expected)) | (np.isnan(actual) != np.isnan(expected))
+            if bad.any():
+                cols = [CH4_COLUMNS[j] for j in np.flatnonzero(bad.any(axis=0))]
+                raise AssertionError(f"golden mismatch for WaterRegime {ip}, {dur} days in {cols}")
+            worst = max(worst, float(np.nanmax(diff)))
+
+            np.random.seed(GOLDEN_SEED)
+            batch = CH4Flux_batch(GOLDEN_START, GOLDEN_START + dur - 1, ip, BASE['sand'], Tair, BASE['OMS'],
+                                  BASE['OMN'], BASE['GY'])
+            batch = np.stack([batch[name][0] for name in CH4_COLUMNS], axis=1)
+            assert np.allclose(batch, actual, rtol=1e-9, atol=1e-12, equal_nan=True), \
+                f"CH4Flux_batch differs from CH4Flux_day for WaterRegime {ip}, {dur} days"
+
+    reference = pd.read_csv('result_py.txt', sep='\t')
+    np.random.seed(GOLDEN_SEED)
+    current = CH4Flux_day(160, 280, 2, BASE['sand'], Tair, BASE['OMS'], BASE['OMN'], BASE['GY'])
+    for name in ('DAT', 'W', 'Tsoil', 'Cr'):
+        assert np.allclose(current[name], reference[name], rtol=1e-12), f"result_py.txt differs in {name}"
+    assert np.allclose(current['Wroot'], reference['Wroot'], rtol=ROOT_REL_TOL, atol=ROOT_ABS_TOL), \
+        "result_py.txt differs in Wroot"
+    return {'cases': len(GOLDEN_CASES), 'max_abs_diff': worst}
+
+
+def bench_root(n=100000):
+    # 单次调用耗时：原迭代（标量）、Newton（标量）、Newton（数组，按元素折算）
+    W = np.random.default_rng(0).uniform(1, 2000, n)
+    few = [float(w) for w in W[:1000]]
+    return {
+        'iter_scalar_s': best_time(lambda: [RiceRootBiomassIter(w) for w in few]) / len(few),
+        'newton_scalar_s': best_time(lambda: [RiceRootBiomass(w) for w in few]) / len(few),
+        'newton_array_s': best_time(lambda: RiceRootBiomass(W)) / n,
+    }
+
+
+def bench_helpers():
+    few = 1000
+    return {
+        'FillWaterPtn_s': best_time(lambda: [FillWaterPtn(ip, 121, 30) for ip in (1, 2, 3, 4, 5) * (few // 5)]) / few,
+        'EhSmthDecrease_s': best_time(lambda: [EhSmthDecrease(True, eh, -20, 20, 0.1)
+                                               for eh in np.linspace(-100, 250, few)]) / few,
+    }
+
+
+def bench_day(durations=(60, 121, 180), regimes=(1, 2, 3, 4, 5)):
+    Tair = load_tair()
+    return {f"ip{ip}_dur{dur}_s": best_time(lambda: CH4Flux_day(160, 160 + dur - 1, ip, BASE['sand'], Tair,
+                                                                 BASE['OMS'], BASE['OMN'], BASE['GY']), repeat=3)
+            for ip in regimes for dur in durations}
+
+
+def bench_scenarios(regimes=(1, 2, 3, 4, 5), omn=tuple(range(0, 3000, 100))):
+    # 同一站点年份的多个管理情景（水分模式 x OMN）：不用缓存与共享驱动变量缓存的每次耗时
+    Tair = load_tair()
+
+    def run(cache):
+        for ip in regimes:
+            for value in omn:
+                CH4Flux_array(160, 280, ip, BASE['sand'], Tair, BASE['OMS'], value, BASE['GY'], cache=cache)
+    runs = len(regimes) * len(omn)
+    return {'no_cache_s': best_time(lambda: run(None), repeat=3) / runs,
+            'forcing_cache_s': best_time(lambda: run(LRUCache(maxsize=256)), repeat=3) / runs}
+
+
+def bench_batch(sizes=(1, 100, 1000, 10000), dur=121):
+    # 混合水分模式的批量计算，记录整批耗时和每田块耗时
+    Tair = load_tair()
+    out = {}
+    for n in sizes:
+        rng = np.random.default_rng(n)
+        args = (np.full(n, 160), 160 + dur - 1, rng.integers(1, 6, n), rng.uniform(5, 80, n), Tair,
+                rng.uniform(0, 3000, n), rng.uniform(0, 3000, n), rng.uniform(3000, 9000, n))
+        sec = best_time(lambda: CH4Flux_batch(*args, rng=np.random.default_rng(0)), repeat=3 if n < 10000 else 1)
+        out[f"n{n}_s"] = sec
+        out[f"n{n}_per_site_s"] = sec / n
+    return out
+
+
+def _thread_params(n, dur=121, seed=0):
+    rng = np.random.default_rng(seed)
+    params = {'StartDay': np.full(n, 160), 'EndDay': np.full(n, 160 + dur - 1), 'WaterRegime': rng.integers(1, 6, n),
+              'SoilSand': rng.uniform(5, 80, n), 'OMS': rng.uniform(0, 3000, n), 'OMN': rng.uniform(0, 3000, n),
+              'GrainYield': rng.uniform(3000, 9000, n)}
+    return params
+
+
+def check_threads(n=8, workers=4):
+    # 多个线程同时调用 CH4Flux_day（各自的 Generator）与 simulate_rows 的线程池，
+    # 结果应与同一种子下的顺序计算完全相同
+    Tair = load_tair()
+    p = _thread_params(n)
+
+    def one(k):
+        return CH4Flux_day(160, 280, int(p['WaterRegime'][k]), p['SoilSand'][k], Tair, p['OMS'][k], p['OMN'][k],
+                           p['GrainYield'][k], rng=np.random.default_rng([GOLDEN_SEED, k]))
+
+    sequential = [one(k) for k in range(n)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        threaded = list(pool.map(one, range(n)))
+    for k, (a, b) in enumerate(zip(sequential, threaded)):
+        assert np.array_equal(a, b), f"threaded CH4Flux_day differs for row {k}"
+    p = _thread_params(20 * n)
+    base = simulate_rows(p, Tair, workers=1, chunk_size=n, seed=GOLDEN_SEED)
+    other = simulate_rows(p, Tair, workers=workers, chunk_size=n, seed=GOLDEN_SEED, executor='thread')
+    for name in base:
+        assert np.array_equal(base[name], other[name], equal_nan=True), f"threaded simulate_rows differs in {name}"
+    return {'rows': n + 20 * n, 'workers': workers}
+
+
+def bench_threads(n=20000, chunk_size=2500, workers=(1, 2, 4), dur=121):
+    # 线程池与进程池的扩展性：同一批田块按 chunk_size 分块，workers=1 为顺序计算。
+    # 线程池的结果与顺序计算逐位相同（check_threads）；进程池另有启动和序列化开销
+    Tair = load_tair()
+    p = _thread_params(n, dur)
+    out = {'sequential_s': best_time(lambda: simulate_rows(p, Tair, workers=1, chunk_size=chunk_size, seed=0,
+                                                           aggregate=True), repeat=1)}
+    for w in workers[1:] if workers[0] == 1 else workers:
+        for executor in ('thread', 'process'):
+            out[f"{executor}{w}_s"] = best_time(lambda: simulate_rows(p, Tair, workers=w, chunk_size=chunk_size,
+                                                                      seed=0, executor=executor, aggregate=True),
+                                                repeat=1)
+    return out
+
+
+def bench_startup(repeat=5):
+    # 新进程的启动耗时（解释器启动 + 导入 + 运行），对应调度器大量启动短任务的场景；
+    # 同时检查导入 CH4MOD 不会连带导入 pandas
+    loaded = subprocess.run([sys.executable, '-c', "import sys, CH4MOD; print('pandas' in sys.modules)"],
+                            check=True, capture_output=True, text=True).stdout.strip()
+    assert loaded == 'False', "importing CH4MOD pulls in pandas"
+    commands = {
+        'python_s': ['-c', 'pass'],
+        'import_numpy_s': ['-c', 'import numpy'],
+        'import_CH4MOD_s': ['-c', 'import CH4MOD'],
+        'cli_aggregate_s': ['RunCLI.py', '--seed', '1'],
+        'cli_npz_s': ['RunCLI.py', '--seed', '1', '-o', os.path.join(tempfile.gettempdir(), 'ch4mod_bench.npz')],
+        'cli_text_s': ['RunCLI.py', '--seed', '1', '-o', os.path.join(tempfile.gettempdir(), 'ch4mod_bench.txt')],
+    }
+    return {name: best_time(lambda: subprocess.run([sys.executable, *args], check=True, capture_output=True),
+                            repeat=repeat)
+            for name, args in commands.items()}
+
+
+def run_all(quick=False):
+    result = {
+        'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(),
+                 'processor': platform.processor()},
+        'root_accuracy': check_root_accuracy(),
+        'golden': check_golden(),
+        'threads_check': check_threads(),
+        'RiceRootBiomass': bench_root(),
+        'helpers': bench_helpers(),
+        'startup': bench_startup(repeat=3 if quick else 5),
+    }
+    if quick:
+        result['CH4Flux_day'] = bench_day(durations=(121,), regimes=(2,))
+        result['scenarios'] = bench_scenarios(omn=(0, 1000, 2000))
+        result['CH4Flux_batch'] = bench_batch(sizes=(1, 1000))
+        result['threads'] = bench_threads(n=4000, chunk_size=500, workers=(1, 2))
+    else:
+        result['CH4Flux_day'] = bench_day()
+        result['scenarios'] = bench_scenarios()
+        result['CH4Flux_batch'] = bench_batch()
+        result['threads'] = bench_threads()
+    return result
+
+
+def compare(base, new):
+    # 逐项对比两次结果中的耗时（*_s），返回 {项目: 新/旧}
+    ratios = {}
+    for group, values in new.items():
+        if group not in base or not isinstance(values, dict):
+            continue
+        for name, sec in values.items():
+            if name.endswith('_s') and name in base[group] and base[group][name] > 0:
+                ratios[f"{group}.{name}"] = sec / base[group][name]
+    return ratios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CH4MOD 性能基准与基准输出回归检查")
+    parser.add_argument('-o', '--output', default='bench_results.json', help="结果 JSON 文件")
+    parser.add_argument('--quick', action='store_true', help="只运行少量用例")
+    parser.add_argument('--compare', metavar='BASE_JSON', help="与之前保存的结果对比耗时")
+    parser.add_argument('--check', action='store_true', help="只做精度与基准输出检查，不计时")
+    parser.add_argument('--update-golden', metavar='CH4MOD_PY',
+                        help="用指定文件中的 CH4Flux_day 重新生成 golden.npz（应为优化前的原始 CH4MOD.py）")
+    args = parser.parse_args(argv)
+
+    if args.update_golden:
+        update_golden(args.update_golden)
+        print(f"已更新 {GOLDEN_FILE}")
+        return
+    if args.check:
+        check_root_accuracy()
+        golden = check_golden()
+        print(f"基准输出检查通过: {golden['cases']} 个用例，最大差异 {golden['max_abs_diff']:.3g}")
+        threads = check_threads()
+        print(f"线程一致性检查通过: {threads['rows']} 行，{threads['workers']} 个线程")
+        return
+
+    result = run_all(quick=args.quick)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"RiceRootBiomass 精度: 最大绝对误差 {result['root_accuracy']['max_abs_err']:.3g} g/m2, "
+          f"最大相对误差 {result['root_accuracy']['max_rel_err']:.3g}")
+    print(f"基准输出检查通过: {result['golden']['cases']} 个用例，最大差异 {result['golden']['max_abs_diff']:.3g}")
+    for group in ('RiceRootBiomass', 'helpers', 'CH4Flux_day', 'scenarios', 'CH4Flux_batch', 'threads', 'startup'):
+        for name, sec in result[group].items():
+            print(f"{group}.{name}: {sec * 1e6:.3f} us")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            base = json.load(f)
+        for name, ratio in sorted(compare(base, result).items()):
+            print(f"{name}: {ratio:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
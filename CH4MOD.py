@@ -1,237 +1,716 @@
-import numpy as np
-import pandas as pd
-
-def TemperatureIndex(Q10, t_soil):
-    if t_soil > 40:
-        t_sl = 30
-    elif 30 <= t_soil < 40:
-        t_sl = 30
-    else:
-        t_sl = t_soil
-    TI = Q10 ** ((t_sl - 30) / 10)
-    return TI
-
-def ShootBiomass(t, r, W0, Wmax):
-    if W0 == 0:
-        return np.nan
-    else:
-        B = Wmax / W0 - 1
-        W = Wmax / (1 + B * np.exp(-r * t))
-    return W
-
-def EhvalueD(Eh, Eh0, EhR, OMND):
-    result = (Eh - Eh0) * EhR * (0.23 + min(1, OMND))
-    return result
-
-def FEh(Eh):
-    if Eh < -150:
-        FEh = 1
-    else:
-        FEh = np.exp(-1.7 * (1 + Eh / 150))
-    return FEh
-
-def CH4EmissionBbl(P, t_soil, Wr):
-    if Wr == 0:
-        Ebl = 0.7 * P
-    else:
-        if t_soil > 0:
-            Ebl = min(0.7 * np.log(t_soil) / Wr, 0.9) * P
-        else:
-            Ebl = 0
-    return Ebl
-
-def RiceRootBiomass(W):
-    CrtV = 1
-    WTotal = W * 1000  # mg/m^2
-    while CrtV > 0.0001:
-        CrtV = 0.212 * (WTotal ** 0.936) + W * 1000 - WTotal
-        WTotal += CrtV
-    Wroot = (WTotal / 1000) - W
-    return Wroot
-
-def CH4RiceEf(CH4RiceEfC, W, Wmax):
-    if Wmax == 0:
-        return np.nan
-    else:
-        Fp = CH4RiceEfC * (1 - (W / Wmax)) ** 0.25
-    return Fp
-
-def FillWaterPtn(PintWaterPtn, PintSDur, Sand):
-    i_L = 0
-    Cali_L = 7
-    BasicFldDays = 15
-    BasicMidDrnDays = 3
-    BasicRefldDays = 10
-    EndDrnDays = 15
-    aryWater = {'Regime': [], 'days': []}
-
-    if PintWaterPtn == 1:
-        aryWater['Regime'] = [1, 2, 1, 3, 2]
-        aryWater['days'].append(min(PintSDur, BasicFldDays + Cali_L * round(PintSDur / 40)))
-        i_L += aryWater['days'][0]
-        aryWater['days'].append(min(max(0, PintSDur - i_L), BasicMidDrnDays + int((1 - Sand / 100) * 10)))
-        i_L += aryWater['days'][1]
-        aryWater['days'].append(min(max(0, PintSDur - i_L), BasicRefldDays + 3 * round(PintSDur / 40)))
-        i_L += aryWater['days'][2]
-        aryWater['days'].append(max(max(PintSDur - i_L, 0) - EndDrnDays, 0))
-        i_L += aryWater['days'][3]
-        aryWater['days'].append(max(0, PintSDur - i_L))
-
-    elif PintWaterPtn == 2:
-        aryWater['Regime'] = [1, 2, 3, 2]
-        aryWater['days'].append(min(PintSDur, BasicFldDays + Cali_L * round(PintSDur / 40)))
-        i_L += aryWater['days'][0]
-        aryWater['days'].append(min(max(0, PintSDur - i_L), BasicMidDrnDays + int((1 - Sand / 100) * 10)))
-        i_L += aryWater['days'][1]
-        aryWater['days'].append(max(max(PintSDur - i_L, 0) - EndDrnDays, 0))
-        i_L += aryWater['days'][2]
-        aryWater['days'].append(max(0, PintSDur - i_L))
-
-    elif PintWaterPtn == 3:
-        aryWater['Regime'] = [1, 3, 2]
-        aryWater['days'].append(min(PintSDur, BasicFldDays + Cali_L * round(PintSDur / 40)))
-        i_L += aryWater['days'][0]
-        aryWater['days'].append(max(max(PintSDur - i_L, 0) - EndDrnDays, 0))
-        i_L += aryWater['days'][1]
-        aryWater['days'].append(max(0, PintSDur - i_L))
-
-    elif PintWaterPtn == 4:
-        aryWater['Regime'] = [1, 2]
-        aryWater['days'].append(max(0, PintSDur - EndDrnDays))
-        i_L += aryWater['days'][0]
-        aryWater['days'].append(max(0, PintSDur - i_L))
-
-    elif PintWaterPtn == 5:
-        aryWater['Regime'] = [3, 2]
-        aryWater['days'].append(max(0, PintSDur - EndDrnDays))
-        i_L += aryWater['days'][0]
-        aryWater['days'].append(max(0, PintSDur - i_L))
-
-    return aryWater
-
-def EhSmthDecrease(UseFormula, Eh, EhBase, EhStd, EhR):
-    EhR1 = 0.16
-    if UseFormula:
-        if Eh < EhBase:
-            Result = Eh - EhvalueD(Eh, EhBase + EhStd, 0.13, 1)
-            if Result > EhBase:
-                UseFormula = False
-                Result = (EhBase - EhStd) + 2 * EhStd * np.random.uniform()
-        else:
-            Result = Eh - EhvalueD(Eh, EhBase - EhStd, EhR1, EhR)
-            if Result < EhBase:
-                UseFormula = False
-                Result = (EhBase - EhStd) + 2 * EhStd * np.random.uniform()
-    else:
-        Result = (EhBase - EhStd) + 2 * EhStd * np.random.uniform()
-
-    return Result
-
-def CH4Flux_day(day_begin, day_end, IP, sand, Tair, OMS, OMN, GY):
-    GY *= 0.1
-    OMN *= 0.1
-    OMS *= 0.1
-    StartDate = day_begin
-    EndDate = day_end
-    DurDate = EndDate - StartDate + 1
-    result = pd.DataFrame({
-        'DAT': np.zeros(DurDate),
-        'W': np.zeros(DurDate),
-        'Wroot': np.zeros(DurDate),
-        'OMN': np.zeros(DurDate),
-        'OMS': np.zeros(DurDate),
-        'Tsoil': np.zeros(DurDate),
-        'Eh': np.zeros(DurDate),
-        'Com': np.zeros(DurDate),
-        'Cr': np.zeros(DurDate),
-        'P': np.zeros(DurDate),
-        'FEh': np.zeros(DurDate),
-        'Ebl': np.zeros(DurDate),
-        'Ep': np.zeros(DurDate),
-        'E': np.zeros(DurDate)
-    })
-
-    RiceR = 0.1 - (DurDate / 70 - 1) * 0.03
-    W0 = 20 - (DurDate / 70 - 1) * 8
-
-    Flooded = True
-    VI = 1
-    w = 0
-    SI = 0.325 + 0.0225 * sand
-    Wmax = 9.46 * GY ** 0.76
-    Eh = 250
-    EhValueInit = 250
-    aryWater = FillWaterPtn(IP, DurDate, sand)
-    WRgm = aryWater['Regime'][w]
-    WRgmDays = aryWater['days'][w]
-    Q10 = 3
-    Eh0 = 250
-    WaterC = 0.636
-    EhBase = -20
-
-    for i in range(DurDate):
-        result.loc[i, 'DAT'] = i + StartDate
-        tmp = Tair[i]
-        tsoil = 4.4 + 0.76 * tmp
-        result.loc[i, 'Tsoil'] = tsoil
-
-        TI = TemperatureIndex(Q10, tsoil)
-
-        W = ShootBiomass(t=i + 1, r=RiceR, W0=W0, Wmax=Wmax)
-        result.loc[i, 'W'] = W
-
-        Cr = 0.0018 * VI * SI * W ** 1.25
-        result.loc[i, 'Cr'] = Cr
-
-        WI = 0.49 * np.exp(3.88 * WaterC - 5.4 * (WaterC ** 2))
-        OMNC = WI * SI * TI * 0.027 * OMN
-        OMSC = WI * SI * TI * 0.003 * OMS
-        OMN -= OMNC
-        OMS -= OMSC
-        Com = OMNC + OMSC
-        result.loc[i, 'OMN'] = OMN
-        result.loc[i, 'OMS'] = OMS
-        result.loc[i, 'Com'] = Com
-        CI = 0
-
-        if WRgm == 1:
-            Eh -= EhvalueD(Eh, -1 * Eh0, 0.125 * (1 - W / Wmax) ** 4 + 0.04, OMNC)
-            WaterC = 0.636
-        elif WRgm == 2:
-            Eh -= EhvalueD(Eh, EhValueInit, 0.098 * np.exp(-0.6 * CI), 1)
-            WaterC -= EhvalueD(WaterC, 0.2, 0.1, 1)
-        elif WRgm == 3:
-            Eh = EhSmthDecrease(Flooded, Eh, EhBase, 20, 0.125 * (1 - W / Wmax) ** 4 + 0.04)
-            WaterC = 0.45 + 0.13 - 0.13 * np.random.uniform()
-
-        result.loc[i, 'Eh'] = Eh
-
-        WRgmDays -= 1
-        l = len(aryWater['Regime']) - 1
-        if WRgmDays == 0 and w < l:
-            w += 1
-            WRgm = aryWater['Regime'][w]
-            WRgmDays = aryWater['days'][w]
-
-        f = FEh(Eh)
-        CH4Production = max(0, 0.27 * f * (TI * Cr + Com))  # P
-        result.loc[i, 'FEh'] = f
-        result.loc[i, 'P'] = CH4Production
-
-        Wr = RiceRootBiomass(W)
-        result.loc[i, 'Wroot'] = Wr
-        Ebl = CH4EmissionBbl(CH4Production, tsoil, Wr)  # Ebl
-        result.loc[i, 'Ebl'] = Ebl
-
-        if CH4Production > 0:
-            CH4RiceEfC = min(0.55, 1 - Ebl / CH4Production)
-        else:
-            CH4RiceEfC = 0.55
-
-        CH4RiceEF_L = CH4RiceEf(CH4RiceEfC, W, Wmax)  # Fp
-        CH4RiceE = CH4Production * CH4RiceEF_L  # Ep
-        CH4Emission = Ebl + CH4RiceE
-        result.loc[i, 'Ep'] = CH4RiceE
-        result.loc[i, 'E'] = CH4Emission  # g/m^2 * 10 -> kg/ha
-
-    return result
\ No newline at end of file
+import json
+import time
+import numpy as np
+from Cache import LRUCache, hash_key
+
+# The empirical helpers take scalars (the per-day loops) or arrays (CH4Flux_batch, formula grids).
+# When the arguments that select a branch are scalars the original if/min code runs unchanged;
+# otherwise the same expressions are evaluated with np.where, giving identical values element-wise.
+_SCALAR = (float, int, np.generic)
+
+def TemperatureIndex(Q10, t_soil):
+    if not isinstance(t_soil, _SCALAR):
+        t_soil = np.asarray(t_soil, dtype=float)
+        # t_soil == 40 falls through to the last branch of the scalar code
+        t_sl = np.where((t_soil > 40) | ((30 <= t_soil) & (t_soil < 40)), 30, t_soil)
+        # np.float_power calls the same libm pow as the scalar ** (np.power may differ in the last bit)
+        return np.float_power(Q10, (t_sl - 30) / 10)
+    if t_soil > 40:
+        t_sl = 30
+    elif 30 <= t_soil < 40:
+        t_sl = 30
+    else:
+        t_sl = t_soil
+    TI = Q10 ** ((t_sl - 30) / 10)
+    return TI
+
+def ShootBiomass(t, r, W0, Wmax):
+    if not isinstance(W0, _SCALAR):
+        W0 = np.asarray(W0, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            B = Wmax / W0 - 1
+            return np.where(W0 == 0, np.nan, Wmax / (1 + B * np.exp(-r * t)))
+    if W0 == 0:
+        return np.nan
+    else:
+        B = Wmax / W0 - 1
+        W = Wmax / (1 + B * np.exp(-r * t))
+    return W
+
+def EhvalueD(Eh, Eh0, EhR, OMND):
+    if not isinstance(OMND, _SCALAR):
+        # np.fmin matches min(1, nan) == 1
+        return (Eh - Eh0) * EhR * (0.23 + np.fmin(1, OMND))
+    result = (Eh - Eh0) * EhR * (0.23 + min(1, OMND))
+    return result
+
+def FEh(Eh):
+    if not isinstance(Eh, _SCALAR):
+        Eh = np.asarray(Eh, dtype=float)
+        return np.where(Eh < -150, 1.0, np.exp(-1.7 * (1 + Eh / 150)))
+    if Eh < -150:
+        FEh = 1
+    else:
+        FEh = np.exp(-1.7 * (1 + Eh / 150))
+    return FEh
+
+def CH4EmissionBbl(P, t_soil, Wr):
+    if not (isinstance(t_soil, _SCALAR) and isinstance(Wr, _SCALAR)):
+        t_soil = np.asarray(t_soil, dtype=float)
+        Wr = np.asarray(Wr, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(Wr == 0, 0.7 * P,
+                            np.where(t_soil > 0, np.minimum(0.7 * np.log(t_soil) / Wr, 0.9) * P, 0.0))
+    if Wr == 0:
+        Ebl = 0.7 * P
+    else:
+        if t_soil > 0:
+            Ebl = min(0.7 * np.log(t_soil) / Wr, 0.9) * P
+        else:
+            Ebl = 0
+    return Ebl
+
+ROOT_NEWTON_STEPS = 4
+
+
+def RiceRootBiomass(W):
+    # Solves WTotal = 0.212 * WTotal ** 0.936 + W * 1000 (mg/m^2) with a fixed number of Newton
+    # steps, for a scalar or an array of W. Agrees with the fixed-point loop of
+    # RiceRootBiomassIter within 1e-7 g/m^2 absolute (1e-6 relative for W >= 1 g/m^2).
+    if isinstance(W, (float, int, np.generic)):
+        W = float(W)
+        if not W > 0:
+            return 0.0 if W == 0 else np.nan
+        W1000 = W * 1000  # mg/m^2
+        WTotal = W1000 + 0.212 * W1000 ** 0.936
+        for _ in range(ROOT_NEWTON_STEPS):
+            WTotal -= (WTotal - 0.212 * WTotal ** 0.936 - W1000) / (1 - 0.212 * 0.936 * WTotal ** -0.064)
+        return (WTotal / 1000) - W
+    W = np.asarray(W, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        W1000 = W * 1000  # mg/m^2
+        WTotal = W1000 + 0.212 * W1000 ** 0.936
+        for _ in range(ROOT_NEWTON_STEPS):
+            WTotal -= (WTotal - 0.212 * WTotal ** 0.936 - W1000) / (1 - 0.212 * 0.936 * WTotal ** -0.064)
+        return np.where(W > 0, (WTotal / 1000) - W, np.where(W == 0, 0.0, np.nan))
+
+
+def RiceRootBiomassIter(W):
+    # Original open-ended fixed-point iteration, kept as the reference for RiceRootBiomass
+    CrtV = 1
+    WTotal = W * 1000  # mg/m^2
+    while CrtV > 0.0001:
+        CrtV = 0.212 * (WTotal ** 0.936) + W * 1000 - WTotal
+        WTotal += CrtV
+    Wroot = (WTotal / 1000) - W
+    return Wroot
+
+def CH4RiceEf(CH4RiceEfC, W, Wmax):
+    # W > Wmax (never reached by ShootBiomass) gives Fp = 0 on both paths instead of a complex / nan root
+    if not (isinstance(Wmax, _SCALAR) and isinstance(W, _SCALAR)):
+        Wmax = np.asarray(Wmax, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(Wmax == 0, np.nan, CH4RiceEfC * np.float_power(np.maximum(1 - (W / Wmax), 0), 0.25))
+    if Wmax == 0:
+        return np.nan
+    else:
+        Fp = CH4RiceEfC * max(1 - (W / Wmax), 0) ** 0.25
+    return Fp
+
+def FillWaterPtn(PintWaterPtn, PintSDur, Sand):
+    i_L = 0
+    Cali_L = 7
+    BasicFldDays = 15
+    BasicMidDrnDays = 3
+    BasicRefldDays = 10
+    EndDrnDays = 15
+    aryWater = {'Regime': [], 'days': []}
+
+    if PintWaterPtn == 1:
+        aryWater['Regime'] = [1, 2, 1, 3, 2]
+        aryWater['days'].append(min(PintSDur, BasicFldDays + Cali_L * round(PintSDur / 40)))
+        i_L += aryWater['days'][0]
+        aryWater['days'].append(min(max(0, PintSDur - i_L), BasicMidDrnDays + int((1 - Sand / 100) * 10)))
+        i_L += aryWater['days'][1]
+        aryWater['days'].append(min(max(0, PintSDur - i_L), BasicRefldDays + 3 * round(PintSDur / 40)))
+        i_L += aryWater['days'][2]
+        aryWater['days'].append(max(max(PintSDur - i_L, 0) - EndDrnDays, 0))
+        i_L += aryWater['days'][3]
+        aryWater['days'].append(max(0, PintSDur - i_L))
+
+    elif PintWaterPtn == 2:
+        aryWater['Regime'] = [1, 2, 3, 2]
+        aryWater['days'].append(min(PintSDur, BasicFldDays + Cali_L * round(PintSDur / 40)))
+        i_L += aryWater['days'][0]
+        aryWater['days'].append(min(max(0, PintSDur - i_L), BasicMidDrnDays + int((1 - Sand / 100) * 10)))
+        i_L += aryWater['days'][1]
+        aryWater['days'].append(max(max(PintSDur - i_L, 0) - EndDrnDays, 0))
+        i_L += aryWater['days'][2]
+        aryWater['days'].append(max(0, PintSDur - i_L))
+
+    elif PintWaterPtn == 3:
+        aryWater['Regime'] = [1, 3, 2]
+        aryWater['days'].append(min(PintSDur, BasicFldDays + Cali_L * round(PintSDur / 40)))
+        i_L += aryWater['days'][0]
+        aryWater['days'].append(max(max(PintSDur - i_L, 0) - EndDrnDays, 0))
+        i_L += aryWater['days'][1]
+        aryWater['days'].append(max(0, PintSDur - i_L))
+
+    elif PintWaterPtn == 4:
+        aryWater['Regime'] = [1, 2]
+        aryWater['days'].append(max(0, PintSDur - EndDrnDays))
+        i_L += aryWater['days'][0]
+        aryWater['days'].append(max(0, PintSDur - i_L))
+
+    elif PintWaterPtn == 5:
+        aryWater['Regime'] = [3, 2]
+        aryWater['days'].append(max(0, PintSDur - EndDrnDays))
+        i_L += aryWater['days'][0]
+        aryWater['days'].append(max(0, PintSDur - i_L))
+
+    return aryWater
+
+def EhSmthDecrease(UseFormula, Eh, EhBase, EhStd, EhR, rng=None):
+    # rng: np.random.Generator for the random Eh draws; None uses NumPy's global random state
+    uniform = np.random.uniform if rng is None else rng.uniform
+    EhR1 = 0.16
+    if UseFormula:
+        if Eh < EhBase:
+            Result = Eh - EhvalueD(Eh, EhBase + EhStd, 0.13, 1)
+            if Result > EhBase:
+                UseFormula = False
+                Result = (EhBase - EhStd) + 2 * EhStd * uniform()
+        else:
+            Result = Eh - EhvalueD(Eh, EhBase - EhStd, EhR1, EhR)
+            if Result < EhBase:
+                UseFormula = False
+                Result = (EhBase - EhStd) + 2 * EhStd * uniform()
+    else:
+        Result = (EhBase - EhStd) + 2 * EhStd * uniform()
+
+    return Result
+
+
+CH4_COLUMNS = ['DAT', 'W', 'Wroot', 'OMN', 'OMS', 'Tsoil', 'Eh', 'Com', 'Cr', 'P', 'FEh', 'Ebl', 'Ep', 'E']
+# aggregate=True output: seasonal totals of E, Ebl and Ep (g/m^2), the day and value of the peak daily E,
+# and the OMN/OMS pools left at the end of the season
+AGGREGATE_COLUMNS = ['E', 'Ebl', 'Ep', 'PeakDAT', 'PeakE', 'OMN', 'OMS']
+
+
+# Per-day quantities that depend only on air temperature, season (start, length), GY, sand and Q10:
+# soil temperature, TemperatureIndex, ShootBiomass W, root-exudate supply Cr, RiceRootBiomass Wroot,
+# the Eh relaxation rate EhR, the plant-transport factor Fw (Fp = CH4RiceEfC * Fw) and the bubble
+# fraction Fbl (Ebl = Fbl * P). Scenarios of one site-season that only change OMN/OMS or the water
+# regime share them.
+FORCING_COLUMNS = ['DAT', 'Tsoil', 'TI', 'W', 'Cr', 'Wroot', 'EhR', 'Fw', 'Fbl']
+
+# Bounded LRUs shared by all runs in the process: FORCING_CACHE holds season forcing and FillWaterPtn
+# schedules, WATER_CACHE the daily water regimes of CH4Flux_batch by (IP, season length, sand bucket),
+# kept apart so that a batch of many sites cannot evict the season forcing.
+# They are the only module-level state the kernels touch; LRUCache is locked and the cached arrays are
+# read-only, so concurrent threads can share them. Random draws come from the rng passed to
+# CH4Flux_day/CH4Flux_array/CH4Flux_batch (np.random.Generator); without one they use NumPy's
+# global random state, which threads would interleave.
+FORCING_CACHE = LRUCache(maxsize=256)
+WATER_CACHE = LRUCache(maxsize=256)
+
+
+def _forcing(StartDate, t0, n_days, Tair, Q10, RiceR, W0, Wmax, SI, profiler=None):
+    # Scalar loop with the same helper calls as CH4Flux_day, so cached and uncached runs are bit-identical
+    rows = []
+    VI = 1
+    for i in range(n_days):
+        if profiler is not None:
+            t = time.perf_counter()
+        tsoil = 4.4 + 0.76 * Tair[i]
+        TI = TemperatureIndex(Q10, tsoil)
+        W = ShootBiomass(t=t0 + i + 1, r=RiceR, W0=W0, Wmax=Wmax)
+        Cr = 0.0018 * VI * SI * W ** 1.25
+        if Wmax == 0:
+            EhR = Fw = np.nan
+        else:
+            EhR = 0.125 * (1 - W / Wmax) ** 4 + 0.04
+            Fw = (1 - (W / Wmax)) ** 0.25
+        if profiler is not None:
+            t = profiler.lap('biomass', t)
+        Wr = RiceRootBiomass(W)
+        rows.append((i + StartDate, tsoil, TI, W, Cr, Wr, EhR, Fw, CH4EmissionBbl(1, tsoil, Wr)))
+        if profiler is not None:
+            profiler.lap('root', t)
+    return np.array(rows, dtype=float).reshape(n_days, len(FORCING_COLUMNS)).T
+
+
+def CH4Forcing(day_begin, day_end, Tair, GY, sand, Q10=3, cache=FORCING_CACHE, profiler=None):
+    # {FORCING_COLUMNS: read-only array over the season}; cache=None always recomputes
+    DurDate = int(day_end) - int(day_begin) + 1
+    tair = np.asarray(Tair[:DurDate], dtype=float)
+    if len(tair) < DurDate:
+        raise ValueError(f"Tair covers {len(tair)} days, the season needs {DurDate}")
+
+    def build():
+        RiceR = 0.1 - (DurDate / 70 - 1) * 0.03
+        W0 = 20 - (DurDate / 70 - 1) * 8
+        out = _forcing(int(day_begin), 0, DurDate, tair, Q10, RiceR, W0, 9.46 * (GY * 0.1) ** 0.76,
+                       0.325 + 0.0225 * sand, profiler)
+        out.flags.writeable = False
+        return dict(zip(FORCING_COLUMNS, out))
+
+    if cache is None:
+        return build()
+    return cache.get_or_compute(hash_key('forcing', int(day_begin), DurDate, GY, sand, Q10, tair), build)
+
+
+def WaterPattern(IP, DurDate, sand, cache=FORCING_CACHE):
+    # FillWaterPtn through the shared cache; callers must not modify the returned lists
+    if cache is None:
+        return FillWaterPtn(IP, DurDate, sand)
+    return cache.get_or_compute(('water', IP, DurDate, sand), lambda: FillWaterPtn(IP, DurDate, sand))
+
+
+class CH4State:
+    # Season state of one field between days: CH4Flux_day's loop variables plus the constants derived
+    # from the inputs. step() advances it by the given days of air temperature, so a season can be
+    # run day by day as observations arrive; to_dict()/from_dict() and save()/load() checkpoint it.
+    __slots__ = ('StartDate', 'DurDate', 'i', 'SI', 'Wmax', 'RiceR', 'W0', 'Regime', 'Days',
+                 'Q10', 'EhBase', 'w', 'WRgm', 'WRgmDays', 'Eh', 'WaterC', 'OMN', 'OMS',
+                 'Etot', 'Ebltot', 'Eptot', 'PeakE', 'PeakDAT')
+
+    def __init__(self, day_begin, day_end, IP, sand, OMS, OMN, GY, Q10=3, EhBase=-20, cache=FORCING_CACHE):
+        GY *= 0.1
+        self.StartDate = int(day_begin)
+        self.DurDate = int(day_end) - self.StartDate + 1
+        self.i = 0
+        self.SI = 0.325 + 0.0225 * sand
+        self.Wmax = 9.46 * GY ** 0.76
+        self.RiceR = 0.1 - (self.DurDate / 70 - 1) * 0.03
+        self.W0 = 20 - (self.DurDate / 70 - 1) * 8
+        aryWater = WaterPattern(IP, self.DurDate, sand, cache)
+        self.Regime = aryWater['Regime']
+        self.Days = aryWater['days']
+        self.Q10 = Q10
+        self.EhBase = EhBase
+        self.w = 0
+        self.WRgm = self.Regime[0]
+        self.WRgmDays = self.Days[0]
+        self.Eh = 250
+        self.WaterC = 0.636
+        self.OMN = OMN * 0.1
+        self.OMS = OMS * 0.1
+        self.Etot = 0.0
+        self.Ebltot = 0.0
+        self.Eptot = 0.0
+        self.PeakE = -np.inf
+        self.PeakDAT = np.nan
+
+    @property
+    def remaining(self):
+        return self.DurDate - self.i
+
+    def step(self, n_days, tair, buf=None, profiler=None, forcing=None, rng=None):
+        # Advances n_days using tair[0:n_days]; fills buf[:, :n_days] (column x day, CH4_COLUMNS order)
+        # and returns {column: view}. forcing (CH4Forcing of the whole season) replaces tair and skips
+        # the temperature/biomass stage. rng (np.random.Generator) supplies the random draws; the
+        # state itself holds no generator so that it stays serializable
+        if n_days > self.remaining:
+            raise ValueError(f"only {self.remaining} days left in the season, got {n_days}")
+        if buf is None:
+            buf = np.zeros((len(CH4_COLUMNS), n_days))
+        (DAT_, W_, Wroot_, OMN_, OMS_, Tsoil_, Eh_, Com_, Cr_, P_, FEh_, Ebl_, Ep_, E_) = buf
+        if forcing is None:
+            f_ = _forcing(self.StartDate + self.i, self.i, n_days, tair, self.Q10, self.RiceR, self.W0, self.Wmax,
+                          self.SI, profiler)
+        else:
+            f_ = np.stack([forcing[name][self.i:self.i + n_days] for name in FORCING_COLUMNS])
+        buf[[0, 5, 1, 8, 2], :n_days] = f_[[0, 1, 3, 4, 5]]
+        TIs, Crs, EhRs, Fws, Fbls = f_[[2, 4, 6, 7, 8]].tolist()
+
+        StartDate = self.StartDate + self.i
+        Flooded = True
+        w = self.w
+        SI = self.SI
+        Eh = self.Eh
+        EhValueInit = 250
+        aryWater = {'Regime': self.Regime, 'days': self.Days}
+        WRgm = self.WRgm
+        WRgmDays = self.WRgmDays
+        Eh0 = 250
+        WaterC = self.WaterC
+        OMN = self.OMN
+        OMS = self.OMS
+        EhBase = self.EhBase
+        uniform = np.random.uniform if rng is None else rng.uniform
+
+        for i in range(n_days):
+            if profiler is not None:
+                t = time.perf_counter()
+            TI = TIs[i]
+            Cr = Crs[i]
+
+            WI = 0.49 * np.exp(3.88 * WaterC - 5.4 * (WaterC ** 2))
+            OMNC = WI * SI * TI * 0.027 * OMN
+            OMSC = WI * SI * TI * 0.003 * OMS
+            OMN -= OMNC
+            OMS -= OMSC
+            Com = OMNC + OMSC
+            OMN_[i] = OMN
+            OMS_[i] = OMS
+            Com_[i] = Com
+            CI = 0
+            if profiler is not None:
+                t = profiler.lap('decomposition', t)
+                DayRgm = WRgm
+
+            if WRgm == 1:
+                Eh -= EhvalueD(Eh, -1 * Eh0, EhRs[i], OMNC)
+                WaterC = 0.636
+            elif WRgm == 2:
+                Eh -= EhvalueD(Eh, EhValueInit, 0.098 * np.exp(-0.6 * CI), 1)
+                WaterC -= EhvalueD(WaterC, 0.2, 0.1, 1)
+            elif WRgm == 3:
+                Eh = EhSmthDecrease(Flooded, Eh, EhBase, 20, EhRs[i], rng)
+                WaterC = 0.45 + 0.13 - 0.13 * uniform()
+
+            Eh_[i] = Eh
+
+            WRgmDays -= 1
+            l = len(aryWater['Regime']) - 1
+            if WRgmDays == 0 and w < l:
+                w += 1
+                WRgm = aryWater['Regime'][w]
+                WRgmDays = aryWater['days'][w]
+            if profiler is not None:
+                t = profiler.lap('eh', t)
+
+            f = FEh(Eh)
+            CH4Production = max(0, 0.27 * f * (TI * Cr + Com))  # P
+            FEh_[i] = f
+            P_[i] = CH4Production
+            if profiler is not None:
+                t = profiler.lap('production', t)
+
+            Ebl = Fbls[i] * CH4Production  # Ebl, CH4EmissionBbl
+            Ebl_[i] = Ebl
+
+            if CH4Production > 0:
+                CH4RiceEfC = min(0.55, 1 - Ebl / CH4Production)
+            else:
+                CH4RiceEfC = 0.55
+
+            CH4RiceEF_L = CH4RiceEfC * Fws[i]  # Fp, CH4RiceEf
+            CH4RiceE = CH4Production * CH4RiceEF_L  # Ep
+            CH4Emission = Ebl + CH4RiceE
+            Ep_[i] = CH4RiceE
+            E_[i] = CH4Emission  # g/m^2 * 10 -> kg/ha
+            if profiler is not None:
+                profiler.lap('emission', t)
+                if profiler.tracing:
+                    profiler.emit({'DAT': i + StartDate, 'WRgm': DayRgm, 'WaterC': WaterC, 'TI': TI, 'WI': WI,
+                                   'OMNC': OMNC, 'OMSC': OMSC, 'Eh': Eh, 'P': CH4Production, 'Fp': CH4RiceEF_L})
+
+        self.i += n_days
+        self.w = w
+        self.WRgm = WRgm
+        self.WRgmDays = WRgmDays
+        self.Eh = Eh
+        self.WaterC = WaterC
+        self.OMN = OMN
+        self.OMS = OMS
+
+        # Seasonal aggregates are merged from the rows of this step
+        E = buf[13, :n_days]
+        self.Etot += float(E.sum())
+        self.Ebltot += float(buf[11, :n_days].sum())
+        self.Eptot += float(buf[12, :n_days].sum())
+        if n_days:
+            k = int(np.argmax(np.where(np.isnan(E), -np.inf, E)))
+            if E[k] > self.PeakE:
+                self.PeakE = float(E[k])
+                self.PeakDAT = float(buf[0, k])
+        return dict(zip(CH4_COLUMNS, buf[:, :n_days]))
+
+    def aggregates(self):
+        # Every value is a Python float (OMN/OMS come out of the loop as np.float64)
+        return dict(zip(AGGREGATE_COLUMNS, map(float, (self.Etot, self.Ebltot, self.Eptot, self.PeakDAT,
+                                                       self.PeakE if self.PeakE > -np.inf else np.nan,
+                                                       self.OMN, self.OMS))))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(obj, name, state[name])
+        return obj
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def CH4Flux_array(day_begin, day_end, IP, sand, Tair, OMS, OMN, GY, as_frame=False, profiler=None,
+                  Q10=3, EhBase=-20, columns=None, dtype=None, aggregate=False, cache=FORCING_CACHE, rng=None):
+    # Fills one preallocated (column x day) float64 buffer; returns {column: view}, or a
+    # DataFrame wrapping the same buffer without copying when as_frame is set.
+    # profiler (Profiling.StageProfiler) collects per-stage timings and optional daily state.
+    # Output spec: columns keeps a subset of CH4_COLUMNS, dtype (e.g. np.float32) sets the stored
+    # precision, aggregate=True returns only {AGGREGATE_COLUMNS: value}.
+    # The season forcing and water schedule come from cache (FORCING_CACHE); cache=None, or a profiler,
+    # recomputes the forcing.
+    # Pass rng (np.random.Generator) to make the call reentrant; see FORCING_CACHE.
+    state = CH4State(day_begin, day_end, IP, sand, OMS, OMN, GY, Q10=Q10, EhBase=EhBase, cache=cache)
+    buf = np.zeros((len(CH4_COLUMNS), state.DurDate))
+    if profiler is not None:
+        profiler.runs += 1
+    # A cached forcing would skip the biomass and root stages, so profiled runs always recompute it
+    forcing = None
+    if cache is not None and profiler is None:
+        forcing = CH4Forcing(day_begin, day_end, Tair, GY, sand, Q10=Q10, cache=cache)
+    state.step(state.DurDate, Tair, buf, profiler, forcing, rng)
+    if aggregate:
+        return state.aggregates()
+
+    names = CH4_COLUMNS
+    if columns is not None or dtype is not None:
+        names = list(columns) if columns is not None else CH4_COLUMNS
+        buf = buf[[CH4_COLUMNS.index(name) for name in names]].astype(dtype or buf.dtype)
+    if as_frame:
+        # pandas is imported lazily so that numpy-only callers (RunCLI.py) start quickly
+        import pandas as pd
+        # pandas keeps a 2-D float block as (column x row), so buf.T is wrapped as-is
+        return pd.DataFrame(buf.T, columns=names, copy=False)
+    return dict(zip(names, buf))
+
+
+def CH4Flux_day(day_begin, day_end, IP, sand, Tair, OMS, OMN, GY, profiler=None, Q10=3, EhBase=-20,
+                columns=None, dtype=None, aggregate=False, cache=FORCING_CACHE, rng=None):
+    return CH4Flux_array(day_begin, day_end, IP, sand, Tair, OMS, OMN, GY, as_frame=True, profiler=profiler,
+                         Q10=Q10, EhBase=EhBase, columns=columns, dtype=dtype, aggregate=aggregate, cache=cache,
+                         rng=rng)
+
+def WaterRegimeDaily(PintWaterPtn, PintSDur, Sand):
+    # Replays the regime counter of CH4Flux_day and returns the regime of every day
+    aryWater = FillWaterPtn(PintWaterPtn, PintSDur, Sand)
+    if not aryWater['Regime']:
+        raise ValueError(f"WaterRegime must be 1-5, got {PintWaterPtn}")
+    daily = np.zeros(PintSDur, dtype=np.int8)
+    w = 0
+    l = len(aryWater['Regime']) - 1
+    WRgm = aryWater['Regime'][w]
+    WRgmDays = aryWater['days'][w]
+    for i in range(PintSDur):
+        daily[i] = WRgm
+        WRgmDays -= 1
+        if WRgmDays == 0 and w < l:
+            w += 1
+            WRgm = aryWater['Regime'][w]
+            WRgmDays = aryWater['days'][w]
+    return daily
+
+
+def _uniform(rng, noise, sites, i, k):
+    # Draws for the selected sites; pre-drawn noise is indexed as (sites, day, k)
+    if noise is None:
+        return rng.uniform(size=len(sites))
+    return noise[sites % noise.shape[0], i, k]
+
+
+def CH4Flux_batch(day_begin, day_end, IP, sand, Tair, OMS, OMN, GY, rng=None, noise=None, profiler=None,
+                  Q10=3, EhBase=-20, columns=None, dtype=None, aggregate=False, cache=WATER_CACHE):
+    # Vectorized CH4Flux_day over sites: every input is a scalar or an array of length n_sites,
+    # Tair is (n_sites x days) or one shared series. Returns {column: (n_sites x max_days)} with
+    # NaN after the end of each site's season. Only the requested columns are stored (in dtype);
+    # aggregate=True keeps no daily rows at all and returns {AGGREGATE_COLUMNS: (n_sites,)}.
+    day_begin, day_end, IP, sand, OMS, OMN, GY, Q10, EhBase = np.broadcast_arrays(
+        np.asarray(day_begin, dtype=np.int64), np.asarray(day_end, dtype=np.int64),
+        np.asarray(IP, dtype=np.int64), np.asarray(sand, dtype=float),
+        np.asarray(OMS, dtype=float), np.asarray(OMN, dtype=float), np.asarray(GY, dtype=float),
+        np.asarray(Q10, dtype=float), np.asarray(EhBase, dtype=float))
+    day_begin, day_end, IP, sand, Q10, EhBase = (np.atleast_1d(a) for a in (day_begin, day_end, IP, sand, Q10, EhBase))
+    n = len(day_begin)
+    GY = np.atleast_1d(GY) * 0.1
+    OMN = np.atleast_1d(OMN) * 0.1
+    OMS = np.atleast_1d(OMS) * 0.1
+    DurDate = day_end - day_begin + 1
+    if (DurDate < 1).any():
+        raise ValueError("StartDay must not be after EndDay")
+    ndays = int(DurDate.max())
+
+    Tair = np.asarray(Tair, dtype=float)
+    if Tair.ndim == 1:
+        Tair = Tair[np.newaxis, :]
+    if Tair.shape[0] not in (1, n):
+        raise ValueError(f"Tair has {Tair.shape[0]} rows for {n} sites")
+    if Tair.shape[1] < ndays:
+        raise ValueError(f"Tair covers {Tair.shape[1]} days, the longest season needs {ndays}")
+    Tair = np.broadcast_to(Tair[:, :ndays], (n, ndays))
+
+    if rng is None:
+        rng = np.random
+    if noise is not None:
+        noise = np.asarray(noise, dtype=float)
+        if noise.ndim != 3 or noise.shape[0] not in (1, n) or noise.shape[1] < ndays:
+            raise ValueError("noise must have shape (n_sites or 1, days, 2)")
+
+    # Daily water regime for every distinct (IP, DurDate, sand bucket). FillWaterPtn only reads sand as
+    # int((1 - Sand / 100) * 10) in regimes 1 and 2, so sites in one bucket share the schedule of its
+    # first site; cache (WATER_CACHE) keeps the schedules between calls, cache=None recomputes them
+    bucket = np.where((IP == 1) | (IP == 2), np.trunc((1 - sand / 100) * 10), 0.0)
+    keys, first, inverse = np.unique(np.stack([IP, DurDate, bucket]), axis=1, return_index=True,
+                                     return_inverse=True)
+    table = np.zeros((keys.shape[1], ndays), dtype=np.int8)
+    for k in range(keys.shape[1]):
+        dur = int(keys[1, k])
+        args = (int(keys[0, k]), dur, float(sand[first[k]]))
+
+        def build():
+            daily = WaterRegimeDaily(*args)
+            daily.flags.writeable = False
+            return daily
+        table[k, :dur] = build() if cache is None else cache.get_or_compute(('daily', args[0], dur, keys[2, k]), build)
+    regime = table[inverse.ravel()]
+
+    RiceR = 0.1 - (DurDate / 70 - 1) * 0.03
+    W0 = 20 - (DurDate / 70 - 1) * 8
+    VI = 1
+    SI = 0.325 + 0.0225 * sand
+    Wmax = 9.46 * GY ** 0.76
+    Eh = np.full(n, 250.0)
+    EhValueInit = 250
+    Eh0 = 250
+    WaterC = np.full(n, 0.636)
+    EhStd = 20
+
+    # Unselected columns are written to a single scratch row (zero stride over days)
+    names = [] if aggregate else list(columns) if columns is not None else CH4_COLUMNS
+    buf = np.empty((len(names), ndays, n), dtype=dtype or float)
+    sink = np.lib.stride_tricks.as_strided(np.empty(n), (ndays, n), (0, 8))
+    col = dict.fromkeys(CH4_COLUMNS, sink)
+    col.update(zip(names, buf))
+    # The forcing stage (FORCING_COLUMNS) runs once per distinct site-season (start, length, GY, sand,
+    # Q10, Tair) and is gathered to the scenarios sharing it
+    if Tair.strides[0] == 0:
+        tair_id = np.zeros(n)
+    else:
+        rows = np.ascontiguousarray(Tair)
+        _, tair_id = np.unique(rows.view(np.dtype((np.void, rows.itemsize * ndays))).ravel(), return_inverse=True)
+    site = np.column_stack([day_begin, DurDate, GY, sand, Q10, tair_id])
+    _, first, shared = np.unique(site, axis=0, return_index=True, return_inverse=True)
+    if 2 * len(first) <= n:
+        shared = shared.ravel()
+        Tair_s, Q10_s, RiceR_s, Wmax_s, SI_s = (a[first] for a in (Tair, Q10, RiceR, Wmax, SI))
+    else:
+        shared = None
+        Tair_s, Q10_s, RiceR_s, Wmax_s, SI_s = Tair, Q10, RiceR, Wmax, SI
+    if aggregate:
+        Etot, Ebltot, Eptot = np.zeros(n), np.zeros(n), np.zeros(n)
+        PeakE, PeakDAT = np.full(n, -np.inf), np.full(n, np.nan)
+        OMNend, OMSend = OMN.copy(), OMS.copy()
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        B = np.where(W0 == 0, np.nan, Wmax / W0 - 1)
+        B_s = B if shared is None else B[first]
+        if profiler is not None:
+            profiler.runs += 1
+        for i in range(ndays):
+            if profiler is not None:
+                t = time.perf_counter()
+            active = i < DurDate
+            col['DAT'][i] = i + day_begin
+            tsoil = 4.4 + 0.76 * Tair_s[:, i]
+            t_sl = np.where((tsoil > 40) | ((tsoil >= 30) & (tsoil < 40)), 30, tsoil)
+            TI = Q10_s ** ((t_sl - 30) / 10)
+            W = Wmax_s / (1 + B_s * np.exp(-RiceR_s * (i + 1)))
+            Cr = 0.0018 * VI * SI_s * W ** 1.25
+            EhR = 0.125 * (1 - W / Wmax_s) ** 4 + 0.04
+            Fw = np.where(Wmax_s == 0, np.nan, (1 - (W / Wmax_s)) ** 0.25)
+            if profiler is not None:
+                t = profiler.lap('biomass', t)
+            Wr = RiceRootBiomass(W)
+            Fbl = np.where(Wr == 0, 0.7, np.where(tsoil > 0, np.minimum(0.7 * np.log(tsoil) / Wr, 0.9), 0))
+            if shared is not None:
+                tsoil, TI, W, Cr, EhR, Fw, Wr, Fbl = (a[shared] for a in (tsoil, TI, W, Cr, EhR, Fw, Wr, Fbl))
+            col['Tsoil'][i] = tsoil
+            col['W'][i] = W
+            col['Cr'][i] = Cr
+            col['Wroot'][i] = Wr
+            if profiler is not None:
+                t = profiler.lap('root', t)
+
+            WI = 0.49 * np.exp(3.88 * WaterC - 5.4 * (WaterC ** 2))
+            OMNC = WI * SI * TI * 0.027 * OMN
+            OMSC = WI * SI * TI * 0.003 * OMS
+            OMN = OMN - OMNC
+            OMS = OMS - OMSC
+            Com = OMNC + OMSC
+            col['OMN'][i] = OMN
+            col['OMS'][i] = OMS
+            col['Com'][i] = Com
+            if profiler is not None:
+                t = profiler.lap('decomposition', t)
+
+            WRgm = regime[:, i]
+            r1 = WRgm == 1
+            Eh[r1] -= (Eh[r1] - -1 * Eh0) * EhR[r1] * (0.23 + np.fmin(1, OMNC[r1]))
+            WaterC[r1] = 0.636
+            r2 = WRgm == 2
+            Eh[r2] -= (Eh[r2] - EhValueInit) * (0.098 * np.exp(-0.6 * 0)) * (0.23 + 1)
+            WaterC[r2] -= (WaterC[r2] - 0.2) * 0.1 * (0.23 + 1)
+            r3 = np.flatnonzero((WRgm == 3) & active)
+            if len(r3):
+                Eh3 = Eh[r3]
+                Base3 = EhBase[r3]
+                low = Eh3 < Base3
+                res = np.where(low,
+                               Eh3 - (Eh3 - (Base3 + EhStd)) * 0.13 * (0.23 + 1),
+                               Eh3 - (Eh3 - (Base3 - EhStd)) * 0.16 * (0.23 + np.fmin(1, EhR[r3])))
+                cross = np.flatnonzero(np.where(low, res > Base3, res < Base3))
+                if len(cross):
+                    res[cross] = (Base3[cross] - EhStd) + 2 * EhStd * _uniform(rng, noise, r3[cross], i, 0)
+                Eh[r3] = res
+                WaterC[r3] = 0.45 + 0.13 - 0.13 * _uniform(rng, noise, r3, i, 1)
+            col['Eh'][i] = Eh
+            if profiler is not None:
+                t = profiler.lap('eh', t)
+
+            f = np.where(Eh < -150, 1.0, np.exp(-1.7 * (1 + Eh / 150)))
+            P = np.fmax(0, 0.27 * f * (TI * Cr + Com))
+            col['FEh'][i] = f
+            col['P'][i] = P
+            if profiler is not None:
+                t = profiler.lap('production', t)
+
+            Ebl = Fbl * P
+            col['Ebl'][i] = Ebl
+
+            CH4RiceEfC = np.where(P > 0, np.fmin(0.55, 1 - Ebl / P), 0.55)
+            Fp = CH4RiceEfC * Fw
+            Ep = P * Fp
+            col['Ep'][i] = Ep
+            E = Ebl + Ep
+            col['E'][i] = E
+            if aggregate:
+                Etot += np.where(active, E, 0)
+                Ebltot += np.where(active, Ebl, 0)
+                Eptot += np.where(active, Ep, 0)
+                peak = active & (E > PeakE)
+                PeakE[peak] = E[peak]
+                PeakDAT[peak] = i + day_begin[peak]
+                OMNend[active] = OMN[active]
+                OMSend[active] = OMS[active]
+            if profiler is not None:
+                profiler.lap('emission', t)
+                if profiler.tracing:
+                    profiler.emit({'DAT': i + day_begin, 'WRgm': WRgm.copy(), 'WaterC': WaterC.copy(), 'TI': TI,
+                                   'WI': WI, 'OMNC': OMNC, 'OMSC': OMSC, 'Eh': Eh.copy(), 'P': P, 'Fp': Fp})
+
+    if aggregate:
+        PeakE[np.isinf(PeakE)] = np.nan
+        return dict(zip(AGGREGATE_COLUMNS, (Etot, Ebltot, Eptot, PeakDAT, PeakE, OMNend, OMSend)))
+    buf[:, np.arange(ndays)[:, np.newaxis] >= DurDate] = np.nan
+    return {name: values.T for name, values in zip(names, buf)}
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def hash_key(*parts):
+    # 参数与数组内容的 SHA-256 摘要；数组按 dtype、形状和原始字节计入
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.generic):
+            part = part.item()
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            h.update(b'b')
+            h.update(part)
+        elif isinstance(part, (np.ndarray, list, tuple)) or hasattr(part, '__array__'):
+            arr = np.ascontiguousarray(part)
+            h.update(f"a{arr.dtype.str}{arr.shape}".encode())
+            h.update(arr.tobytes())
+        else:
+            h.update(f"r{part!r}".encode())
+        h.update(b'|')
+    return h.hexdigest()
+
+
+class LRUCache:
+    # 容量有限的 LRU 缓存，超出 maxsize 时淘汰最久未使用的条目；可在多线程间共享
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, fn):
+        # 计算在锁外进行，同一键并发未命中时可能重复计算，但结果一致
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._data), 'maxsize': self.maxsize}
@@ -0,0 +1,156 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from CH4MOD import CH4Flux_batch
+from Cache import LRUCache
+
+# 可率定参数及默认搜索范围；Q10 与 EhBase 为 CH4Flux_day 中原先写死的常数（默认 3 和 -20）
+BOUNDS = {
+    'GrainYield': (2000.0, 12000.0),
+    'OMN': (0.0, 5000.0),
+    'OMS': (0.0, 5000.0),
+    'SoilSand': (0.0, 100.0),
+    'Q10': (1.5, 5.0),
+    'EhBase': (-100.0, 50.0),
+}
+
+# 不参与率定的参数取 run.csv 样例值
+DEFAULTS = {'GrainYield': 4000.0, 'OMN': 1600.0, 'OMS': 1300.0, 'SoilSand': 30.0, 'Q10': 3.0, 'EhBase': -20.0}
+
+
+def align_observed(observed, day_begin, day_end):
+    # 观测值可以是与生长季等长的序列（缺测为 NaN），也可以是含 DAT 和 E 列的表
+    DurDate = day_end - day_begin + 1
+    if isinstance(observed, pd.DataFrame):
+        obs = np.full(DurDate, np.nan)
+        day = observed['DAT'].to_numpy(dtype=np.int64) - day_begin
+        keep = (day >= 0) & (day < DurDate)
+        obs[day[keep]] = observed['E'].to_numpy(dtype=float)[keep]
+        return obs
+    obs = np.asarray(observed, dtype=float)
+    if len(obs) != DurDate:
+        raise ValueError(f"observed has {len(obs)} values for a {DurDate}-day season")
+    return obs
+
+
+def _simulate(X, names, day_begin, day_end, IP, Tair, noise):
+    p = dict(DEFAULTS)
+    p.update(zip(names, X.T))
+    n = len(X)
+    result = CH4Flux_batch(np.full(n, day_begin), day_end, IP, p['SoilSand'], Tair, p['OMS'], p['OMN'],
+                           p['GrainYield'], noise=noise, Q10=p['Q10'], EhBase=p['EhBase'], columns=['E'])
+    return result['E']
+
+
+def _rmse(X, names, day_begin, day_end, IP, Tair, noise, obs):
+    E = _simulate(X, names, day_begin, day_end, IP, Tair, noise)
+    seen = ~np.isnan(obs)
+    return np.sqrt(np.mean((E[:, seen] - obs[seen]) ** 2, axis=1))
+
+
+class Calibrator:
+    # 以逐日 E 的均方根误差为目标，用差分进化（DE/rand/1/bin）率定 fit 中的参数。
+    # 每一代的候选参数合并为一次 CH4Flux_batch 调用，workers != 1 时再按 chunk_size 分到进程池；
+    # 目标函数按参数值记忆化，所有候选共用同一组随机扰动（由 seed 决定），使目标函数确定。
+
+    def __init__(self, day_begin, day_end, IP, Tair, observed, fit=('OMN', 'OMS'), fixed=None, bounds=None,
+                 seed=0, workers=1, chunk_size=2000, cache_size=100000):
+        self.day_begin = int(day_begin)
+        self.day_end = int(day_end)
+        self.IP = IP
+        self.Tair = np.asarray(Tair, dtype=float)
+        self.obs = align_observed(observed, self.day_begin, self.day_end)
+        self.names = list(fit)
+        self.fixed = dict(DEFAULTS, **(fixed or {}))
+        self.bounds = np.array([(bounds or {}).get(name, BOUNDS[name]) for name in self.names], dtype=float)
+        self.seed = seed
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = LRUCache(maxsize=cache_size)
+        self.evaluations = 0
+        self.eval_seconds = 0.0
+        self.noise = np.random.default_rng(seed).random((1, self.day_end - self.day_begin + 1, 2))
+        self._pool = None
+
+    def _key(self, x):
+        return tuple(float(f"{v:.10g}") for v in x)
+
+    def _evaluate(self, X):
+        # 未命中缓存的参数组合一次性（或分块并行）计算
+        names = list(self.fixed)
+        full = np.tile([self.fixed[name] for name in names], (len(X), 1))
+        for j, name in enumerate(self.names):
+            full[:, names.index(name)] = X[:, j]
+        args = (names, self.day_begin, self.day_end, self.IP, self.Tair, self.noise, self.obs)
+        t0 = time.perf_counter()
+        if self._pool is None:
+            out = _rmse(full, *args)
+        else:
+            parts = [self._pool.submit(_rmse, full[lo:lo + self.chunk_size], *args)
+                     for lo in range(0, len(full), self.chunk_size)]
+            out = np.concatenate([part.result() for part in parts])
+        self.eval_seconds += time.perf_counter() - t0
+        self.evaluations += len(X)
+        return out
+
+    def objective(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        keys = [self._key(x) for x in X]
+        f = np.empty(len(X))
+        todo = {}
+        for k, key in enumerate(keys):
+            value = self.cache.get(key)
+            if value is None:
+                todo.setdefault(key, []).append(k)
+            else:
+                f[k] = value
+        if todo:
+            values = self._evaluate(X[[ks[0] for ks in todo.values()]])
+            for (key, ks), value in zip(todo.items(), values):
+                self.cache.put(key, value)
+                f[ks] = value
+        return f
+
+    def fit(self, popsize=32, generations=60, F=0.7, CR=0.9, tol=1e-8, progress=None):
+        rng = np.random.default_rng(self.seed)
+        lo, hi = self.bounds[:, 0], self.bounds[:, 1]
+        k = len(self.names)
+        pop = lo + rng.random((popsize, k)) * (hi - lo)
+        t0 = time.perf_counter()
+        history = []
+        self._pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers != 1 else None
+        try:
+            cost = self.objective(pop)
+            for gen in range(generations):
+                idx = np.array([rng.choice(np.delete(np.arange(popsize), i), 3, replace=False)
+                                for i in range(popsize)])
+                mutant = np.clip(pop[idx[:, 0]] + F * (pop[idx[:, 1]] - pop[idx[:, 2]]), lo, hi)
+                cross = rng.random((popsize, k)) < CR
+                cross[np.arange(popsize), rng.integers(0, k, popsize)] = True
+                trial = np.where(cross, mutant, pop)
+                trial_cost = self.objective(trial)
+                better = trial_cost <= cost
+                pop[better] = trial[better]
+                cost[better] = trial_cost[better]
+                history.append(float(cost.min()))
+                if progress is not None:
+                    progress(gen, history[-1])
+                if np.ptp(cost) < tol:
+                    break
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        best = int(np.argmin(cost))
+        elapsed = time.perf_counter() - t0
+        stats = self.cache.stats()
+        return {
+            'params': dict(zip(self.names, pop[best].tolist())),
+            'rmse': float(cost[best]),
+            'history': history,
+            'evaluations': self.evaluations,
+            'cache_hits': stats['hits'],
+            'seconds': elapsed,
+            'evals_per_s': self.evaluations / self.eval_seconds if self.eval_seconds > 0 else float('inf'),
+        }
@@ -0,0 +1,108 @@
+import argparse
+import glob
+import json
+import os
+import re
+import numpy as np
+
+# 存储格式：目录下 tair.npy 为 float32 (站点 x 年份 x 366) 逐日气温，缺测与闰年外的第 366 天为 NaN；
+# index.json 记录站点名和年份的顺序
+DAYS = 366
+DATA_FILE = 'tair.npy'
+INDEX_FILE = 'index.json'
+
+
+def load_text_series(path):
+    # 与 Run.py 相同的文本格式：每行一个日均气温（℃）
+    return np.loadtxt(path, dtype=np.float32, ndmin=1).ravel()
+
+
+def discover(pattern):
+    # 按 "{Station}气温{Year}.txt" 这类模板查找文件，返回 {(站点, 年份): 路径}
+    regex = re.escape(pattern).replace(r'\{Station\}', r'(?P<Station>.+?)').replace(r'\{Year\}', r'(?P<Year>\d{4})')
+    files = {}
+    for path in glob.glob(pattern.format(Station='*', Year='[0-9]' * 4)):
+        m = re.fullmatch(regex, path)
+        if m:
+            files[(m.group('Station'), int(m.group('Year')))] = path
+    return files
+
+
+def build_store(files, out_dir):
+    # files 为 {(站点, 年份): 文本文件路径}；逐文件写入内存映射数组，不在内存中汇总全部数据
+    stations = sorted({st for st, _ in files})
+    years = sorted({year for _, year in files})
+    os.makedirs(out_dir, exist_ok=True)
+    data = np.lib.format.open_memmap(os.path.join(out_dir, DATA_FILE), mode='w+', dtype=np.float32,
+                                     shape=(len(stations), len(years), DAYS))
+    data[:] = np.nan
+    st_idx = {st: i for i, st in enumerate(stations)}
+    yr_idx = {year: i for i, year in enumerate(years)}
+    for (st, year), path in files.items():
+        series = load_text_series(path)[:DAYS]
+        data[st_idx[st], yr_idx[year], :len(series)] = series
+    data.flush()
+    del data
+    with open(os.path.join(out_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'stations': stations, 'years': years, 'days': DAYS}, f, ensure_ascii=False)
+    return ClimateStore(out_dir)
+
+
+class ClimateStore:
+    # 只读访问，数据以内存映射方式打开；序列化到子进程时只传递路径，由各进程各自映射同一文件
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), encoding='utf-8') as f:
+            index = json.load(f)
+        self.stations = index['stations']
+        self.years = index['years']
+        self._st_idx = {st: i for i, st in enumerate(self.stations)}
+        self._yr_idx = {year: i for i, year in enumerate(self.years)}
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.load(os.path.join(self.path, DATA_FILE), mmap_mode='r')
+        return self._data
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    def __contains__(self, key):
+        st, year = key
+        return st in self._st_idx and int(year) in self._yr_idx
+
+    def index(self, station, year):
+        try:
+            return self._st_idx[station], self._yr_idx[int(year)]
+        except KeyError:
+            raise KeyError(f"no temperature for station {station!r}, year {year}") from None
+
+    def series(self, station, year):
+        # 全年逐日气温（第 1 个元素为 1 月 1 日），零拷贝视图
+        i, j = self.index(station, year)
+        return self.data[i, j]
+
+    def season(self, station, year, start, end):
+        # StartDay..EndDay（日序，含两端）的零拷贝视图
+        return self.series(station, year)[start - 1:end]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="将逐站逐年的文本气温文件转换为内存映射气温库")
+    parser.add_argument('out_dir', help="输出目录")
+    parser.add_argument('--pattern', default="{Station}气温{Year}.txt", help="文本文件路径模板")
+    args = parser.parse_args(argv)
+    files = discover(args.pattern)
+    if not files:
+        parser.error(f"没有找到匹配 {args.pattern} 的文件")
+    store = build_store(files, args.out_dir)
+    print(f"已写入 {len(store.stations)} 个站点 x {len(store.years)} 年 到 {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
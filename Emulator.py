@@ -0,0 +1,194 @@
+import argparse
+import itertools
+import time
+import numpy as np
+from CH4MOD import CH4Flux_batch
+
+# 代理模型的输入变量及默认训练范围；生长季、气温和水分模式在训练时固定（每个水分模式单独拟合）
+INPUTS = ('GrainYield', 'SoilSand', 'OMN', 'OMS')
+DOMAIN = {
+    'GrainYield': (2000.0, 12000.0),
+    'OMN': (0.0, 5000.0),
+    'OMS': (0.0, 5000.0),
+    'SoilSand': (0.0, 100.0),
+}
+OUTPUTS = ('E', 'Ebl', 'Ep')
+REGIMES = (1, 2, 3, 4, 5)
+
+
+def _legendre(x, degree):
+    # x 已缩放到 [-1, 1]，返回 (degree+1, n) 的 Legendre 多项式值（均匀分布输入的多项式混沌基）
+    P = np.empty((degree + 1,) + x.shape)
+    P[0] = 1.0
+    if degree > 0:
+        P[1] = x
+    for k in range(1, degree):
+        P[k + 1] = ((2 * k + 1) * x * P[k] - k * P[k - 1]) / (k + 1)
+    return P
+
+
+def _terms(n_inputs, degree):
+    # 总阶数不超过 degree 的多指标
+    return [t for t in itertools.product(range(degree + 1), repeat=n_inputs) if sum(t) <= degree]
+
+
+def _latin_hypercube(rng, n, k):
+    u = (rng.permuted(np.tile(np.arange(n), (k, 1)), axis=1).T + rng.random((n, k))) / n
+    return u
+
+
+class Emulator:
+    # 季节排放 E/Ebl/Ep 的多项式代理模型：在 domain 内用拉丁超立方抽样运行真实模型，
+    # 每个水分模式用最小二乘拟合 degree 阶 Legendre 多项式，并以独立抽样的检验集评估误差。
+    # 所有训练、检验和回退计算共用同一组随机扰动（由 seed 决定），代理模型拟合的是确定的函数。
+    # 超出训练范围或未训练的水分模式回退到 CH4Flux_batch
+
+    def __init__(self, day_begin, day_end, Tair, domain=None, degree=4, regimes=REGIMES, seed=0):
+        self.day_begin = int(day_begin)
+        self.day_end = int(day_end)
+        self.Tair = np.asarray(Tair, dtype=float)
+        self.domain = {name: tuple(map(float, (domain or {}).get(name, DOMAIN[name]))) for name in INPUTS}
+        self.degree = degree
+        self.regimes = tuple(int(ip) for ip in regimes)
+        self.seed = seed
+        self.noise = np.random.default_rng(seed).random((1, self.day_end - self.day_begin + 1, 2))
+        self.terms = np.array(_terms(len(INPUTS), degree))
+        self._lo = np.array([self.domain[name][0] for name in INPUTS])
+        self._hi = np.array([self.domain[name][1] for name in INPUTS])
+        # predict_one 中 (输入 x 阶数) 展平后的 Legendre 值按此下标取出每个基函数的因子
+        self._flat = self.terms + np.arange(len(INPUTS)) * (degree + 1)
+        self.coef = {}
+        self.errors = {}
+        self.fallbacks = 0
+
+    def _basis(self, X):
+        Z = 2 * (X - self._lo) / np.where(self._hi > self._lo, self._hi - self._lo, 1.0) - 1
+        P = _legendre(Z.T, self.degree)  # (degree+1, inputs, n)
+        B = np.ones((len(X), len(self.terms)))
+        for j in range(len(INPUTS)):
+            B *= P[self.terms[:, j], j].T
+        return B
+
+    def simulate(self, X, IP):
+        # 真实模型：X 为 (n x 输入变量)，返回 (n x 输出)
+        p = dict(zip(INPUTS, np.asarray(X, dtype=float).T))
+        n = len(X)
+        result = CH4Flux_batch(np.full(n, self.day_begin), self.day_end, IP, p['SoilSand'], self.Tair, p['OMS'],
+                               p['OMN'], p['GrainYield'], noise=self.noise, aggregate=True)
+        return np.column_stack([result[name] for name in OUTPUTS])
+
+    def sample(self, n, rng):
+        return self._lo + _latin_hypercube(rng, n, len(INPUTS)) * (self._hi - self._lo)
+
+    def fit(self, n_train=2000, n_test=500, progress=None):
+        # 返回各水分模式在检验集上的误差：rmse、最大绝对误差 max_abs、95% 分位绝对误差 p95_abs（g/m2）
+        rng = np.random.default_rng([self.seed, 1])
+        for IP in self.regimes:
+            X = self.sample(n_train, rng)
+            Y = self.simulate(X, IP)
+            self.coef[IP] = np.linalg.lstsq(self._basis(X), Y, rcond=None)[0]
+            Xt = self.sample(n_test, rng)
+            err = np.abs(self._basis(Xt) @ self.coef[IP] - self.simulate(Xt, IP))
+            self.errors[IP] = {name: {'rmse': float(np.sqrt(np.mean(err[:, k] ** 2))),
+                                      'max_abs': float(err[:, k].max()),
+                                      'p95_abs': float(np.percentile(err[:, k], 95))}
+                               for k, name in enumerate(OUTPUTS)}
+            if progress is not None:
+                progress(IP, self.errors[IP])
+        return self.errors
+
+    def inside(self, X, IP):
+        X = np.atleast_2d(X)
+        IP = np.broadcast_to(np.asarray(IP, dtype=np.int64), (len(X),))
+        return ((X >= self._lo) & (X <= self._hi)).all(axis=1) & np.isin(IP, list(self.coef))
+
+    def predict(self, GrainYield, SoilSand, OMN, OMS, IP, fallback=True):
+        # 参数为标量或数组；返回 {E, Ebl, Ep, emulated}，emulated 为 False 的行由真实模型计算
+        # （fallback=False 时为 NaN）
+        X = np.column_stack(np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                                   for v in (GrainYield, SoilSand, OMN, OMS))))
+        IP = np.broadcast_to(np.atleast_1d(np.asarray(IP, dtype=np.int64)), (len(X),))
+        ok = self.inside(X, IP)
+        Y = np.full((len(X), len(OUTPUTS)), np.nan)
+        for ip in np.unique(IP[ok]):
+            rows = ok & (IP == ip)
+            Y[rows] = np.maximum(self._basis(X[rows]) @ self.coef[int(ip)], 0)
+        if fallback and not ok.all():
+            rows = ~ok
+            self.fallbacks += int(rows.sum())
+            Y[rows] = self.simulate(X[rows], IP[rows])
+        return {**{name: Y[:, k] for k, name in enumerate(OUTPUTS)}, 'emulated': ok}
+
+    def predict_one(self, GrainYield, SoilSand, OMN, OMS, IP):
+        # 单个查询的快速路径（交互式问答）：纯 Python 计算 Legendre 值，返回 {E, Ebl, Ep, emulated}
+        x = (GrainYield, SoilSand, OMN, OMS)
+        coef = self.coef.get(int(IP))
+        if coef is None or not all(lo <= v <= hi for v, (lo, hi) in zip(x, (self.domain[n] for n in INPUTS))):
+            out = self.predict(*x, IP)
+            return {**{name: float(out[name][0]) for name in OUTPUTS}, 'emulated': False}
+        P = []
+        for v, lo, hi in zip(x, self._lo.tolist(), self._hi.tolist()):
+            z = 2 * (v - lo) / (hi - lo) - 1 if hi > lo else -1.0
+            p = [1.0, z]
+            for k in range(1, self.degree):
+                p.append(((2 * k + 1) * z * p[k] - k * p[k - 1]) / (k + 1))
+            P.extend(p[:self.degree + 1])
+        y = np.maximum(np.array(P)[self._flat].prod(axis=1) @ coef, 0).tolist()
+        return {**dict(zip(OUTPUTS, y)), 'emulated': True}
+
+    def error_bound(self, IP, name='E'):
+        # 检验集上的最大绝对误差（g/m2）
+        return self.errors[int(IP)][name]['max_abs']
+
+    def save(self, path):
+        np.savez(path, day=[self.day_begin, self.day_end], Tair=self.Tair, lo=self._lo, hi=self._hi, degree=self.degree,
+                 seed=-1 if self.seed is None else self.seed, noise=self.noise, regimes=list(self.coef),
+                 coef=np.stack([self.coef[IP] for IP in self.coef]),
+                 errors=np.array([[[self.errors[IP][name][m] for m in ('rmse', 'max_abs', 'p95_abs')]
+                                   for name in OUTPUTS] for IP in self.coef]))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        z = np.load(path)
+        domain = {name: (z['lo'][j], z['hi'][j]) for j, name in enumerate(INPUTS)}
+        seed = int(z['seed'])
+        em = cls(z['day'][0], z['day'][1], z['Tair'], domain=domain, degree=int(z['degree']),
+                 regimes=z['regimes'].tolist(), seed=None if seed < 0 else seed)
+        em.noise = z['noise']
+        for k, IP in enumerate(em.regimes):
+            em.coef[IP] = z['coef'][k]
+            em.errors[IP] = {name: dict(zip(('rmse', 'max_abs', 'p95_abs'), z['errors'][k, j].tolist()))
+                             for j, name in enumerate(OUTPUTS)}
+        return em
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="训练 CH4MOD 季节排放的代理模型并报告检验误差")
+    parser.add_argument('output', help="代理模型文件（.npz）")
+    parser.add_argument('--tair', default='长沙气温2003.txt', help="气温文件（从生长季第一天起）")
+    parser.add_argument('--start', type=int, default=160, help="StartDay")
+    parser.add_argument('--end', type=int, default=280, help="EndDay")
+    parser.add_argument('--degree', type=int, default=4, help="多项式阶数")
+    parser.add_argument('--train', type=int, default=2000, help="每个水分模式的训练样本数")
+    parser.add_argument('--test', type=int, default=500, help="每个水分模式的检验样本数")
+    parser.add_argument('--seed', type=int, default=0, help="随机数种子")
+    args = parser.parse_args(argv)
+
+    tair = np.loadtxt(args.tair, dtype=float, ndmin=1).ravel()
+    em = Emulator(args.start, args.end, tair, degree=args.degree, seed=args.seed)
+    t0 = time.perf_counter()
+    em.fit(args.train, args.test, progress=lambda IP, err: print(
+        f"水分模式 {IP}: " + "，".join(f"{name} 最大误差 {e['max_abs']:.3g}、RMSE {e['rmse']:.3g}"
+                                       for name, e in err.items())))
+    print(f"训练用时 {time.perf_counter() - t0:.1f} s")
+    em.save(args.output)
+    n = 1000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        em.predict_one(4000, 30, 1600, 1300, 2)
+    print(f"单次预测 {(time.perf_counter() - t0) / n * 1e6:.0f} us")
+
+
+if __name__ == '__main__':
+    main()
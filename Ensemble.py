@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from CH4MOD import CH4Flux_batch, CH4_COLUMNS
+
+# 季节总量统计的排放分量
+TOTAL_COLUMNS = ['E', 'Ebl', 'Ep']
+# 逐日分位数：成员数不超过 QUANTILE_EXACT_MEMBERS 时保存逐日成员值并精确计算；超过后改为每天一个
+# QUANTILE_BINS 区间的直方图（区间范围取自已保存的成员值并向两侧各放宽一倍），内存与成员数无关，
+# 分位数在区间内线性插值，误差不超过一个区间宽度
+QUANTILE_EXACT_MEMBERS = 10000
+QUANTILE_BINS = 2048
+
+
+def member_noise(seed, members, ndays):
+    # 第 k 个成员使用由 SeedSequence(seed, spawn_key=(k,)) 派生的独立 Generator，
+    # 与分块方式和成员总数无关；每天两个均匀随机数，分别用于 Eh 与土壤含水量
+    return np.stack([np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(int(k),))).random((ndays, 2))
+                     for k in members])
+
+
+class DailyQuantiles:
+    # 逐日分位数的流式估计，add 每次接收 (成员 x 日) 的一块
+    def __init__(self, ndays, exact=QUANTILE_EXACT_MEMBERS, bins=QUANTILE_BINS):
+        self.exact = exact
+        self.bins = bins
+        self.count = 0
+        self.buffer = np.empty((min(exact, 1024), ndays))
+        self.hist = None
+
+    def add(self, block):
+        m = len(block)
+        if self.hist is None and self.count + m <= self.exact:
+            if self.count + m > len(self.buffer):
+                grown = np.empty((min(self.exact, max(2 * len(self.buffer), self.count + m)), self.buffer.shape[1]))
+                grown[:self.count] = self.buffer[:self.count]
+                self.buffer = grown
+            self.buffer[self.count:self.count + m] = block
+            self.count += m
+            return
+        if self.hist is None:
+            self._to_histogram(np.concatenate([self.buffer[:self.count], block]))
+            return
+        ndays = block.shape[1]
+        idx = np.clip(((block - self.lo) / self.width).astype(np.int64), 0, self.bins - 1)
+        self.hist += np.bincount((idx * ndays + np.arange(ndays)).ravel(),
+                                 minlength=self.bins * ndays).reshape(self.bins, ndays)
+        self.min = np.minimum(self.min, block.min(axis=0))
+        self.max = np.maximum(self.max, block.max(axis=0))
+        self.count += m
+
+    def _to_histogram(self, values):
+        self.min = values.min(axis=0)
+        self.max = values.max(axis=0)
+        span = np.where(self.max > self.min, self.max - self.min, np.maximum(np.abs(self.max), 1.0))
+        self.lo = self.min - span
+        self.width = 3 * span / self.bins
+        self.hist = np.zeros((self.bins, values.shape[1]), dtype=np.int64)
+        self.buffer = np.empty((0, values.shape[1]))
+        self.count = 0
+        self.add(values)
+
+    def quantile(self, q):
+        if self.hist is None:
+            return np.quantile(self.buffer[:self.count], q, axis=0)
+        cdf = np.cumsum(self.hist, axis=0)
+        rank = q * self.count
+        b = (cdf < rank).sum(axis=0).clip(0, self.bins - 1)
+        days = np.arange(self.hist.shape[1])
+        below = np.where(b > 0, cdf[b - 1, days], 0)
+        frac = np.clip((rank - below) / np.maximum(self.hist[b, days], 1), 0, 1)
+        return np.clip(self.lo + (b + frac) * self.width, self.min, self.max)
+
+
+def CH4Flux_ensemble(day_begin, day_end, IP, sand, Tair, OMS, OMN, GY, n_members=100, seed=0,
+                     quantiles=(0.05, 0.5, 0.95), quantile_columns=('E',), chunk_size=1000,
+                     quantile_exact=QUANTILE_EXACT_MEMBERS):
+    # 单个情景的 Monte Carlo 集合模拟。成员按 chunk_size 分块向量化计算，逐块合并逐日均值和方差，
+    # quantile_columns 的逐日分位数由 DailyQuantiles 流式估计（成员数超过 quantile_exact 时为近似值），
+    # 只保留每个成员的季节总量，不保存完整的逐日结果。
+    DurDate = int(day_end) - int(day_begin) + 1
+    ncols = len(CH4_COLUMNS)
+    count = 0
+    mean = np.zeros((DurDate, ncols))
+    M2 = np.zeros((DurDate, ncols))
+    qvals = {name: DailyQuantiles(DurDate, exact=quantile_exact) for name in quantile_columns}
+    totals = np.empty((n_members, len(TOTAL_COLUMNS)))
+
+    for lo in range(0, n_members, chunk_size):
+        members = np.arange(lo, min(lo + chunk_size, n_members))
+        m = len(members)
+        result = CH4Flux_batch(np.full(m, day_begin), day_end, IP, sand, Tair, OMS, OMN, GY,
+                               noise=member_noise(seed, members, DurDate))
+        block = np.stack([result[name] for name in CH4_COLUMNS], axis=-1)  # (members, days, columns)
+
+        # Chan 等人的分块合并公式
+        block_mean = block.mean(axis=0)
+        block_M2 = ((block - block_mean) ** 2).sum(axis=0)
+        delta = block_mean - mean
+        total = count + m
+        mean += delta * m / total
+        M2 += block_M2 + delta ** 2 * count * m / total
+        count = total
+
+        for name in quantile_columns:
+            qvals[name].add(result[name])
+        totals[members] = np.stack([result[name].sum(axis=1) for name in TOTAL_COLUMNS], axis=1)
+
+    std = np.sqrt(M2 / (count - 1)) if count > 1 else np.zeros_like(M2)
+    return {
+        'mean': pd.DataFrame(mean, columns=CH4_COLUMNS),
+        'std': pd.DataFrame(std, columns=CH4_COLUMNS),
+        'quantiles': {q: pd.DataFrame({'DAT': mean[:, 0],
+                                       **{name: qvals[name].quantile(q) for name in quantile_columns}})
+                      for q in quantiles},
+        'totals': pd.DataFrame(totals, columns=TOTAL_COLUMNS),
+    }
@@ -0,0 +1,170 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from CH4MOD import CH4Flux_batch
+
+# 任务状态
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Job:
+    # 一个后台任务：fn(job) 在线程池中执行，可调用 job.advance() 报告进度并追加部分结果，
+    # 取消后下一次 advance() 抛出 Cancelled，任务在两个分块之间停止
+
+    def __init__(self, job_id, fn, total=1, key=None, label=''):
+        self.id = job_id
+        self.fn = fn
+        self.total = total
+        self.key = key
+        self.label = label
+        self.done = 0
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.partial = []
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def seconds(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def cancel(self):
+        self._cancel.set()
+
+    def advance(self, n=1, partial=None):
+        with self._lock:
+            self.done += n
+            if partial is not None:
+                self.partial.append(partial)
+        if self.cancelled:
+            raise Cancelled()
+
+    def results(self):
+        # 已完成部分的结果（按完成顺序）
+        with self._lock:
+            return list(self.partial)
+
+    def run(self):
+        if self.cancelled:
+            self.status = CANCELLED
+            self.finished = time.time()
+            return
+        self.status = RUNNING
+        self.started = time.time()
+        try:
+            self.result = self.fn(self)
+            self.status = DONE
+        except Cancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        self.finished = time.time()
+
+
+class JobManager:
+    # 进程内共享的任务队列（网页应用中通过 st.cache_resource 在所有会话间共享）。
+    # 同一 key 的未失败任务只提交一次；超过 keep 个已结束的任务时删除最早的
+    # 模拟内核主要是 numpy 运算，线程池即可让多个任务交替执行而不阻塞页面
+
+    def __init__(self, workers=2, keep=50):
+        self.workers = workers
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ch4mod-job')
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, fn, total=1, key=None, label=''):
+        with self._lock:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and job.status not in (FAILED, CANCELLED):
+                        return job
+            job = Job(next(self._ids), fn, total=total, key=key, label=label)
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(job.run)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def find(self, key):
+        with self._lock:
+            for job in reversed(list(self._jobs.values())):
+                if job.key == key:
+                    return job
+        return None
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[job_id]
+
+    def table(self):
+        return pd.DataFrame([{'id': job.id, 'label': job.label, 'status': job.status,
+                              'progress': job.progress, 'seconds': job.seconds} for job in self.jobs()])
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job in self.jobs():
+                job.cancel()
+        self._pool.shutdown(wait=True)
+
+
+def run_rows(job, data, Tair, chunk_size=20, seed=None):
+    # 参数表（run.csv 格式）逐块调用 CH4Flux_batch，所有行共用一条气温序列（从第一行起按生长季天数截取）；
+    # 每块完成后以逐日长表（Row 为行号）作为部分结果，返回全部结果
+    rng = np.random.default_rng(seed)
+    Tair = np.asarray(Tair, dtype=float)
+    parts = []
+    for lo in range(0, len(data), chunk_size):
+        chunk = data.iloc[lo:lo + chunk_size]
+        start = chunk['StartDay'].to_numpy(dtype=np.int64)
+        end = chunk['EndDay'].to_numpy(dtype=np.int64)
+        dur = end - start + 1
+        if dur.max() > len(Tair):
+            raise ValueError(f"Tair covers {len(Tair)} days, the longest season needs {dur.max()}")
+        result = CH4Flux_batch(start, end, chunk['WaterRegime'].to_numpy(), chunk['SoilSand'].to_numpy(),
+                               Tair, chunk['OMS'].to_numpy(), chunk['OMN'].to_numpy(),
+                               chunk['GrainYield'].to_numpy(), rng=rng)
+        valid = np.arange(int(dur.max())) < dur[:, np.newaxis]
+        out = {'Row': np.repeat(chunk.index.to_numpy(), dur)}
+        out.update((name, values[valid]) for name, values in result.items())
+        part = pd.DataFrame(out)
+        parts.append(part)
+        job.advance(len(chunk), part)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
@@ -0,0 +1,161 @@
+import argparse
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from CH4MOD import CH4Flux_batch
+
+# 轮作中每一季的参数（可为标量或长度为站点数的数组）；OMN/OMS 为该季新投入的有机质（kg/ha）
+SEASON_KEYS = ('StartDay', 'EndDay', 'WaterRegime', 'GrainYield', 'OMN', 'OMS')
+# 每季输出：排放总量（g/m2）与季末残留有机质（kg/ha）
+SEASON_OUTPUTS = ('E', 'Ebl', 'Ep', 'OMN', 'OMS')
+
+
+def _tair(Tair, n_sites, years):
+    # 气温可为一年的序列 (天)、逐年序列 (年 x 天) 或逐站点逐年 (站点 x 年 x 天)；只给一年时各年重复使用
+    Tair = np.asarray(Tair, dtype=float)
+    if Tair.ndim == 1:
+        Tair = Tair[np.newaxis, np.newaxis, :]
+    elif Tair.ndim == 2:
+        Tair = Tair[np.newaxis, :, :]
+    if Tair.shape[0] not in (1, n_sites) or Tair.shape[1] not in (1, years):
+        raise ValueError(f"Tair of shape {Tair.shape} does not match {n_sites} sites x {years} years")
+    return np.broadcast_to(Tair, (n_sites, years, Tair.shape[2]))
+
+
+def CH4Flux_seasons(rotation, sand, Tair, years=1, carry=1.0, rng=None, noise=None, Q10=3, EhBase=-20, doy=True):
+    # 多季、多年连续模拟：rotation 为一年内各季参数的列表（如早稻、晚稻），逐年重复。
+    # 默认 doy=True：该年气温为全年逐日数据，各季按自己的 StartDay..EndDay 截取；
+    # doy=False 时与 Run.py、BatchRun.py 相同，从该年气温的第一行起取生长季天数，只用于一年一季
+    # （一年多季时各季会取到同一段气温）。
+    # 每季对全部站点调用一次 CH4Flux_batch（aggregate=True），Eh 与土壤含水量按原模型在每季开始时重置，
+    # 季末残留的 OMN/OMS 乘以 carry（休闲期保留比例）后加到下一季的投入上。
+    # 返回 {列名: (站点 x 季数)}，季的顺序为 第 1 年各季, 第 2 年各季, ...
+    if not rotation:
+        raise ValueError("rotation needs at least one season")
+    if not doy and len(rotation) > 1:
+        raise ValueError("doy=False takes every season from the first day of Tair; "
+                         "use doy=True for more than one season per year")
+    seasons = [{key: np.asarray(season[key]) for key in SEASON_KEYS} for season in rotation]
+    n_sites = np.broadcast_shapes(np.shape(sand), *(a.shape for s in seasons for a in s.values()),
+                                  np.shape(Tair)[:1] if np.ndim(Tair) == 3 else ())
+    n_sites = n_sites[0] if n_sites else 1
+    sand = np.broadcast_to(np.asarray(sand, dtype=float), (n_sites,))
+    Tair = _tair(Tair, n_sites, years)
+    for k, s in enumerate(seasons):
+        if doy and (s['EndDay'] > Tair.shape[2]).any():
+            raise ValueError(f"season {k}: EndDay beyond the {Tair.shape[2]} days of Tair")
+        if not doy and (s['EndDay'] - s['StartDay'] + 1 > Tair.shape[2]).any():
+            raise ValueError(f"season {k}: season longer than the {Tair.shape[2]} days of Tair")
+    if rng is None:
+        rng = np.random
+
+    out = {name: np.empty((n_sites, years * len(seasons))) for name in SEASON_OUTPUTS}
+    OMN_left = np.zeros(n_sites)
+    OMS_left = np.zeros(n_sites)
+    j = 0
+    for year in range(years):
+        for s in seasons:
+            start = np.broadcast_to(s['StartDay'].astype(np.int64), (n_sites,))
+            end = np.broadcast_to(s['EndDay'].astype(np.int64), (n_sites,))
+            ndays = int((end - start).max()) + 1
+            # 各站点从第一天（doy=True 时从自己的 StartDay）起截取气温；生长季之后的位置不参与计算
+            first = start[:, np.newaxis] - 1 if doy else np.zeros((n_sites, 1), dtype=np.int64)
+            days = np.minimum(first + np.arange(ndays), Tair.shape[2] - 1)
+            tair = Tair[np.arange(n_sites)[:, np.newaxis], year, days]
+            result = CH4Flux_batch(start, end, s['WaterRegime'], sand, tair, s['OMS'] + carry * OMS_left,
+                                   s['OMN'] + carry * OMN_left, s['GrainYield'], rng=rng, noise=noise,
+                                   Q10=Q10, EhBase=EhBase, aggregate=True)
+            # CH4Flux_batch 内部以 kg/ha 的 0.1 倍计算有机质库
+            OMN_left = result['OMN'] * 10
+            OMS_left = result['OMS'] * 10
+            for name in ('E', 'Ebl', 'Ep'):
+                out[name][:, j] = result[name]
+            out['OMN'][:, j] = OMN_left
+            out['OMS'][:, j] = OMS_left
+            j += 1
+    return out
+
+
+def _run_chunk(rotation, sand, Tair, years, carry, seed, chunk_id, Q10, EhBase, doy):
+    rng = np.random.default_rng(None if seed is None else [seed, chunk_id])
+    return CH4Flux_seasons(rotation, sand, Tair, years=years, carry=carry, rng=rng, Q10=Q10, EhBase=EhBase, doy=doy)
+
+
+def run_sites(rotation, sand, Tair, years=1, carry=1.0, seed=None, workers=1, chunk_size=2000, Q10=3, EhBase=-20,
+              doy=True):
+    # 大量站点的长期情景：站点按 chunk_size 分块，workers > 1 时分到进程池。
+    # 每块的随机数由 (seed, 块号) 决定，结果与 workers 无关
+    sand = np.atleast_1d(np.asarray(sand, dtype=float))
+    n_sites = len(sand)
+    Tair = np.asarray(Tair, dtype=float)
+    per_site = Tair.ndim == 3
+
+    def part(value, sl):
+        value = np.asarray(value)
+        return value[sl] if value.ndim == 1 else value
+
+    jobs = []
+    for k, lo in enumerate(range(0, n_sites, chunk_size)):
+        sl = slice(lo, lo + chunk_size)
+        rot = [{key: part(season[key], sl) for key in SEASON_KEYS} for season in rotation]
+        jobs.append((rot, sand[sl], Tair[sl] if per_site else Tair, years, carry, seed, k, Q10, EhBase, doy))
+    if workers == 1:
+        parts = [_run_chunk(*args) for args in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_run_chunk, *zip(*jobs)))
+    return {name: np.concatenate([p[name] for p in parts]) for name in SEASON_OUTPUTS}
+
+
+def read_rotation(path):
+    # 轮作参数文件与 run.csv 列名相同，每行为一年中的一季（按行顺序衔接），SoilSand 取第一行
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"{path} has no season rows")
+    missing = [name for name in SEASON_KEYS + ('SoilSand',) if name not in rows[0]]
+    if missing:
+        raise ValueError(f"{path} is missing columns {missing}")
+    rotation = [{key: float(row[key]) for key in SEASON_KEYS} for row in rows]
+    return rotation, float(rows[0]['SoilSand'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多季、多年连续 CH4MOD 模拟，季间传递残留有机质")
+    parser.add_argument('rotation', help="轮作参数 CSV（run.csv 格式，每行一季）")
+    parser.add_argument('--tair', default='长沙气温2003.txt',
+                        help="气温文件；长度为 365 的整数倍时依次作为各年气温，否则各年重复使用")
+    parser.add_argument('--doy', action='store_true',
+                        help="气温文件为全年数据，按 StartDay..EndDay 截取；一年多季时必须指定")
+    parser.add_argument('--years', type=int, default=1, help="模拟年数")
+    parser.add_argument('--carry', type=float, default=1.0, help="季末残留有机质带入下一季的比例")
+    parser.add_argument('--seed', type=int, default=None, help="随机数种子")
+    parser.add_argument('-o', '--output', default=None, help="结果文件（.npz、.csv 等），不指定时打印")
+    args = parser.parse_args(argv)
+
+    rotation, sand = read_rotation(args.rotation)
+    if len(rotation) > 1 and not args.doy:
+        # 不加 --doy 时与 Run.py 相同从气温文件第一行取起，一年多季的各季会使用同一段气温
+        parser.error(f"轮作每年有 {len(rotation)} 季，需要加 --doy 按 StartDay..EndDay 截取气温")
+    series = np.loadtxt(args.tair, dtype=float, ndmin=1).ravel()
+    if len(series) > 365 and len(series) % 365 == 0:
+        series = series.reshape(-1, 365)[:args.years]
+    t0 = time.perf_counter()
+    rng = np.random if args.seed is None else np.random.default_rng(args.seed)
+    out = CH4Flux_seasons(rotation, sand, series, years=args.years, carry=args.carry, rng=rng, doy=args.doy)
+    elapsed = time.perf_counter() - t0
+    n = len(rotation)
+    table = {'Year': np.repeat(np.arange(1, args.years + 1), n), 'Season': np.tile(np.arange(1, n + 1), args.years)}
+    table.update((name, out[name][0]) for name in SEASON_OUTPUTS)
+    if args.output is not None:
+        from ResultStore import write_result
+        write_result(table, args.output)
+    else:
+        from RunCLI import print_table
+        print_table(table)
+    print(f"{args.years} 年 {args.years * n} 季，用时 {elapsed:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import time
+import pandas as pd
+
+# 逐日循环中的计时阶段，顺序与 CH4Flux_array 中的计算顺序一致；
+# biomass 与 root 属于驱动变量（CH4Forcing）；给定 profiler 时 CH4Flux_array 不使用 FORCING_CACHE，每次都实际计算并计时
+STAGES = ('biomass', 'root', 'decomposition', 'eh', 'production', 'emission')
+
+
+class StageProfiler:
+    # 传给 CH4Flux_day / CH4Flux_array / CH4Flux_batch 的 profiler 参数后，按阶段累计耗时和调用次数。
+    # trace=True 时保存每天的中间状态，callback 则在每天结束时以状态字典调用。
+    # 也可作为上下文管理器使用，记录整段代码的总耗时：
+    #     with StageProfiler() as prof:
+    #         CH4Flux_day(..., profiler=prof)
+    #     prof.summary()
+
+    def __init__(self, trace=False, callback=None):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.states = [] if trace else None
+        self.callback = callback
+        self.tracing = trace or callback is not None
+        self.runs = 0
+        self.wall = 0.0
+        self._t0 = None
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall += time.perf_counter() - self._t0
+        return False
+
+    def lap(self, stage, t0):
+        # 将 t0 以来的耗时计入 stage，返回当前时刻作为下一阶段的起点
+        now = time.perf_counter()
+        self.seconds[stage] += now - t0
+        self.calls[stage] += 1
+        return now
+
+    def emit(self, state):
+        if self.states is not None:
+            self.states.append(state)
+        if self.callback is not None:
+            self.callback(state)
+
+    def summary(self):
+        total = sum(self.seconds.values())
+        return pd.DataFrame({
+            'seconds': self.seconds,
+            'calls': self.calls,
+            'share': {k: v / total if total > 0 else 0.0 for k, v in self.seconds.items()},
+        })
+
+    def trace_frame(self):
+        return pd.DataFrame(self.states or [])
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from CH4MOD import CH4Flux_batch
+
+# 栅格输入目录：每个变量一个 (行 x 列) 的 .npy 文件，气温为 (行 x 列 x 天) 的 tair.npy；
+# grid.json 可给出未提供文件的变量的统一取值、像元面积（m2）等。mask.npy 为水稻像元（可省略，
+# 默认全部像元），region.npy 为行政区编号（非负整数，可省略，默认全部属于 0 区）
+GRID_FILE = 'grid.json'
+INPUTS = ('GrainYield', 'SoilSand', 'OMN', 'OMS', 'WaterRegime', 'StartDay', 'EndDay')
+TAIR_FILE = 'tair.npy'
+# 输出目录：逐像元季节排放（g/m2，float32，非水稻像元为 NaN）、区域汇总与断点记录
+OUTPUTS = ('E', 'Ebl', 'Ep')
+MANIFEST_FILE = 'manifest.json'
+REGIONS_FILE = 'regions.csv'
+
+
+class Grid:
+    # 只读访问栅格输入，数组以内存映射方式打开；序列化到子进程时只传递路径
+
+    def __init__(self, path):
+        self.path = path
+        meta_path = os.path.join(path, GRID_FILE)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        self.defaults = meta.get('defaults', {})
+        self.cell_area = float(meta.get('cell_area', 1.0))
+        self.doy = bool(meta.get('doy', False))
+        tair = self._open(TAIR_FILE)
+        self.shape = tair.shape[:2]
+        self.days = tair.shape[2]
+        for name in INPUTS:
+            if not os.path.exists(os.path.join(path, f"{name}.npy")) and name not in self.defaults:
+                raise ValueError(f"{path}: no {name}.npy and no default for {name} in {GRID_FILE}")
+        self._arrays = {}
+
+    def _open(self, filename):
+        return np.load(os.path.join(self.path, filename), mmap_mode='r')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = {}
+        return state
+
+    def array(self, name):
+        # 输入变量的内存映射数组；没有文件时返回 None
+        if name not in self._arrays:
+            filename = TAIR_FILE if name == 'tair' else f"{name}.npy"
+            exists = os.path.exists(os.path.join(self.path, filename))
+            self._arrays[name] = self._open(filename) if exists else None
+        return self._arrays[name]
+
+    def window(self, name, rows, cols, default=None):
+        a = self.array(name)
+        if a is None:
+            return np.full((rows.stop - rows.start, cols.stop - cols.start), self.defaults.get(name, default))
+        return np.asarray(a[rows, cols])
+
+    def tiles(self, tile_size):
+        ny, nx = self.shape
+        return [(slice(y, min(y + tile_size, ny)), slice(x, min(x + tile_size, nx)))
+                for y in range(0, ny, tile_size) for x in range(0, nx, tile_size)]
+
+
+def create_outputs(out_dir, shape):
+    # 首次运行时创建输出内存映射（全部为 NaN），已存在时保留以便续算
+    os.makedirs(out_dir, exist_ok=True)
+    for name in OUTPUTS:
+        path = os.path.join(out_dir, f"{name}.npy")
+        if not os.path.exists(path):
+            out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=shape)
+            out[:] = np.nan
+            out.flush()
+            del out
+
+
+def run_tile(grid, out_dir, tile_id, rows, cols, n_regions, seed=None, chunk_size=5000):
+    # 计算一个分块内的全部水稻像元：分块内再按 chunk_size 个像元调用 CH4Flux_batch（aggregate=True），
+    # 内存占用只与 chunk_size 和生长季天数有关。结果写入输出内存映射的对应窗口，
+    # 返回各行政区的排放总量（g，按像元面积加权）与像元数
+    mask = grid.window('mask', rows, cols, default=True).astype(bool)
+    region = grid.window('region', rows, cols, default=0).astype(np.int64)
+    params = {name: grid.window(name, rows, cols)[mask] for name in INPUTS}
+    region = region[mask]
+    cy, cx = np.nonzero(mask)
+    cy += rows.start
+    cx += cols.start
+
+    totals = {name: np.zeros(n_regions) for name in OUTPUTS}
+    cells = np.bincount(region, minlength=n_regions)[:n_regions]
+    values = {name: np.full(len(cy), np.nan, dtype=np.float32) for name in OUTPUTS}
+    rng = np.random.default_rng(None if seed is None else [seed, tile_id])
+    tair_all = grid.array('tair')
+    for lo in range(0, len(cy), chunk_size):
+        sl = slice(lo, lo + chunk_size)
+        start = params['StartDay'][sl].astype(np.int64)
+        end = params['EndDay'][sl].astype(np.int64)
+        first = start - 1 if grid.doy else np.zeros_like(start)
+        dur = end - start + 1
+        if (first + dur > grid.days).any():
+            raise ValueError(f"tile {tile_id}: tair.npy covers {grid.days} days, not enough for the season")
+        ndays = int(dur.max())
+        # 按像元读取所需的气温天数（内存映射上的花式索引只读取这些像元），生长季之后的位置不参与计算
+        days = np.minimum(first[:, np.newaxis] + np.arange(ndays), grid.days - 1)
+        tair = np.asarray(tair_all[cy[sl, np.newaxis], cx[sl, np.newaxis], days], dtype=float)
+        result = CH4Flux_batch(start, end, params['WaterRegime'][sl].astype(np.int64), params['SoilSand'][sl], tair,
+                               params['OMS'][sl], params['OMN'][sl], params['GrainYield'][sl], rng=rng,
+                               aggregate=True)
+        for name in OUTPUTS:
+            values[name][sl] = result[name]
+            totals[name] += np.bincount(region[sl], weights=result[name] * grid.cell_area,
+                                        minlength=n_regions)[:n_regions]
+
+    for name in OUTPUTS:
+        out = np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode='r+')
+        out[cy, cx] = values[name]
+        out.flush()
+        del out
+    return {'tile': tile_id, 'cells': cells.tolist(), **{name: totals[name].tolist() for name in OUTPUTS}}
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    # 先写临时文件再替换，中断时不会留下不完整的断点记录
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def region_totals(manifest):
+    # 已完成分块的行政区汇总：{列名: 数组}，E/Ebl/Ep 单位为 t CH4
+    return {'Region': np.arange(manifest['regions']), 'Cells': np.asarray(manifest['cells'], dtype=np.int64),
+            **{name: np.asarray(manifest[name]) / 1e6 for name in OUTPUTS}}
+
+
+def run_region(grid_dir, out_dir, tile_size=256, chunk_size=5000, workers=1, seed=None, progress=print):
+    # 逐分块运行，每完成一块即把分块号和累加后的行政区汇总写入断点文件；重新运行时跳过已完成的分块
+    # （输入、分块大小或种子改变时重新开始）。每个分块的随机数由 (seed, 分块号) 决定，续算结果与一次运行相同
+    grid = Grid(grid_dir)
+    region = grid.array('region')
+    n_regions = int(region.max()) + 1 if region is not None else 1
+    tiles = grid.tiles(tile_size)
+    config = {'grid': os.path.abspath(grid_dir), 'shape': list(grid.shape), 'tile_size': tile_size,
+              'chunk_size': chunk_size, 'seed': seed, 'regions': n_regions}
+    manifest = load_manifest(out_dir)
+    if manifest is None or manifest['config'] != config:
+        for name in OUTPUTS:
+            path = os.path.join(out_dir, f"{name}.npy")
+            if os.path.exists(path):
+                os.remove(path)
+        manifest = {'config': config, 'regions': n_regions, 'tiles': len(tiles), 'done': [],
+                    'cells': [0] * n_regions, **{name: [0.0] * n_regions for name in OUTPUTS}}
+    create_outputs(out_dir, grid.shape)
+    save_manifest(out_dir, manifest)
+
+    done = set(manifest['done'])
+    todo = [(k, rows, cols) for k, (rows, cols) in enumerate(tiles) if k not in done]
+    t0 = time.perf_counter()
+    cells = 0
+
+    def record(part):
+        nonlocal cells
+        manifest['done'].append(part['tile'])
+        manifest['cells'] = [a + b for a, b in zip(manifest['cells'], part['cells'])]
+        for name in OUTPUTS:
+            manifest[name] = [a + b for a, b in zip(manifest[name], part[name])]
+        save_manifest(out_dir, manifest)
+        cells += sum(part['cells'])
+        if progress is not None:
+            elapsed = time.perf_counter() - t0
+            progress(f"{len(manifest['done'])}/{len(tiles)} tiles, {cells / elapsed:.1f} cells/s")
+
+    args = (grid, out_dir)
+    kwargs = dict(n_regions=n_regions, seed=seed, chunk_size=chunk_size)
+    if workers == 1:
+        for k, rows, cols in todo:
+            record(run_tile(*args, k, rows, cols, **kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_tile, *args, k, rows, cols, **kwargs) for k, rows, cols in todo]
+            for future in as_completed(futures):
+                record(future.result())
+
+    totals = region_totals(manifest)
+    with open(os.path.join(out_dir, REGIONS_FILE), 'w', encoding='utf-8') as f:
+        f.write(','.join(totals) + '\n')
+        for values in zip(*(totals[name].tolist() for name in totals)):
+            f.write(','.join(map(str, values)) + '\n')
+    elapsed = time.perf_counter() - t0
+    return {'tiles': len(todo), 'cells': cells, 'seconds': elapsed, 'totals': totals}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按栅格分块运行区域 CH4MOD 模拟，汇总到像元和行政区")
+    parser.add_argument('grid_dir', help="栅格输入目录（各变量 .npy、tair.npy、grid.json）")
+    parser.add_argument('out_dir', help="输出目录（E/Ebl/Ep.npy、regions.csv、manifest.json）")
+    parser.add_argument('--tile-size', type=int, default=256, help="分块边长（像元）")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="每次 CH4Flux_batch 调用的像元数，决定内存上限")
+    parser.add_argument('-j', '--workers', type=int, default=1, help="进程数")
+    parser.add_argument('--seed', type=int, default=None, help="随机数种子（续算时须与首次运行相同）")
+    args = parser.parse_args(argv)
+    stats = run_region(args.grid_dir, args.out_dir, tile_size=args.tile_size, chunk_size=args.chunk_size,
+                       workers=args.workers, seed=args.seed)
+    print(f"完成 {stats['tiles']} 个分块、{stats['cells']} 个像元，用时 {stats['seconds']:.2f} s；"
+          f"区域总排放 {stats['totals']['E'].sum():.4g} t CH4")
+
+
+if __name__ == '__main__':
+    main()
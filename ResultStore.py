@@ -0,0 +1,269 @@
+import io
+import json
+import os
+import zipfile
+import numpy as np
+
+# 结果文件格式：txt/csv 为文本（与 result_py.txt 相同），npy 为每列一个 .npy 文件的目录，
+# npz 为按分块追加成员的压缩包，parquet 需要安装 pyarrow
+FORMATS = ('txt', 'csv', 'npy', 'npz', 'parquet')
+META_FILE = 'columns.json'
+# pandas 只在文本格式和 DataFrame 输出时导入，npy/npz 读写只依赖 numpy
+# .npy 头部预留的行数上限，关闭时改写为实际行数（头部长度不变）
+_RESERVED_ROWS = 2 ** 62
+
+
+def guess_format(path):
+    # 按扩展名判断，没有扩展名时视为 npy 目录
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext in FORMATS:
+        return ext
+    if ext == 'tsv':
+        return 'txt'
+    if ext == '':
+        return 'npy'
+    raise ValueError(f"cannot tell the result format of {path!r}, use one of {FORMATS}")
+
+
+def _arrays(frame):
+    # frame 为 DataFrame 或 {列名: 数组}
+    if isinstance(frame, dict):
+        return {name: np.asarray(values) for name, values in frame.items()}
+    return {name: frame[name].to_numpy() for name in frame.columns}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("the parquet format needs pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def has_parquet():
+    try:
+        _require_pyarrow()
+    except ImportError:
+        return False
+    return True
+
+
+class ResultWriter:
+    # 逐块追加写出结果，各分块的列名须一致；可作为上下文管理器使用
+    #     with open_writer('result.npz') as w:
+    #         for frame in chunks:
+    #             w.append(frame)
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.columns = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def append(self, frame):
+        data = _arrays(frame)
+        if self.columns is None:
+            self.columns = list(data)
+        elif list(data) != self.columns:
+            raise ValueError(f"chunk columns {list(data)} differ from {self.columns}")
+        self._write(data)
+        self.rows += len(next(iter(data.values()))) if data else 0
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class TextWriter(ResultWriter):
+
+    def __init__(self, path, sep='\t'):
+        super().__init__(path)
+        self.sep = sep
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _write(self, data):
+        import pandas as pd
+        pd.DataFrame(data).to_csv(self.path, mode='a', header=self.rows == 0, index=False, sep=self.sep)
+
+
+class NpyWriter(ResultWriter):
+    # 目录下每列一个 .npy 文件，数据直接追加到文件末尾，关闭时改写头部中的行数
+
+    def __init__(self, path):
+        super().__init__(path)
+        os.makedirs(path, exist_ok=True)
+        self._files = {}
+
+    def _write(self, data):
+        if not self._files:
+            for name, values in data.items():
+                f = open(os.path.join(self.path, f"{name}.npy"), 'wb')
+                np.lib.format.write_array_header_1_0(f, self._header(values.dtype, _RESERVED_ROWS))
+                self._files[name] = (f, values.dtype)
+        for name, values in data.items():
+            f, dtype = self._files[name]
+            f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+    @staticmethod
+    def _header(dtype, rows):
+        return {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (rows,)}
+
+    def close(self):
+        for f, dtype in self._files.values():
+            end = f.tell()
+            f.seek(0)
+            np.lib.format.write_array_header_1_0(f, self._header(dtype, self.rows))
+            f.seek(end)
+            f.close()
+        self._files = {}
+        with open(os.path.join(self.path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'columns': self.columns or [], 'rows': self.rows}, f, ensure_ascii=False)
+
+
+class NpzWriter(ResultWriter):
+    # 每个分块写为一组 "<列名>/<分块号>.npy" 成员，读取时按列拼接
+
+    def __init__(self, path, compress=True):
+        super().__init__(path)
+        if os.path.exists(path):
+            os.remove(path)
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED,
+                                    allowZip64=True)
+        self._chunks = 0
+
+    def _write(self, data):
+        for name, values in data.items():
+            with self._zip.open(f"{name}/{self._chunks:06d}.npy", 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(values), allow_pickle=False)
+        self._chunks += 1
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.writestr(META_FILE, json.dumps({'columns': self.columns or [], 'rows': self.rows,
+                                                      'chunks': self._chunks}, ensure_ascii=False))
+            self._zip.close()
+            self._zip = None
+
+
+class ParquetWriter(ResultWriter):
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._pa = _require_pyarrow()
+        self._writer = None
+
+    def _write(self, data):
+        table = self._pa.table(data)
+        if self._writer is None:
+            self._writer = self._pa.parquet.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def open_writer(path, fmt=None):
+    fmt = fmt or guess_format(path)
+    if fmt == 'txt':
+        return TextWriter(path)
+    if fmt == 'csv':
+        return TextWriter(path, sep=',')
+    if fmt == 'npy':
+        return NpyWriter(path)
+    if fmt == 'npz':
+        return NpzWriter(path)
+    if fmt == 'parquet':
+        return ParquetWriter(path)
+    raise ValueError(f"unknown result format {fmt!r}, use one of {FORMATS}")
+
+
+def write_result(frame, path, fmt=None):
+    with open_writer(path, fmt) as writer:
+        writer.append(frame)
+    return path
+
+
+class ResultReader:
+    # 按列惰性读取：只有被访问的列才从磁盘读入（npy 格式为内存映射）
+    #     r = open_result('result.npz')
+    #     r['E'], r.to_frame(['Row', 'DAT', 'E'])
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or guess_format(path)
+        if self.fmt in ('txt', 'csv'):
+            import pandas as pd
+            self._sep = '\t' if self.fmt == 'txt' else ','
+            self.columns = list(pd.read_csv(path, sep=self._sep, nrows=0).columns)
+        elif self.fmt == 'npy':
+            with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+                self.columns = json.load(f)['columns']
+        elif self.fmt == 'npz':
+            # 也可读取 np.savez 直接保存的文件（每列一个成员）
+            with zipfile.ZipFile(path) as z:
+                names = z.namelist()
+                self._chunked = META_FILE in names
+                if self._chunked:
+                    self.columns = json.loads(z.read(META_FILE))['columns']
+                else:
+                    self.columns = [m[:-len('.npy')] for m in names if m.endswith('.npy')]
+        elif self.fmt == 'parquet':
+            self.columns = list(_require_pyarrow().parquet.read_schema(path).names)
+        else:
+            raise ValueError(f"unknown result format {self.fmt!r}, use one of {FORMATS}")
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        if name not in self.columns:
+            raise KeyError(name)
+        if self.fmt in ('txt', 'csv'):
+            import pandas as pd
+            return pd.read_csv(self.path, sep=self._sep, usecols=[name])[name].to_numpy()
+        if self.fmt == 'npy':
+            return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        if self.fmt == 'npz':
+            with zipfile.ZipFile(self.path) as z:
+                if not self._chunked:
+                    return np.lib.format.read_array(z.open(f"{name}.npy"), allow_pickle=False)
+                members = sorted(m for m in z.namelist() if m.startswith(f"{name}/"))
+                parts = [np.lib.format.read_array(z.open(m), allow_pickle=False) for m in members]
+            return np.concatenate(parts) if parts else np.empty(0)
+        return _require_pyarrow().parquet.read_table(self.path, columns=[name]).column(name).to_numpy()
+
+    def to_frame(self, columns=None):
+        import pandas as pd
+        return pd.DataFrame({name: self[name] for name in (columns or self.columns)})
+
+
+def open_result(path, fmt=None):
+    return ResultReader(path, fmt)
+
+
+def to_bytes(frame, fmt):
+    # 供下载按钮使用：将结果表序列化为指定格式的字节串（npy 目录格式不适用）
+    if fmt in ('txt', 'csv'):
+        import pandas as pd
+        return pd.DataFrame(_arrays(frame)).to_csv(index=False, sep='\t' if fmt == 'txt' else ',').encode('utf-8')
+    buf = io.BytesIO()
+    if fmt == 'npz':
+        np.savez_compressed(buf, **_arrays(frame))
+    elif fmt == 'parquet':
+        pa = _require_pyarrow()
+        pa.parquet.write_table(pa.table(_arrays(frame)), buf)
+    else:
+        raise ValueError(f"format {fmt!r} cannot be downloaded as a single file")
+    return buf.getvalue()
@@ -0,0 +1,131 @@
+import warnings
+import numpy as np
+import plotly.graph_objects as go
+
+# 网页应用的结果图层：大量田块/集合成员的结果先在服务端汇总为分位数包络线、降采样序列和季节总量直方图，
+# 图中的点数与田块数无关，交互缩放由 plotly 在浏览器中完成
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# 单条曲线最多保留的点数（降采样为每段的最小值和最大值）
+MAX_POINTS = 2000
+HIST_BINS = 40
+TOTAL_COLUMNS = ('E', 'Ebl', 'Ep')
+COLORS = {'E': 'red', 'Ebl': 'blue', 'Ep': 'green', 'W': 'green', 'Wroot': 'brown', 'Tsoil': 'orange',
+          'Eh': 'purple'}
+
+
+def _matrix_index(rows, dat):
+    # 逐日长表（Row, DAT）在 (田块 x 日) 矩阵中的位置，返回 (日序, (行下标, 列下标))
+    _, r = np.unique(np.asarray(rows), return_inverse=True)
+    days, d = np.unique(np.asarray(dat), return_inverse=True)
+    return days, (r.ravel(), d.ravel())
+
+
+def quantile_bands(matrix, quantiles=QUANTILES):
+    # 每日的分位数，返回 (分位数 x 日)；只有部分田块覆盖的日按实际覆盖的田块计算
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanquantile(matrix, quantiles, axis=0)
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+    # 按顺序分为 max_points/2 段，每段保留最小值和最大值所在的点（保留峰值），点数不超过 max_points
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= max_points:
+        return x, y
+    n_bins = max_points // 2
+    width = -(-len(y) // n_bins)
+    padded = np.full(n_bins * width, np.nan)
+    padded[:len(y)] = y
+    padded = padded.reshape(n_bins, width)
+    base = np.arange(n_bins) * width
+    i_lo = base + np.where(np.isnan(padded), np.inf, padded).argmin(axis=1)
+    i_hi = base + np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1)
+    keep = np.unique(np.concatenate([i_lo, i_hi]))
+    keep = keep[keep < len(y)]
+    return x[keep], y[keep]
+
+
+def series_figure(x, series, ytitle, xtitle='日序 (DAT)', max_points=MAX_POINTS, height=450):
+    # series: {名称: (数组, 图例标签)}，每条曲线降采样后绘制
+    fig = go.Figure()
+    for name, (y, label) in series.items():
+        xs, ys = downsample(x, y, max_points)
+        fig.add_trace(go.Scattergl(x=xs, y=ys, mode='lines', name=label, line=dict(color=COLORS.get(name))))
+    fig.update_layout(xaxis_title=xtitle, yaxis_title=ytitle, height=height, hovermode='x unified',
+                      margin=dict(l=10, r=10, t=30, b=10))
+    return fig
+
+
+def band_figure(days, bands, label, ytitle, quantiles=QUANTILES, color='red', height=450):
+    # 分位数包络线：最外两个分位数与次外两个分位数各画一层半透明带，中位数画实线
+    q = list(quantiles)
+    fig = go.Figure()
+    for k, alpha in ((0, 0.15), (1, 0.3)):
+        if k >= len(q) - 1 - k:
+            break
+        lo, hi = bands[k], bands[len(q) - 1 - k]
+        fig.add_trace(go.Scatter(x=days, y=hi, mode='lines', line=dict(width=0), showlegend=False,
+                                 hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=days, y=lo, mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=_rgba(color, alpha),
+                                 name=f"{q[k]:.0%}–{q[len(q) - 1 - k]:.0%}"))
+    if 0.5 in q:
+        fig.add_trace(go.Scatter(x=days, y=bands[q.index(0.5)], mode='lines', line=dict(color=color, width=2),
+                                 name=f"{label} 中位数"))
+    fig.update_layout(xaxis_title='日序 (DAT)', yaxis_title=ytitle, height=height, hovermode='x unified',
+                      margin=dict(l=10, r=10, t=30, b=10))
+    return fig
+
+
+def _rgba(color, alpha):
+    rgb = {'red': (255, 0, 0), 'blue': (0, 0, 255), 'green': (0, 128, 0), 'orange': (255, 165, 0),
+           'purple': (128, 0, 128), 'brown': (165, 42, 42)}.get(color, (128, 128, 128))
+    return f"rgba({rgb[0]}, {rgb[1]}, {rgb[2]}, {alpha})"
+
+
+def histogram(values, bins=HIST_BINS):
+    # 在服务端统计直方图，返回 (计数, 区间边界)，图中只有 bins 个柱子
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1)
+    return np.histogram(values, bins=bins)
+
+
+def histogram_figure(hists, xtitle='季节总排放 (g/m²)', height=400):
+    # hists: {列名: histogram() 的 (计数, 区间边界)}，各列叠加显示
+    fig = go.Figure()
+    for name, (counts, edges) in hists.items():
+        fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name=name,
+                             marker_color=COLORS.get(name), opacity=0.6))
+    fig.update_layout(barmode='overlay', xaxis_title=xtitle, yaxis_title='田块数', height=height,
+                      margin=dict(l=10, r=10, t=30, b=10))
+    return fig
+
+
+def summarize(frame, columns=TOTAL_COLUMNS, quantiles=QUANTILES, bins=HIST_BINS):
+    # 由批量结果的逐日长表（含 Row、DAT 列，DataFrame 或 {列名: 数组}）一次性计算展示所需的全部汇总，
+    # 汇总的大小只与日数、分位数和直方图区间数有关，可缓存后反复渲染
+    days, index = _matrix_index(frame['Row'], frame['DAT'])
+    n_fields = index[0].max() + 1 if len(index[0]) else 0
+    summary = {'fields': int(n_fields), 'days': days, 'quantiles': tuple(quantiles), 'bands': {},
+               'histograms': {}, 'total_mean': {}, 'total_quantiles': {}}
+    for name in columns:
+        matrix = np.full((n_fields, len(days)), np.nan)
+        matrix[index] = np.asarray(frame[name], dtype=float)
+        summary['bands'][name] = quantile_bands(matrix, quantiles)
+        totals = np.nansum(matrix, axis=1)
+        summary['histograms'][name] = histogram(totals, bins)
+        summary['total_mean'][name] = float(totals.mean()) if n_fields else np.nan
+        summary['total_quantiles'][name] = quantile_bands(totals[:, np.newaxis], quantiles)[:, 0]
+    return summary
+
+
+def summary_band_figure(summary, name, ytitle='甲烷排放量 (g/m²/d)'):
+    return band_figure(summary['days'], summary['bands'][name], name, ytitle, summary['quantiles'],
+                       color=COLORS.get(name, 'red'))
+
+
+def summary_histogram_figure(summary, names=TOTAL_COLUMNS):
+    return histogram_figure({name: summary['histograms'][name] for name in names})
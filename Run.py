@@ -1,5 +1,5 @@
 import pandas as pd
-from CH4MOD import CH4Flux_day  # 确保 CH4MOD.py 在同一目录下
+from CH4MOD import CH4Flux_array  # 确保 CH4MOD.py 在同一目录下
 
 # 读取 CSV 文件
 data = pd.read_csv("run.csv")
@@ -7,8 +7,8 @@ data = pd.read_csv("run.csv")
 # 读取气温数据
 T = pd.read_csv("长沙气温2003.txt", header=None)
 
-# 调用 CH4Flux_day 函数
-result = CH4Flux_day(
+# 调用 CH4Flux_array 函数（预分配数组内核，as_frame=True 时零拷贝返回 DataFrame）
+result = CH4Flux_array(
     day_begin=data['StartDay'][0],
     day_end=data['EndDay'][0],
     IP=data['WaterRegime'][0],
@@ -16,7 +16,8 @@ result = CH4Flux_day(
     Tair=T[0],
     OMS=data['OMS'][0],
     OMN=data['OMN'][0],
-    GY=data['GrainYield'][0]
+    GY=data['GrainYield'][0],
+    as_frame=True
 )
 
 # 将结果写入文件
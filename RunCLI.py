@@ -0,0 +1,161 @@
+import argparse
+import csv
+import sys
+import time
+import numpy as np
+from CH4MOD import CH4Flux_array, CH4Flux_batch, CH4_COLUMNS, AGGREGATE_COLUMNS
+
+# 命令行入口：按参数文件（run.csv 格式）的每一行运行 CH4MOD。
+# 默认路径只导入 numpy，输出 .npz / npy 目录或在终端打印季节汇总；
+# 文本/CSV 输出（.txt、.csv）时才导入 pandas，--plot 时才导入 matplotlib（可选依赖，见 requirements-optional.txt）
+#     python RunCLI.py run.csv --tair 长沙气温2003.txt -o result.npz
+#     python RunCLI.py run.csv --aggregate
+PARAM_COLUMNS = ('GrainYield', 'SoilSand', 'OMN', 'OMS', 'WaterRegime', 'StartDay', 'EndDay')
+DEFAULT_PARAMS = 'run.csv'
+DEFAULT_TAIR = '长沙气温2003.txt'
+# 行数少于此值时逐行调用 CH4Flux_array（单行约 1 ms），否则合并为一次 CH4Flux_batch 调用；
+# 两条路径使用的随机数序列不同，同一种子下结果不逐位相同
+BATCH_MIN_ROWS = 64
+
+
+def read_params(path):
+    # 不依赖 pandas 读取参数文件，返回 {列名: 数组}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"{path} has no parameter rows")
+    missing = [name for name in PARAM_COLUMNS if name not in rows[0]]
+    if missing:
+        raise ValueError(f"{path} is missing columns {missing}")
+    return {name: np.array([float(row[name]) for row in rows]) for name in PARAM_COLUMNS}
+
+
+def season_tair(series, start, end, doy):
+    # 与 BatchRun.season_tair 相同：默认从第一行起取生长季天数，doy=True 时按日序截取
+    dur = end - start + 1
+    tair = np.full((len(start), int(dur.max())), np.nan)
+    for k in range(len(start)):
+        t = series[start[k] - 1:end[k]] if doy else series[:dur[k]]
+        if len(t) < dur[k]:
+            raise ValueError(f"row {k}: temperature covers {len(t)} of {dur[k]} days")
+        tair[k, :dur[k]] = t
+    return tair
+
+
+def run(params, series, doy=False, seed=None, columns=None, dtype=None, aggregate=False):
+    start = params['StartDay'].astype(np.int64)
+    end = params['EndDay'].astype(np.int64)
+    if len(start) < BATCH_MIN_ROWS:
+        return run_rows(params, series, doy, seed, columns, dtype, aggregate)
+    rng = np.random if seed is None else np.random.default_rng(seed)
+    result = CH4Flux_batch(start, end, params['WaterRegime'].astype(np.int64), params['SoilSand'],
+                           season_tair(series, start, end, doy), params['OMS'], params['OMN'],
+                           params['GrainYield'], rng=rng, columns=columns, dtype=dtype, aggregate=aggregate)
+    rows = np.arange(len(start))
+    if aggregate:
+        return {'Row': rows, **result}
+    dur = end - start + 1
+    valid = np.arange(int(dur.max())) < dur[:, np.newaxis]
+    out = {'Row': np.repeat(rows, dur)}
+    out.update((name, values[valid]) for name, values in result.items())
+    return out
+
+
+def run_rows(params, series, doy=False, seed=None, columns=None, dtype=None, aggregate=False):
+    # 指定种子时使用独立的 Generator，不改动全局随机状态（可在多个线程中同时调用）
+    rng = None if seed is None else np.random.default_rng(seed)
+    start = params['StartDay'].astype(np.int64)
+    end = params['EndDay'].astype(np.int64)
+    tair = season_tair(series, start, end, doy)
+    parts = []
+    for k in range(len(start)):
+        part = CH4Flux_array(start[k], end[k], int(params['WaterRegime'][k]), params['SoilSand'][k], tair[k],
+                             params['OMS'][k], params['OMN'][k], params['GrainYield'][k], columns=columns,
+                             dtype=dtype, aggregate=aggregate, rng=rng)
+        parts.append({name: np.atleast_1d(values) for name, values in part.items()})
+    out = {'Row': np.repeat(np.arange(len(start)), [len(next(iter(part.values()))) for part in parts])}
+    out.update((name, np.concatenate([part[name] for part in parts])) for name in parts[0])
+    return out
+
+
+def print_table(out, stream=sys.stdout):
+    names = list(out)
+    stream.write('\t'.join(names) + '\n')
+    for values in zip(*(out[name].tolist() for name in names)):
+        stream.write('\t'.join(f"{v:.6g}" if isinstance(v, float) else str(v) for v in values) + '\n')
+
+
+def _require_matplotlib():
+    try:
+        import matplotlib
+    except ImportError:
+        raise ImportError("--plot needs matplotlib (pip install -r requirements-optional.txt)") from None
+    return matplotlib
+
+
+def plot(out, path):
+    matplotlib = _require_matplotlib()
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(10, 5))
+    for row in np.unique(out['Row']):
+        keep = out['Row'] == row
+        ax.plot(out['DAT'][keep], out['E'][keep], label=f"Row {row}")
+    ax.set_xlabel('DAT')
+    ax.set_ylabel('E (g/m2/d)')
+    if len(np.unique(out['Row'])) <= 10:
+        ax.legend()
+    fig.savefig(path, dpi=120, bbox_inches='tight')
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CH4MOD 命令行模拟（不启动网页应用）")
+    parser.add_argument('param_file', nargs='?', default=DEFAULT_PARAMS, help="参数 CSV 文件")
+    parser.add_argument('--tair', default=DEFAULT_TAIR, help="气温文件，每行一个日均气温（℃）")
+    parser.add_argument('-o', '--output', default=None,
+                        help="结果文件：.npz、无扩展名（npy 目录）、.txt、.csv、.parquet；不指定时打印季节汇总")
+    parser.add_argument('--doy', action='store_true', help="气温文件为全年数据，按 StartDay..EndDay 截取")
+    parser.add_argument('--seed', type=int, default=None, help="随机数种子")
+    parser.add_argument('--columns', default=None, help=f"只输出这些列（逗号分隔），可选 {','.join(CH4_COLUMNS)}")
+    parser.add_argument('--float32', action='store_true', help="以 float32 保存结果")
+    parser.add_argument('--aggregate', action='store_true',
+                        help=f"每行只输出季节汇总：{','.join(AGGREGATE_COLUMNS)}")
+    parser.add_argument('--plot', default=None, metavar='PNG', help="将逐日排放 E 绘制到图片文件")
+    parser.add_argument('--time', action='store_true', help="在标准错误输出各步骤耗时")
+    args = parser.parse_args(argv)
+
+    columns = args.columns.split(',') if args.columns else None
+    if columns is not None and not set(columns) <= set(CH4_COLUMNS):
+        parser.error(f"未知的列: {','.join(sorted(set(columns) - set(CH4_COLUMNS)))}")
+    if args.plot and (args.aggregate or columns is not None and not {'DAT', 'E'} <= set(columns)):
+        parser.error("--plot 需要逐日的 DAT 和 E 列")
+    if args.plot:
+        # 在模拟之前检查可选依赖
+        try:
+            _require_matplotlib()
+        except ImportError:
+            parser.error("--plot 需要安装 matplotlib（pip install -r requirements-optional.txt）")
+    aggregate = args.aggregate or args.output is None and args.plot is None
+
+    t0 = time.perf_counter()
+    params = read_params(args.param_file)
+    series = np.loadtxt(args.tair, dtype=float, ndmin=1).ravel()
+    t1 = time.perf_counter()
+    out = run(params, series, doy=args.doy, seed=args.seed, columns=columns,
+              dtype=np.float32 if args.float32 else None, aggregate=aggregate)
+    t2 = time.perf_counter()
+    if args.output is not None:
+        from ResultStore import write_result
+        write_result(out, args.output)
+    elif aggregate:
+        print_table(out)
+    if args.plot is not None:
+        plot(out, args.plot)
+    t3 = time.perf_counter()
+    if args.time:
+        print(f"读取 {t1 - t0:.4f} s，模拟 {t2 - t1:.4f} s，输出 {t3 - t2:.4f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
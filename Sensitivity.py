@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from CH4MOD import CH4Flux_batch, AGGREGATE_COLUMNS
+
+# 因子取值范围；WaterRegime 为离散因子，[0, 1] 等分映射到 1-5，dT 为气温整体偏移（℃）
+FACTORS = {
+    'GrainYield': (3000.0, 10000.0),
+    'SoilSand': (5.0, 80.0),
+    'OMN': (0.0, 3000.0),
+    'OMS': (0.0, 3000.0),
+    'WaterRegime': (1, 5),
+    'dT': (-2.0, 2.0),
+}
+
+# 离散因子：取值为 lo..hi 的整数，Morris 设计中每个整数各占一个水平
+DISCRETE = ('WaterRegime',)
+
+# 未参与分析的因子取 run.csv 样例值
+BASE = {'GrainYield': 4000.0, 'SoilSand': 30.0, 'OMN': 1600.0, 'OMS': 1300.0, 'WaterRegime': 2, 'dT': 0.0}
+
+
+def scale(U, factors):
+    # 单位超立方体中的样本映射到因子取值。离散因子把 [0, 1] 等分为 hi - lo + 1 段，
+    # 有 hi - lo + 1 个水平的 Morris 网格 k / (hi - lo) 恰好落在第 k 段
+    values = {}
+    for j, (name, (lo, hi)) in enumerate(factors.items()):
+        if name in DISCRETE:
+            values[name] = np.minimum(lo + np.floor(U[:, j] * (hi - lo + 1)), hi).astype(np.int64)
+        else:
+            values[name] = lo + U[:, j] * (hi - lo)
+    return values
+
+
+def _evaluate_chunk(values, day_begin, day_end, Tair, noise, output):
+    p = {name: values.get(name, BASE[name]) for name in BASE}
+    n = len(next(iter(values.values())))
+    tair = np.asarray(Tair, dtype=float)[np.newaxis, :] + np.broadcast_to(p['dT'], (n,))[:, np.newaxis]
+    result = CH4Flux_batch(np.full(n, day_begin), day_end, p['WaterRegime'], p['SoilSand'], tair,
+                           p['OMS'], p['OMN'], p['GrainYield'], noise=noise,
+                           aggregate=output in AGGREGATE_COLUMNS, columns=[output])
+    if output in AGGREGATE_COLUMNS:
+        return result[output]
+    return np.nansum(result[output], axis=1)
+
+
+def evaluate(values, day_begin, day_end, Tair, output='E', seed=0, workers=None, chunk_size=5000):
+    # 逐样本计算季节总排放；所有样本共用同一组随机扰动（公共随机数），
+    # 使 Eh 噪声不进入敏感性指数。按 chunk_size 分块，workers=1 时在本进程内计算，否则使用进程池。
+    n = len(next(iter(values.values())))
+    noise = np.random.default_rng(seed).random((1, day_end - day_begin + 1, 2))
+    chunks = [(lo, {name: v[lo:lo + chunk_size] for name, v in values.items()}) for lo in range(0, n, chunk_size)]
+    args = (day_begin, day_end, Tair, noise, output)
+    Y = np.empty(n)
+    if workers == 1:
+        for lo, chunk in chunks:
+            Y[lo:lo + chunk_size] = _evaluate_chunk(chunk, *args)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(lo, pool.submit(_evaluate_chunk, chunk, *args)) for lo, chunk in chunks]
+            for lo, future in futures:
+                Y[lo:lo + chunk_size] = future.result()
+    return Y
+
+
+def morris_levels(factors, levels=4):
+    # 连续因子使用 levels 个水平，离散因子的水平数等于其整数取值个数
+    return [hi - lo + 1 if name in DISCRETE else levels for name, (lo, hi) in factors.items()]
+
+
+def morris_sample(n_factors, trajectories, levels=4, seed=0):
+    # 每条轨迹 n_factors + 1 个点，按随机顺序每次只改变一个因子 ±delta。
+    # levels 为整数或每个因子的水平数；因子 j 的网格为 k / (levels_j - 1)，
+    # delta_j 为 levels_j // 2 格（偶数水平时即 levels / (2 * (levels - 1))）
+    rng = np.random.default_rng(seed)
+    levels = np.broadcast_to(np.asarray(levels, dtype=np.int64), (n_factors,))
+    step = levels // 2
+    X = np.empty((trajectories, n_factors + 1, n_factors))
+    order = np.empty((trajectories, n_factors), dtype=np.int64)
+    for r in range(trajectories):
+        k = rng.integers(0, levels)
+        X[r, 0] = k / (levels - 1)
+        order[r] = rng.permutation(n_factors)
+        for i, j in enumerate(order[r]):
+            k = k.copy()
+            k[j] = k[j] + step[j] if k[j] + step[j] <= levels[j] - 1 else k[j] - step[j]
+            X[r, i + 1] = k / (levels - 1)
+    return X.reshape(-1, n_factors), order
+
+
+def morris_analyze(X, Y, order, names, n_boot=1000, conf=0.95, seed=0):
+    trajectories, k = order.shape
+    X = X.reshape(trajectories, k + 1, k)
+    Y = Y.reshape(trajectories, k + 1)
+    EE = np.empty((trajectories, k))
+    rows = np.arange(trajectories)
+    for step in range(k):
+        j = order[:, step]
+        dx = X[rows, step + 1, j] - X[rows, step, j]
+        EE[rows, j] = (Y[:, step + 1] - Y[:, step]) / dx
+    rng = np.random.default_rng(seed)
+    boot = np.abs(EE)[rng.integers(0, trajectories, (n_boot, trajectories))].mean(axis=1)
+    z = _z(conf)
+    return pd.DataFrame({
+        'mu': EE.mean(axis=0),
+        'mu_star': np.abs(EE).mean(axis=0),
+        'mu_star_conf': z * boot.std(axis=0, ddof=1),
+        'sigma': EE.std(axis=0, ddof=1),
+    }, index=list(names))
+
+
+def saltelli_sample(n_factors, N, seed=0):
+    # 依次为 A、B 以及 k 个 AB_i（A 的第 i 列替换为 B 的第 i 列），共 N * (k + 2) 行
+    rng = np.random.default_rng(seed)
+    A = rng.random((N, n_factors))
+    B = rng.random((N, n_factors))
+    AB = np.repeat(A[np.newaxis], n_factors, axis=0)
+    for i in range(n_factors):
+        AB[i, :, i] = B[:, i]
+    return np.concatenate([A, B, AB.reshape(-1, n_factors)])
+
+
+def _sobol_indices(fA, fB, fAB):
+    V = np.var(np.concatenate([fA, fB], axis=-1), axis=-1)[..., np.newaxis]
+    S1 = np.mean(fB[..., np.newaxis, :] * (fAB - fA[..., np.newaxis, :]), axis=-1) / V  # Saltelli (2010)
+    ST = 0.5 * np.mean((fA[..., np.newaxis, :] - fAB) ** 2, axis=-1) / V  # Jansen (1999)
+    return S1, ST
+
+
+def sobol_analyze(Y, N, names, n_boot=100, conf=0.95, seed=0):
+    k = len(names)
+    fA, fB, fAB = Y[:N], Y[N:2 * N], Y[2 * N:].reshape(k, N)
+    S1, ST = _sobol_indices(fA, fB, fAB)
+    rng = np.random.default_rng(seed)
+    S1_boot = np.empty((n_boot, k))
+    ST_boot = np.empty((n_boot, k))
+    for b in range(n_boot):
+        idx = rng.integers(0, N, N)
+        S1_boot[b], ST_boot[b] = _sobol_indices(fA[idx], fB[idx], fAB[:, idx])
+    z = _z(conf)
+    return pd.DataFrame({
+        'S1': S1,
+        'S1_conf': z * S1_boot.std(axis=0, ddof=1),
+        'ST': ST,
+        'ST_conf': z * ST_boot.std(axis=0, ddof=1),
+    }, index=list(names))
+
+
+def _z(conf):
+    return NormalDist().inv_cdf((1 + conf) / 2)
+
+
+def run_morris(day_begin, day_end, Tair, factors=FACTORS, trajectories=100, levels=4, output='E',
+               seed=0, workers=None, chunk_size=5000):
+    names = list(factors)
+    U, order = morris_sample(len(names), trajectories, morris_levels(factors, levels), seed)
+    Y = evaluate(scale(U, factors), day_begin, day_end, Tair, output, seed, workers, chunk_size)
+    return morris_analyze(U, Y, order, names, seed=seed)
+
+
+def run_sobol(day_begin, day_end, Tair, factors=FACTORS, N=1024, output='E', seed=0, workers=None,
+              chunk_size=5000, n_boot=100):
+    names = list(factors)
+    U = saltelli_sample(len(names), N, seed)
+    Y = evaluate(scale(U, factors), day_begin, day_end, Tair, output, seed, workers, chunk_size)
+    return sobol_analyze(Y, N, names, n_boot=n_boot, seed=seed)
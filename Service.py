@@ -0,0 +1,343 @@
+import argparse
+import collections
+import json
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from CH4MOD import CH4Flux_array, CH4Flux_batch, CH4_COLUMNS, AGGREGATE_COLUMNS
+from RunCLI import PARAM_COLUMNS, DEFAULT_TAIR
+
+# 本地模拟服务：
+#     python Service.py --port 8765
+#     POST /simulate  {"GrainYield": 4000, "SoilSand": 30, "OMN": 1600, "OMS": 1300, "WaterRegime": 2,
+#                      "StartDay": 160, "EndDay": 280}，可另给 "Tair"（从 StartDay 起的逐日气温）、
+#                      "aggregate": false（返回逐日结果）、"columns": [...]；也可一次提交一个列表
+#     GET /metrics    请求数、批次数、平均批大小、延迟分位数（ms）与吞吐量（请求/s）
+#     GET /health
+# 并发到达的请求在 window 秒内合并为一次 CH4Flux_batch 调用（最多 max_batch 个）；
+# 合并后不足 min_batch 个时逐个调用 CH4Flux_array，批量调用的固定开销此时更大
+DEFAULT_PORT = 8765
+# min_batch 的默认值：121 天的生长季，CH4Flux_batch 约 22~28 ms（24~32 个田块内基本不变），
+# 命中驱动变量缓存的 CH4Flux_array 每个田块约 0.9 ms，两者在 24~32 个田块之间持平。
+# 取持平区间的下端，32 个并发客户端时接近满的批次走批量计算
+SERVICE_BATCH_MIN_ROWS = 24
+# 计算延迟分位数时保留的最近请求数
+LATENCY_WINDOW = 10000
+
+
+def _json_value(v):
+    # NaN（如无排放时的 PeakE）在 JSON 中写为 null
+    if isinstance(v, np.ndarray):
+        return [_json_value(x) for x in v.tolist()]
+    v = float(v)
+    return None if v != v else v
+
+
+class Metrics:
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.batches = 0
+        self.batched = 0
+        self.errors = 0
+        self.vectorized = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = collections.deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record_batch(self, size, vectorized=False):
+        # 每个按 aggregate 分组后的批次记录一次；vectorized 表示该批由 CH4Flux_batch 计算
+        with self._lock:
+            self.batches += 1
+            self.batched += size
+            self.vectorized += vectorized
+            self.batch_sizes.append(size)
+
+    def record(self, latency, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.errors += not ok
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            lat = np.array(self.latencies) * 1e3
+            sizes = np.array(self.batch_sizes)
+            uptime = time.time() - self.started
+            snap = {'requests': self.requests, 'errors': self.errors, 'batches': self.batches,
+                    'mean_batch': self.batched / self.batches if self.batches else 0.0,
+                    'vectorized_batches': self.vectorized,
+                    'uptime_s': uptime, 'throughput': self.requests / uptime if uptime > 0 else 0.0}
+        for q in (50, 95, 99):
+            snap[f"p{q}_ms"] = float(np.percentile(lat, q)) if len(lat) else None
+        # 最近批次的大小分布
+        for q in (5, 50, 95):
+            snap[f"batch_p{q}"] = float(np.percentile(sizes, q)) if len(sizes) else None
+        snap['batch_max'] = int(sizes.max()) if len(sizes) else None
+        return snap
+
+
+class Request:
+
+    def __init__(self, params, tair, aggregate, columns):
+        self.params = params
+        self.tair = tair
+        self.aggregate = aggregate
+        self.columns = columns
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("simulation request timed out")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class MicroBatcher:
+    # 单个后台线程从队列中取请求：取到第一个后最多再等 window 秒收集更多请求，
+    # 再按 aggregate 分组，不少于 min_batch 个的组调用 CH4Flux_batch。
+    # 参数在提交时校验，一个错误的请求不会影响同批其他请求
+
+    def __init__(self, tair, window=0.005, max_batch=1024, seed=None, min_batch=SERVICE_BATCH_MIN_ROWS):
+        self.tair = np.asarray(tair, dtype=float)
+        self.window = window
+        self.max_batch = max_batch
+        self.min_batch = min_batch
+        self.rng = np.random.default_rng(seed)
+        self.metrics = Metrics()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='ch4mod-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, body):
+        missing = [name for name in PARAM_COLUMNS if name not in body]
+        if missing:
+            raise ValueError(f"missing parameters {missing}")
+        params = {name: float(body[name]) for name in PARAM_COLUMNS}
+        if params['WaterRegime'] not in (1, 2, 3, 4, 5):
+            raise ValueError("WaterRegime must be 1..5")
+        dur = int(params['EndDay']) - int(params['StartDay']) + 1
+        if dur < 1:
+            raise ValueError("StartDay must not be after EndDay")
+        tair = None
+        if 'Tair' in body:
+            tair = np.asarray(body['Tair'], dtype=float).ravel()
+            if len(tair) < dur:
+                raise ValueError(f"Tair covers {len(tair)} of {dur} days")
+        elif len(self.tair) < dur:
+            raise ValueError(f"the service temperature covers {len(self.tair)} of {dur} days")
+        columns = body.get('columns')
+        if columns is not None and not set(columns) <= set(CH4_COLUMNS):
+            raise ValueError(f"unknown columns {sorted(set(columns) - set(CH4_COLUMNS))}")
+        req = Request(params, tair, bool(body.get('aggregate', True)), columns)
+        self._queue.put(req)
+        return req
+
+    def simulate(self, body, timeout=60):
+        t0 = time.perf_counter()
+        try:
+            result = self.submit(body).wait(timeout)
+        except Exception:
+            self.metrics.record(time.perf_counter() - t0, ok=False)
+            raise
+        self.metrics.record(time.perf_counter() - t0)
+        return result
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _loop(self):
+        while True:
+            req = self._queue.get()
+            if req is None:
+                return
+            batch = [req]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    req = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if req is None:
+                    self._queue.put(None)
+                    break
+                batch.append(req)
+            for aggregate in (True, False):
+                group = [r for r in batch if r.aggregate == aggregate]
+                if group:
+                    try:
+                        self._run(group, aggregate)
+                    except Exception as e:
+                        for r in group:
+                            r.finish(error=e)
+
+    def _run(self, group, aggregate):
+        p = {name: np.array([r.params[name] for r in group]) for name in PARAM_COLUMNS}
+        start = p['StartDay'].astype(np.int64)
+        end = p['EndDay'].astype(np.int64)
+        dur = end - start + 1
+        self.metrics.record_batch(len(group), vectorized=len(group) >= self.min_batch)
+        if len(group) < self.min_batch:
+            for k, r in enumerate(group):
+                out = CH4Flux_array(start[k], end[k], int(p['WaterRegime'][k]), p['SoilSand'][k],
+                                    self.tair if r.tair is None else r.tair, p['OMS'][k], p['OMN'][k],
+                                    p['GrainYield'][k], columns=r.columns, aggregate=aggregate, rng=self.rng)
+                r.finish({name: _json_value(v) for name, v in out.items()})
+            return
+        if all(r.tair is None for r in group):
+            tair = self.tair
+        else:
+            tair = np.full((len(group), int(dur.max())), np.nan)
+            for k, r in enumerate(group):
+                tair[k, :dur[k]] = (self.tair if r.tair is None else r.tair)[:dur[k]]
+        columns = None
+        if not aggregate and all(r.columns is not None for r in group):
+            columns = [name for name in CH4_COLUMNS if any(name in r.columns for r in group)]
+        out = CH4Flux_batch(start, end, p['WaterRegime'].astype(np.int64), p['SoilSand'], tair, p['OMS'], p['OMN'],
+                            p['GrainYield'], rng=self.rng, columns=columns, aggregate=aggregate)
+        for k, r in enumerate(group):
+            if aggregate:
+                r.finish({name: _json_value(out[name][k]) for name in AGGREGATE_COLUMNS})
+            else:
+                r.finish({name: _json_value(out[name][k, :dur[k]]) for name in (r.columns or CH4_COLUMNS)})
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def _send(self, code, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, self.server.batcher.metrics.snapshot())
+        elif self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f"no such path {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/simulate':
+            self._send(404, {'error': f"no such path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            batcher = self.server.batcher
+            if isinstance(body, list):
+                # 列表中的请求一起提交，进入同一批次
+                t0 = time.perf_counter()
+                reqs = [batcher.submit(item) for item in body]
+                result = [req.wait(60) for req in reqs]
+                for _ in reqs:
+                    batcher.metrics.record(time.perf_counter() - t0)
+            else:
+                result = batcher.simulate(body)
+        except (ValueError, TypeError, KeyError) as e:
+            self._send(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send(500, {'error': str(e)})
+            return
+        self._send(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    # 默认的监听队列只有 5 个连接，大量并发客户端同时连接时会被重置
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def make_server(host='127.0.0.1', port=DEFAULT_PORT, tair=None, window=0.005, max_batch=1024, seed=None,
+                min_batch=SERVICE_BATCH_MIN_ROWS):
+    # port=0 时由系统分配空闲端口（server.server_address[1]）
+    server = Server((host, port), Handler)
+    if tair is None:
+        tair = np.loadtxt(DEFAULT_TAIR, dtype=float, ndmin=1).ravel()
+    server.batcher = MicroBatcher(tair, window=window, max_batch=max_batch, seed=seed, min_batch=min_batch)
+    return server
+
+
+def post(url, body, timeout=60):
+    req = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def load_test(url, n=1000, concurrency=32, seed=0):
+    # 本机压测：concurrency 个线程共发出 n 个单田块请求（随机 OMN/OMS/水分模式），返回服务端指标
+    rng = np.random.default_rng(seed)
+    bodies = [{'GrainYield': 4000, 'SoilSand': 30, 'OMN': float(omn), 'OMS': float(oms), 'WaterRegime': int(ip),
+               'StartDay': 160, 'EndDay': 280}
+              for omn, oms, ip in zip(rng.uniform(0, 3000, n), rng.uniform(0, 3000, n), rng.integers(1, 6, n))]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda body: post(url + '/simulate', body), bodies))
+    elapsed = time.perf_counter() - t0
+    with urllib.request.urlopen(url + '/metrics') as resp:
+        metrics = json.loads(resp.read())
+    return {'seconds': elapsed, 'client_throughput': n / elapsed, **metrics}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CH4MOD 本地模拟服务（HTTP，合并并发请求批量计算）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--tair', default=DEFAULT_TAIR, help="请求未给出 Tair 时使用的气温文件（从生长季第一天起）")
+    parser.add_argument('--window-ms', type=float, default=5.0, help="合并请求的等待时间（ms）")
+    parser.add_argument('--max-batch', type=int, default=1024, help="每批最多合并的请求数")
+    parser.add_argument('--min-batch', type=int, default=SERVICE_BATCH_MIN_ROWS,
+                        help="合并后达到此请求数时调用 CH4Flux_batch，否则逐个计算")
+    parser.add_argument('--seed', type=int, default=None, help="随机数种子")
+    parser.add_argument('--load-test', type=int, default=None, metavar='N',
+                        help="在随机端口启动服务并用 N 个并发请求压测，打印指标后退出")
+    parser.add_argument('--concurrency', type=int, default=32, help="压测的并发线程数")
+    args = parser.parse_args(argv)
+
+    tair = np.loadtxt(args.tair, dtype=float, ndmin=1).ravel()
+    port = 0 if args.load_test else args.port
+    server = make_server(args.host, port, tair=tair, window=args.window_ms / 1e3, max_batch=args.max_batch,
+                         seed=args.seed, min_batch=args.min_batch)
+    url = f"http://{args.host}:{server.server_address[1]}"
+    if args.load_test:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        stats = load_test(url, args.load_test, args.concurrency)
+        server.shutdown()
+        server.batcher.close()
+        print(json.dumps(stats, ensure_ascii=False, indent=1))
+        return
+    print(f"CH4MOD 服务已启动: {url}（POST /simulate，GET /metrics）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,69 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.rcParams['font.sans-serif'] = ['SimSong', 'Arial Unicode MS', 'Arial', 'Helvetica', 'DejaVu Sans', 'sans-serif']
-matplotlib.rcParams["axes.unicode_minus"] = False
+import io
+import time
 import streamlit as st
-from CH4MOD import CH4Flux_day
+from CH4MOD import CH4Flux_array, FORCING_CACHE
+from Cache import LRUCache, hash_key
+from Jobs import JobManager, run_rows, DONE, FAILED, CANCELLED, FINISHED
+from Profiling import StageProfiler
+from ResultStore import has_parquet, to_bytes
+import ResultsView
 
 # Streamlit应用界面
 st.set_page_config(page_title="CH4MOD模型模拟工具", page_icon="🌾", layout="wide")
 st.title("🌾 CH4MOD稻田甲烷排放模型模拟工具")
 
+
+# 解析结果与模拟结果的缓存在所有会话间共享，按文件内容/参数的哈希索引，容量有限（LRU淘汰）
+@st.cache_resource
+def get_caches():
+    return {'输入解析': LRUCache(maxsize=64), '模拟结果': LRUCache(maxsize=128)}
+
+
+caches = get_caches()
+
+
+# 后台任务队列同样在所有会话间共享，多个用户的模拟在线程池中并行排队，互不阻塞页面
+@st.cache_resource
+def get_jobs():
+    return JobManager(workers=2)
+
+
+jobs = get_jobs()
+
+
+def job_panel(job, text, partial=None):
+    # 每秒刷新一次任务进度（只重绘此片段）；任务结束后重新运行整个页面以显示结果。
+    # requirements.txt 中的 Streamlit 1.32 没有 st.fragment，此时等待 1 秒后重新运行整个页面
+    def panel():
+        if job.status in FINISHED:
+            st.rerun()
+        st.progress(job.progress, text=f"{text}（{job.done}/{job.total}，已用时 {job.seconds:.1f} s）")
+        if partial is not None:
+            partial(job)
+        if st.button("⏹️ 取消", key=f"cancel_job_{job.id}"):
+            job.cancel()
+
+    if hasattr(st, 'fragment'):
+        st.fragment(panel, run_every=1.0)()
+    else:
+        panel()
+        time.sleep(1.0)
+        st.rerun()
+
+
+def parse_params(raw):
+    return caches['输入解析'].get_or_compute(hash_key('params', raw), lambda: pd.read_csv(io.BytesIO(raw)))
+
+
+def parse_tair(raw):
+    def load():
+        Tair = np.loadtxt(io.BytesIO(raw), skiprows=0).flatten()
+        Tair.flags.writeable = False
+        return Tair
+    return caches['输入解析'].get_or_compute(hash_key('tair', raw), load)
+
 # 水分管理模式详细说明
 water_regime_info = {
     1: {
@@ -83,11 +136,10 @@ if input_method == "CSV文件输入 (与Run.py一致)":
     if param_file is not None and temp_file is not None:
         try:
             # 读取参数文件
-            data = pd.read_csv(param_file)
+            data = parse_params(param_file.getvalue())
             
             # 读取气温数据
-            temp_data = pd.read_csv(temp_file, header=None)
-            Tair = temp_data[0].values
+            Tair = parse_tair(temp_file.getvalue())
             
             # 提取参数（使用文档中的单位说明）
             GY = data['GrainYield'][0]  # kg/ha
@@ -197,8 +249,7 @@ else:
             uploaded_file = st.file_uploader("上传气温数据文件（.txt格式）", type=["txt"])
             if uploaded_file is not None:
                 try:
-                    temp_data = np.loadtxt(uploaded_file, skiprows=0)
-                    Tair = temp_data.flatten()
+                    Tair = parse_tair(uploaded_file.getvalue())
                 except Exception as e:
                     st.error(f"文件解析错误: {str(e)}")
                     st.stop()
@@ -209,8 +260,8 @@ else:
             # 使用示例数据
             try:
                 file_path = "长沙气温2003.txt"
-                temp_data = np.loadtxt(file_path, skiprows=0)
-                Tair = temp_data.flatten()
+                with open(file_path, 'rb') as f:
+                    Tair = parse_tair(f.read())
                 st.success(f"✅ 已加载示例气温数据 (长沙气温2003，共{len(Tair)}天，单位: ℃)")
             except Exception as e:
                 st.error(f"示例数据加载失败: {str(e)}")
@@ -247,9 +298,74 @@ else:
         st.write(f"- 谷物产量 (GY): {GY} kg/ha")
         st.write(f"- 气温数据天数: {len(Tair) if Tair is not None else 0}")
 
+# 性能分析开关：开启时重新运行模拟并记录各阶段耗时（不使用缓存结果）
+profile_enabled = st.sidebar.checkbox("⏱️ 启用性能分析", value=False, help="记录逐日循环各阶段的耗时和逐日中间状态")
+
 # 运行模拟（两种模式通用）
+# 模拟提交到后台任务队列，页面不被阻塞；参数与气温内容不变时，重新渲染（切换图表选项、下载结果）直接使用缓存结果
+sim_key = hash_key(day_begin, day_end, IP, sand, OMS, OMN, GY, Tair)
+job_key = (sim_key, profile_enabled)
+
+
+# 调用CH4Flux_array内核，在后台线程中执行（不能调用 st.* 函数）
+def run_simulation(profiler=None):
+    return CH4Flux_array(
+        day_begin=day_begin,
+        day_end=day_end,
+        IP=IP,
+        sand=sand,
+        Tair=Tair,
+        OMS=OMS,
+        OMN=OMN,
+        GY=GY,
+        as_frame=True,
+        profiler=profiler,
+        rng=np.random.default_rng()
+    )
+
+
+def simulate(job):
+    profiler = None
+    if profile_enabled:
+        profiler = StageProfiler(trace=True)
+        with profiler:
+            df = run_simulation(profiler)
+    else:
+        df = run_simulation()
+    caches['模拟结果'].put(sim_key, df)
+    job.advance(1)
+    return df, profiler
+
+
+def submit_simulation():
+    job = jobs.submit(simulate, key=job_key, label=f"模拟 模式{IP} 第{day_begin}-{day_end}天")
+    st.session_state['job_id'] = job.id
+    return job
+
+
 if st.button("🚀 运行模拟", type="primary", use_container_width=True):
-    with st.spinner("正在进行甲烷排放模拟计算..."):
+    st.session_state['sim_key'] = sim_key
+    if profile_enabled or sim_key not in caches['模拟结果']:
+        submit_simulation()
+
+result_df, profiler = None, None
+if st.session_state.get('sim_key') == sim_key:
+    if not profile_enabled:
+        result_df = caches['模拟结果'].get(sim_key)
+    if result_df is None:
+        job = jobs.get(st.session_state.get('job_id'))
+        if job is None or job.key != job_key:
+            job = submit_simulation()
+        if job.status == DONE:
+            result_df, profiler = job.result
+        elif job.status == FAILED:
+            st.error(f"❌ 计算出错: {str(job.error)}")
+        elif job.status == CANCELLED:
+            st.warning("⏹️ 模拟已取消")
+        else:
+            job_panel(job, "正在进行甲烷排放模拟计算...")
+
+    if result_df is not None:
         try:
             # 调试信息输出
             st.write("🔍 调试信息 - 输入参数:")
@@ -266,18 +382,6 @@ if st.button("🚀 运行模拟", type="primary", use_container_width=True):
             }
             st.json(debug_info)
             
-            # 调用CH4Flux_day函数
-            result_df = CH4Flux_day(
-                day_begin=day_begin,
-                day_end=day_end,
-                IP=IP,
-                sand=sand,
-                Tair=Tair,
-                OMS=OMS,
-                OMN=OMN,
-                GY=GY
-            )
-            
             # 显示结果
             st.success("✅ 模拟计算完成！")
             
@@ -285,47 +389,38 @@ if st.button("🚀 运行模拟", type="primary", use_container_width=True):
             st.subheader("📋 每日模拟结果")
             st.dataframe(result_df.round(4), use_container_width=True, height=300)
             
-            # 关键指标可视化（带单位）
+            # 关键指标可视化（带单位），plotly 交互图，曲线超过 ResultsView.MAX_POINTS 个点时在服务端降采样
             st.subheader("📈 甲烷排放趋势")
-            fig, ax = plt.subplots(figsize=(12, 6))
-            ax.plot(result_df['DAT'], result_df['E'], label='总甲烷排放 (E, g/m²/d)', color='red', linewidth=2)
-            ax.plot(result_df['DAT'], result_df['Ebl'], label='气泡排放 (Ebl, g/m²/d)', linestyle='--', color='blue', linewidth=2)
-            ax.plot(result_df['DAT'], result_df['Ep'], label='植株传输 (Ep, g/m²/d)', linestyle='-.', color='green', linewidth=2)
-            ax.set_xlabel('日序 (DAT)', fontsize=12)
-            ax.set_ylabel('甲烷排放量 (g/m²/d)', fontsize=12)
-            ax.legend(fontsize=10)
-            ax.grid(True, alpha=0.3)
-            plt.tight_layout()
-            st.pyplot(fig)
-            
+            emission_lines = {
+                'E': '总甲烷排放 (E, g/m²/d)',
+                'Ebl': '气泡排放 (Ebl, g/m²/d)',
+                'Ep': '植株传输 (Ep, g/m²/d)',
+            }
+            shown = st.multiselect("显示的排放分量", options=list(emission_lines), default=list(emission_lines))
+            dat = result_df['DAT'].to_numpy()
+            st.plotly_chart(ResultsView.series_figure(
+                dat, {name: (result_df[name].to_numpy(), emission_lines[name]) for name in shown},
+                '甲烷排放量 (g/m²/d)'), use_container_width=True)
+
             # 辅助变量可视化（带单位）
             st.subheader("🌡️ 关键环境因子")
-            fig2, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), sharex=True)
-            ax1.plot(result_df['DAT'], result_df['Tsoil'], label='土壤温度', color='orange', linewidth=2)
-            ax1.set_ylabel('土壤温度 (°C)', fontsize=12)
-            ax1.legend(fontsize=10)
-            ax1.grid(True, alpha=0.3)
-            
-            ax2.plot(result_df['DAT'], result_df['Eh'], label='氧化还原电位', color='purple', linewidth=2)
-            ax2.set_xlabel('日序 (DAT)', fontsize=12)
-            ax2.set_ylabel('氧化还原电位 (mV)', fontsize=12)
-            ax2.legend(fontsize=10)
-            ax2.grid(True, alpha=0.3)
-            plt.tight_layout()
-            st.pyplot(fig2)
-            
+            col_env1, col_env2 = st.columns(2)
+            with col_env1:
+                st.plotly_chart(ResultsView.series_figure(
+                    dat, {'Tsoil': (result_df['Tsoil'].to_numpy(), '土壤温度')}, '土壤温度 (°C)', height=350),
+                    use_container_width=True)
+            with col_env2:
+                st.plotly_chart(ResultsView.series_figure(
+                    dat, {'Eh': (result_df['Eh'].to_numpy(), '氧化还原电位')}, '氧化还原电位 (mV)', height=350),
+                    use_container_width=True)
+
             # 生物量相关（带单位）
             st.subheader("🌱 生物量变化")
-            fig3, ax = plt.subplots(figsize=(12, 6))
-            ax.plot(result_df['DAT'], result_df['W'], label='地上生物量 (W, g/m²)', color='green', linewidth=2)
-            ax.plot(result_df['DAT'], result_df['Wroot'], label='根系生物量 (Wroot, g/m²)', color='brown', linewidth=2)
-            ax.set_xlabel('日序 (DAT)', fontsize=12)
-            ax.set_ylabel('生物量 (g/m²)', fontsize=12)
-            ax.legend(fontsize=10)
-            ax.grid(True, alpha=0.3)
-            plt.tight_layout()
-            st.pyplot(fig3)
-            
+            st.plotly_chart(ResultsView.series_figure(
+                dat, {'W': (result_df['W'].to_numpy(), '地上生物量 (W, g/m²)'),
+                      'Wroot': (result_df['Wroot'].to_numpy(), '根系生物量 (Wroot, g/m²)')}, '生物量 (g/m²)'),
+                use_container_width=True)
+
             # 总排放量统计（带单位）
             total_emission = result_df['E'].sum()
             ebl_percentage = result_df['Ebl'].sum() / total_emission * 100 if total_emission > 0 else 0
@@ -341,6 +436,16 @@ if st.button("🚀 运行模拟", type="primary", use_container_width=True):
             with col_stat3:
                 st.metric("植株传输占比", f"{ep_percentage:.1f}%")
             
+            # 性能分析结果
+            if profiler is not None:
+                with st.expander("⏱️ 性能分析", expanded=True):
+                    st.write(f"总耗时: {profiler.wall * 1000:.2f} ms")
+                    summary = profiler.summary()
+                    st.dataframe(summary.style.format({'seconds': '{:.6f}', 'share': '{:.1%}'}))
+                    st.bar_chart(summary['seconds'])
+                    st.write("**逐日中间状态:**")
+                    st.dataframe(profiler.trace_frame(), height=250)
+
             # 数据导出功能
             st.subheader("💾 数据导出")
             csv = result_df.to_csv(index=False)
@@ -359,10 +464,111 @@ if st.button("🚀 运行模拟", type="primary", use_container_width=True):
                 file_name=f"result_py.txt",
                 mime="text/plain"
             )
+
+            # 二进制列式格式，体积更小、读取更快（可用 ResultStore.open_result 按列读取）
+            st.download_button(
+                label="📥 下载模拟结果NPZ (NumPy)",
+                data=to_bytes(result_df, 'npz'),
+                file_name=f"CH4MOD_simulation_IP{IP}_results.npz",
+                mime="application/octet-stream"
+            )
+            if has_parquet():
+                st.download_button(
+                    label="📥 下载模拟结果Parquet",
+                    data=to_bytes(result_df, 'parquet'),
+                    file_name=f"CH4MOD_simulation_IP{IP}_results.parquet",
+                    mime="application/octet-stream"
+                )
             
         except Exception as e:
             st.error(f"❌ 计算出错: {str(e)}")
 
+# 批量模拟：参数文件有多行时，在后台逐块计算全部行，已完成的行随时显示
+def batch_totals(frames):
+    totals = pd.concat(frames).groupby('Row')[['E', 'Ebl', 'Ep']].sum()
+    return totals.rename(columns={'E': 'E (g/m²)', 'Ebl': 'Ebl (g/m²)', 'Ep': 'Ep (g/m²)'})
+
+
+def batch_view(job_key, frame):
+    # 分位数包络线与季节总量直方图由 ResultsView.summarize 预先计算并缓存，
+    # 重新渲染的耗时与批量行数无关
+    summary = caches['模拟结果'].get_or_compute(hash_key('view', job_key), lambda: ResultsView.summarize(frame))
+    st.subheader(f"📈 批量结果分布（{summary['fields']} 个田块）")
+    name = st.selectbox("分量", options=list(summary['bands']), key='batch_band_column')
+    st.plotly_chart(ResultsView.summary_band_figure(summary, name), use_container_width=True)
+    st.plotly_chart(ResultsView.summary_histogram_figure(summary), use_container_width=True)
+    cols = st.columns(len(summary['total_mean']))
+    for col, (name, mean) in zip(cols, summary['total_mean'].items()):
+        with col:
+            st.metric(f"{name} 季节总量均值", f"{mean:.2f} g/m²")
+
+
+# 批量结果的下载文件：逐日长表序列化为 TXT 很慢（5000 个田块约 25 s），只在点击“准备”后生成一次，
+# 按任务缓存在 caches['模拟结果'] 中，之后的重新渲染（切换分量、点击下载）直接使用缓存的字节串
+BATCH_DOWNLOADS = [('npz', "NPZ", "CH4MOD_batch_results.npz", "application/octet-stream"),
+                   ('txt', "TXT", "result_batch.txt", "text/plain")]
+
+
+def batch_downloads(job_key, frame):
+    cols = st.columns(len(BATCH_DOWNLOADS))
+    for col, (fmt, label, file_name, mime) in zip(cols, BATCH_DOWNLOADS):
+        key = hash_key('download', job_key, fmt)
+        with col:
+            if key in caches['模拟结果'] or st.button(f"🗜️ 准备批量结果{label}", key=f"prepare_batch_{fmt}"):
+                data = caches['模拟结果'].get_or_compute(key, lambda: to_bytes(frame, fmt))
+                st.download_button(f"📥 下载批量结果{label}", data=data, file_name=file_name, mime=mime,
+                                   key=f"download_batch_{fmt}")
+
+
+def show_partial(job):
+    frames = job.results()
+    if frames:
+        st.dataframe(batch_totals(frames).round(4), use_container_width=True, height=250)
+
+
+if input_method == "CSV文件输入 (与Run.py一致)" and len(data) > 1:
+    st.subheader(f"📦 批量模拟（共 {len(data)} 行，后台运行）")
+    batch_key = hash_key('batch', param_file.getvalue(), Tair)
+    if st.button(f"🚀 后台运行全部 {len(data)} 行", use_container_width=True):
+        job = jobs.submit(lambda job: run_rows(job, data, Tair), total=len(data), key=batch_key,
+                          label=f"批量模拟 {len(data)} 行")
+        st.session_state['batch_job_id'] = job.id
+    job = jobs.get(st.session_state.get('batch_job_id'))
+    if job is not None and job.key == batch_key:
+        if job.status == DONE:
+            st.success(f"✅ 批量模拟完成，{job.total} 行用时 {job.seconds:.2f} s")
+            totals = caches['模拟结果'].get_or_compute(hash_key('totals', job.key),
+                                                      lambda: batch_totals([job.result]).round(4))
+            st.dataframe(totals, use_container_width=True, height=250)
+            batch_view(job.key, job.result)
+            batch_downloads(job.key, job.result)
+        elif job.status == FAILED:
+            st.error(f"❌ 批量模拟出错: {str(job.error)}")
+        elif job.status == CANCELLED:
+            st.warning(f"⏹️ 批量模拟已取消，已完成 {job.done}/{job.total} 行")
+            show_partial(job)
+        else:
+            job_panel(job, "正在批量模拟", show_partial)
+
+# 后台任务列表（所有会话）
+with st.sidebar.expander("🧵 后台任务"):
+    job_table = jobs.table()
+    if len(job_table):
+        st.dataframe(job_table, hide_index=True)
+    else:
+        st.write("暂无任务")
+
+# 缓存调试信息
+with st.sidebar.expander("🐞 缓存调试信息"):
+    caches = {**caches, '驱动变量': FORCING_CACHE}
+    for cache_name, cache in caches.items():
+        stats = cache.stats()
+        st.write(f"**{cache_name}**: 命中 {stats['hits']} / 未命中 {stats['misses']}，"
+                 f"条目 {stats['size']}/{stats['maxsize']}，淘汰 {stats['evictions']}")
+    if st.button("清空缓存"):
+        for cache in caches.values():
+            cache.clear()
+
 # 页脚信息
 st.markdown("---")
 st.caption("🌾 CH4MOD稻田甲烷排放模型模拟工具 v2.0 | 支持CSV文件和手动输入两种模式 |")
\ No newline at end of file
@@ -0,0 +1,108 @@
+import time
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+import ResultsView
+from CH4MOD import (TemperatureIndex, ShootBiomass, EhvalueD, FEh, CH4EmissionBbl, CH4RiceEf,
+                    RiceRootBiomass)
+
+st.set_page_config(page_title="CH4MOD经验公式探索", page_icon="🧮", layout="wide")
+st.title("🧮 CH4MOD经验公式探索")
+st.markdown("选择一个经验公式，在一维或二维参数网格上一次性计算（公式函数直接接受数组，不逐点调用）。")
+
+# 公式: (函数, 说明, [(参数名, 标签, 默认值, 最小值, 最大值), ...])，参数顺序与函数签名一致
+FORMULAS = {
+    'TemperatureIndex': (TemperatureIndex, r"TI = Q_{10}^{(\min(T_{soil}, 30) - 30)/10}", [
+        ('Q10', 'Q10', 3.0, 1.0, 5.0),
+        ('t_soil', '土壤温度 t_soil (°C)', 25.0, -5.0, 45.0),
+    ]),
+    'ShootBiomass': (ShootBiomass, r"W = \frac{W_{max}}{1 + (W_{max}/W_0 - 1) e^{-r t}}", [
+        ('t', '移栽后天数 t (d)', 60.0, 0.0, 150.0),
+        ('r', '相对生长率 r', 0.1, 0.01, 0.3),
+        ('W0', '初始生物量 W0 (g/m²)', 20.0, 1.0, 50.0),
+        ('Wmax', '最大生物量 Wmax (g/m²)', 900.0, 100.0, 2000.0),
+    ]),
+    'EhvalueD': (EhvalueD, r"\Delta Eh = (Eh - Eh_0) \cdot EhR \cdot (0.23 + \min(1, OMND))", [
+        ('Eh', '氧化还原电位 Eh (mV)', 250.0, -300.0, 300.0),
+        ('Eh0', '目标电位 Eh0 (mV)', -250.0, -300.0, 300.0),
+        ('EhR', '变化速率 EhR', 0.1, 0.0, 0.3),
+        ('OMND', '有机质分解量 OMND', 0.5, 0.0, 3.0),
+    ]),
+    'FEh': (FEh, r"F_{Eh} = e^{-1.7 (1 + Eh/150)}\ (Eh \ge -150),\ 1\ (Eh < -150)", [
+        ('Eh', '氧化还原电位 Eh (mV)', -100.0, -300.0, 300.0),
+    ]),
+    'CH4EmissionBbl': (CH4EmissionBbl, r"E_{bl} = \min(0.7 \ln T_{soil} / W_{root}, 0.9) \cdot P", [
+        ('P', '甲烷产生量 P (g/m²/d)', 1.0, 0.0, 5.0),
+        ('t_soil', '土壤温度 t_soil (°C)', 25.0, -5.0, 45.0),
+        ('Wr', '根系生物量 Wr (g/m²)', 50.0, 0.0, 300.0),
+    ]),
+    'CH4RiceEf': (CH4RiceEf, r"F_p = C \cdot (1 - W / W_{max})^{0.25}", [
+        ('CH4RiceEfC', '系数 C', 0.55, 0.3, 0.9),
+        ('W', '地上生物量 W (g/m²)', 500.0, 0.0, 2000.0),
+        ('Wmax', '最大生物量 Wmax (g/m²)', 1000.0, 100.0, 2000.0),
+    ]),
+    'RiceRootBiomass': (RiceRootBiomass, r"W_{total} = 0.212 W_{total}^{0.936} + W,\ W_{root} = W_{total} - W", [
+        ('W', '地上生物量 W (g/m²)', 500.0, 0.0, 2000.0),
+    ]),
+}
+
+name = st.sidebar.selectbox("公式", options=list(FORMULAS))
+func, formula, params = FORMULAS[name]
+st.latex(formula)
+labels = {p[0]: p[1] for p in params}
+names = [p[0] for p in params]
+
+mode = st.sidebar.radio("网格", options=["一维", "二维"] if len(params) > 1 else ["一维"], horizontal=True)
+x_name = st.sidebar.selectbox("横轴参数", options=names, format_func=labels.get)
+y_name = None
+if mode == "二维":
+    y_name = st.sidebar.selectbox("纵轴参数", options=[n for n in names if n != x_name], format_func=labels.get)
+n_points = st.sidebar.select_slider("每个轴的网格点数", options=[100, 300, 1000, 3000] if mode == "一维"
+                                    else [50, 100, 300, 1000], value=1000 if mode == "一维" else 300)
+
+args = {}
+axes = {}
+st.sidebar.subheader("参数取值")
+for pname, label, default, lo, hi in params:
+    if pname in (x_name, y_name):
+        rng = st.sidebar.slider(f"{label} 范围", min_value=lo, max_value=hi, value=(lo, hi))
+        axes[pname] = np.linspace(rng[0], rng[1], n_points)
+    else:
+        args[pname] = st.sidebar.number_input(label, value=default)
+
+# 一维时变量为 (n,) 数组，二维时为 (n, n) 网格（行对应纵轴），其余参数为标量
+if y_name is None:
+    args[x_name] = axes[x_name]
+else:
+    X, Y = np.meshgrid(axes[x_name], axes[y_name])
+    args[x_name] = X
+    args[y_name] = Y
+
+t0 = time.perf_counter()
+with np.errstate(all='ignore'):
+    values = np.broadcast_to(func(*(args[n] for n in names)), args[x_name].shape).astype(float)
+elapsed = time.perf_counter() - t0
+st.caption(f"{values.size:,} 个网格点，一次向量化调用用时 {elapsed * 1000:.2f} ms")
+
+# 与结果页相同使用 plotly：曲线超过 ResultsView.MAX_POINTS 个点时降采样，
+# 热图每个轴最多显示 HEATMAP_MAX 个点（等间隔抽取），统计值仍使用完整网格
+HEATMAP_MAX = 400
+if y_name is None:
+    fig = ResultsView.series_figure(axes[x_name], {name: (values, name)}, ytitle=name, xtitle=labels[x_name],
+                                    height=500)
+else:
+    step = -(-n_points // HEATMAP_MAX)
+    fig = go.Figure(go.Heatmap(x=axes[x_name][::step], y=axes[y_name][::step], z=values[::step, ::step],
+                               colorscale='Viridis', colorbar=dict(title=name)))
+    fig.update_layout(xaxis_title=labels[x_name], yaxis_title=labels[y_name], height=600,
+                      margin=dict(l=10, r=10, t=30, b=10))
+st.plotly_chart(fig, use_container_width=True)
+
+finite = values[np.isfinite(values)]
+col1, col2, col3 = st.columns(3)
+with col1:
+    st.metric("最小值", f"{finite.min():.4g}" if finite.size else "—")
+with col2:
+    st.metric("最大值", f"{finite.max():.4g}" if finite.size else "—")
+with col3:
+    st.metric("无定义（NaN）点数", f"{values.size - finite.size:,}")
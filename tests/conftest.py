@@ -0,0 +1,31 @@
+import os
+import numpy as np
+import pytest
+from CH4MOD import WaterRegimeDaily
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAIR_FILE = os.path.join(ROOT, '长沙气温2003.txt')
+# run.csv 第一行的参数
+BASE = dict(sand=30.0, OMS=1300.0, OMN=1600.0, GY=4000.0)
+# 不出现 3 号水分状态（随机的 Eh 和土壤含水量）的水分模式，结果与随机数无关
+DETERMINISTIC_REGIMES = [ip for ip in (1, 2, 3, 4, 5) if 3 not in WaterRegimeDaily(ip, 121, BASE['sand'])]
+
+
+@pytest.fixture(scope='session')
+def tair():
+    return np.loadtxt(TAIR_FILE)
+
+
+class Interrupt(Exception):
+    pass
+
+
+def interrupt_after(n):
+    # 作为 progress 回调：第 n 次调用时抛出异常，模拟任务在完成 n 个分块后被中断
+    calls = []
+
+    def progress(message):
+        calls.append(message)
+        if len(calls) == n:
+            raise Interrupt(message)
+    return progress
@@ -0,0 +1,42 @@
+import numpy as np
+from CH4MOD import CH4_COLUMNS, FORCING_CACHE, WATER_CACHE, CH4Flux_array, CH4Flux_batch, WaterRegimeDaily
+from conftest import BASE, DETERMINISTIC_REGIMES
+
+
+def test_batch_matches_scalar_for_deterministic_regimes(tair):
+    # 不同生长季长度和沙粒含量的田块一起批量计算，逐田块与单田块结果比较
+    cases = [(ip, dur, sand) for ip in (1, 2, 3, 4, 5) for dur in (90, 121) for sand in (10.0, 30.0, 60.0)
+             if 3 not in WaterRegimeDaily(ip, dur, sand)]
+    assert cases
+    ip, dur, sand = (np.array(v) for v in zip(*cases))
+    batch = CH4Flux_batch(np.full(len(ip), 160), 160 + dur - 1, ip, sand, tair, BASE['OMS'], BASE['OMN'], BASE['GY'])
+    for k, (ip_k, dur_k, sand_k) in enumerate(cases):
+        ref = CH4Flux_array(160, 160 + dur_k - 1, ip_k, sand_k, tair, BASE['OMS'], BASE['OMN'], BASE['GY'])
+        for name in CH4_COLUMNS:
+            np.testing.assert_allclose(batch[name][k, :dur_k], ref[name], rtol=1e-12, atol=1e-15, err_msg=name)
+        assert np.isnan(batch['E'][k, dur_k:]).all()
+
+
+def test_deterministic_regimes_exist():
+    assert DETERMINISTIC_REGIMES
+
+
+def test_continuous_sand_shares_water_schedules(tair):
+    # 砂含量只以 int((1 - sand/100) * 10) 影响水分日程：连续取值的田块与逐田块计算一致，
+    # 日程按分档缓存在 WATER_CACHE 中，不占用 FORCING_CACHE
+    rng = np.random.default_rng(3)
+    n = 400
+    ip = rng.integers(1, 6, n)
+    sand = rng.uniform(0, 100, n)
+    noise = rng.random((n, 121, 2))
+    WATER_CACHE.clear()
+    forcing = len(FORCING_CACHE)
+    batch = CH4Flux_batch(160, 280, ip, sand, tair, BASE['OMS'], BASE['OMN'], BASE['GY'], noise=noise)
+    assert len(WATER_CACHE) <= 2 * 11 + 3 and len(FORCING_CACHE) == forcing
+    uncached = CH4Flux_batch(160, 280, ip, sand, tair, BASE['OMS'], BASE['OMN'], BASE['GY'], noise=noise, cache=None)
+    for k in range(0, n, 37):
+        one = CH4Flux_batch(160, 280, ip[k], sand[k], tair, BASE['OMS'], BASE['OMN'], BASE['GY'],
+                            noise=noise[k:k + 1], cache=None)
+        for name in CH4_COLUMNS:
+            np.testing.assert_array_equal(batch[name][k], one[name][0], err_msg=name)
+            np.testing.assert_array_equal(uncached[name][k], one[name][0], err_msg=name)
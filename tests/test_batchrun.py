@@ -0,0 +1,78 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from BatchRun import PARAM_COLUMNS, run_batch
+from ResultStore import open_result
+from conftest import TAIR_FILE, Interrupt, interrupt_after
+
+
+@pytest.fixture
+def param_file(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 25
+    start = rng.integers(150, 170, n)
+    frame = pd.DataFrame({'GrainYield': rng.uniform(3000, 9000, n), 'SoilSand': rng.uniform(5, 80, n),
+                          'OMN': rng.uniform(0, 3000, n), 'OMS': rng.uniform(0, 3000, n),
+                          'WaterRegime': rng.integers(1, 6, n), 'StartDay': start,
+                          'EndDay': start + rng.integers(80, 121, n), 'Year': 2003})
+    assert list(frame.columns) == list(PARAM_COLUMNS)
+    shutil.copy(TAIR_FILE, tmp_path / 'station-2003.txt')
+    path = tmp_path / 'params.csv'
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def _run(param_file, output, progress=None, workers=1, **kwargs):
+    pattern = os.path.join(os.path.dirname(param_file), 'station-{Year}.txt')
+    return run_batch(param_file, output, pattern=pattern, workers=workers, chunk_size=4, seed=5, progress=progress,
+                     **kwargs)
+
+
+def _frame(path):
+    return open_result(path).to_frame()
+
+
+@pytest.mark.parametrize('aggregate', [True, False])
+def test_worker_count_does_not_change_results(param_file, tmp_path, aggregate):
+    # 每块的随机数由（seed，分块号）决定，与进程数和完成顺序无关
+    _run(param_file, str(tmp_path / 'one.npz'), aggregate=aggregate)
+    _run(param_file, str(tmp_path / 'two.npz'), aggregate=aggregate, workers=2)
+    # 分块按完成顺序写出，按行号（和日序）排序后比较
+    keys = ['Row'] if aggregate else ['Row', 'DAT']
+    one, two = (_frame(tmp_path / name).sort_values(keys).reset_index(drop=True) for name in ('one.npz', 'two.npz'))
+    pd.testing.assert_frame_equal(one, two)
+    assert sorted(set(one['Row'])) == list(range(25))
+
+
+@pytest.mark.parametrize('aggregate', [True, False])
+def test_resume_matches_uninterrupted(param_file, tmp_path, aggregate):
+    full = tmp_path / 'full.npz'
+    _run(param_file, str(full), aggregate=aggregate)
+    out = tmp_path / 'resumed.npz'
+    ckpt = tmp_path / 'ckpt'
+    with pytest.raises(Interrupt):
+        _run(param_file, str(out), aggregate=aggregate, checkpoint=str(ckpt), progress=interrupt_after(3))
+    assert not out.exists()
+    stats = _run(param_file, str(out), aggregate=aggregate, checkpoint=str(ckpt))
+    assert stats['skipped'] == 12 and stats['rows'] == 13
+    pd.testing.assert_frame_equal(_frame(out), _frame(full))
+    if aggregate:
+        assert list(_frame(out)['Row']) == list(range(25))
+
+
+def test_changed_options_restart_checkpoint(param_file, tmp_path):
+    ckpt = tmp_path / 'ckpt'
+    with pytest.raises(Interrupt):
+        _run(param_file, str(tmp_path / 'a.npz'), aggregate=True, checkpoint=str(ckpt), progress=interrupt_after(2))
+    stats = _run(param_file, str(tmp_path / 'b.npz'), aggregate=False, checkpoint=str(ckpt))
+    assert stats['skipped'] == 0 and stats['rows'] == 25
+
+
+def test_invalid_rows_are_reported(param_file, tmp_path):
+    frame = pd.read_csv(param_file)
+    frame.loc[6, 'WaterRegime'] = 7
+    frame.to_csv(param_file, index=False)
+    with pytest.raises(ValueError, match=r"rows \[6\]"):
+        _run(param_file, str(tmp_path / 'out.npz'), aggregate=True)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import Benchmark
+from conftest import ROOT
+
+
+@pytest.fixture(autouse=True)
+def in_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+def test_golden_records_inputs(tair):
+    with np.load(Benchmark.GOLDEN_FILE) as golden:
+        assert int(golden['seed']) == Benchmark.GOLDEN_SEED
+        np.testing.assert_array_equal(golden['tair'], tair)
+        assert golden['params'].tolist() == [Benchmark.BASE[k] for k in ('sand', 'OMS', 'OMN', 'GY')]
+
+
+def test_check_golden_passes():
+    assert Benchmark.check_golden()['max_abs_diff'] < Benchmark.ROOT_ABS_TOL
+
+
+def test_check_golden_detects_small_flux_change(monkeypatch):
+    # 排放列的容差来自根系生物量的误差传播，1e-8 的改变已超出
+    run = Benchmark.CH4Flux_day
+
+    def shifted(*args, **kwargs):
+        out = run(*args, **kwargs)
+        out['E'] += 1e-8
+        return out
+    monkeypatch.setattr(Benchmark, 'CH4Flux_day', shifted)
+    with pytest.raises(AssertionError, match=r"\['E'\]"):
+        Benchmark.check_golden()
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Calibration import Calibrator, _simulate, align_observed
+
+
+def test_align_observed_table():
+    obs = align_observed(pd.DataFrame({'DAT': [159, 160, 165, 400], 'E': [9.0, 1.0, 2.0, 9.0]}), 160, 169)
+    assert obs[0] == 1.0 and obs[5] == 2.0 and np.isnan(obs).sum() == 8
+    with pytest.raises(ValueError):
+        align_observed(np.zeros(5), 160, 169)
+
+
+def test_recovers_synthetic_parameters(tair):
+    # 用与率定相同的随机扰动生成"观测"，已知参数处的目标函数为 0
+    cal = Calibrator(160, 280, 2, tair, np.zeros(121), seed=0)
+    truth = np.array([[2200.0, 900.0]])
+    cal.obs = _simulate(truth, cal.names, 160, 280, 2, tair, cal.noise)[0]
+    assert cal.objective(truth)[0] == pytest.approx(0, abs=1e-12)
+    result = cal.fit(popsize=16, generations=40)
+    assert result['rmse'] < 0.02 * np.abs(cal.obs).max()
+    assert result['history'] == sorted(result['history'], reverse=True)
+    assert cal.objective(truth)[0] == 0 and cal.cache.stats()['hits'] >= 1
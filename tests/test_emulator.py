@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from Emulator import Emulator
+
+
+@pytest.fixture(scope='module')
+def emulator():
+    tair = np.loadtxt(__import__('conftest').TAIR_FILE)
+    em = Emulator(160, 280, tair[:121], degree=3, regimes=(2, 4), seed=0)
+    em.fit(n_train=300, n_test=100)
+    return em
+
+
+def test_fit_reports_errors(emulator):
+    assert set(emulator.errors) == {2, 4}
+    for IP in (2, 4):
+        e = emulator.errors[IP]['E']
+        assert 0 <= e['rmse'] <= e['max_abs']
+        assert e['max_abs'] < 0.2 * np.mean(emulator.simulate([[4000, 30, 1600, 1300]], IP)[:, 0])
+
+
+def test_predict_inside_and_fallback(emulator):
+    out = emulator.predict([4000, 4000, 4000], 30, [1600, 9000, 1600], 1300, [2, 2, 3])
+    assert out['emulated'].tolist() == [True, False, False]
+    X = np.array([[4000, 30, 9000, 1300], [4000, 30, 1600, 1300]])
+    np.testing.assert_allclose(out['E'][1:], [emulator.simulate(X[:1], 2)[0, 0], emulator.simulate(X[1:], 3)[0, 0]],
+                               rtol=1e-12)
+    assert emulator.fallbacks == 2
+    one = emulator.predict_one(4000, 30, 1600, 1300, 2)
+    assert one['emulated'] and one['E'] == pytest.approx(out['E'][0], rel=1e-9)
+
+
+def test_save_load_round_trip(emulator, tmp_path):
+    path = emulator.save(str(tmp_path / 'em.npz'))
+    loaded = Emulator.load(path)
+    assert loaded.errors == emulator.errors
+    args = ([3000, 5000, 8000], [20, 40, 70], [100, 1500, 4000], [300, 2000, 4500], 4)
+    a = emulator.predict(*args)
+    b = loaded.predict(*args)
+    for name in ('E', 'Ebl', 'Ep'):
+        np.testing.assert_array_equal(a[name], b[name])
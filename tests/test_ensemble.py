@@ -0,0 +1,48 @@
+import numpy as np
+from Ensemble import CH4Flux_ensemble, DailyQuantiles
+from conftest import BASE
+
+
+def _run(tair, **kwargs):
+    return CH4Flux_ensemble(160, 280, 3, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'], seed=2,
+                            **kwargs)
+
+
+def test_independent_of_chunk_size(tair):
+    a = _run(tair, n_members=50, chunk_size=50)
+    b = _run(tair, n_members=50, chunk_size=7)
+    np.testing.assert_allclose(a['mean'].to_numpy(), b['mean'].to_numpy(), rtol=1e-10, atol=1e-15)
+    np.testing.assert_allclose(a['std'].to_numpy(), b['std'].to_numpy(), rtol=1e-8, atol=1e-9)
+    np.testing.assert_allclose(a['totals'].to_numpy(), b['totals'].to_numpy(), rtol=1e-12)
+    for q in a['quantiles']:
+        np.testing.assert_allclose(a['quantiles'][q]['E'], b['quantiles'][q]['E'], rtol=1e-12)
+    # 成员数不同时前面的成员结果不变
+    c = _run(tair, n_members=20, chunk_size=7)
+    np.testing.assert_allclose(c['totals'].to_numpy(), a['totals'].to_numpy()[:20], rtol=1e-12)
+
+
+def test_members_differ(tair):
+    totals = _run(tair, n_members=20)['totals']['E']
+    assert totals.nunique() > 1
+
+
+def test_streaming_quantiles_bounded(tair):
+    # 超过 exact 个成员后改为直方图：内存与成员数无关，误差在一个区间宽度以内
+    rng = np.random.default_rng(0)
+    x = rng.gamma(2.0, 1.0, (20000, 3)) * [1, 10, 100]
+    dq = DailyQuantiles(3, exact=1000, bins=512)
+    for lo in range(0, len(x), 1500):
+        dq.add(x[lo:lo + 1500])
+    assert dq.buffer.size == 0 and dq.hist.shape == (512, 3)
+    for q in (0.05, 0.5, 0.95):
+        np.testing.assert_array_less(np.abs(dq.quantile(q) - np.quantile(x, q, axis=0)), dq.width)
+    exact = DailyQuantiles(3, exact=len(x))
+    exact.add(x)
+    np.testing.assert_array_equal(exact.quantile(0.5), np.quantile(x, 0.5, axis=0))
+
+
+def test_quantiles_with_histogram_close_to_exact(tair):
+    a = _run(tair, n_members=400, chunk_size=100)
+    b = _run(tair, n_members=400, chunk_size=100, quantile_exact=100)
+    for q in a['quantiles']:
+        np.testing.assert_allclose(a['quantiles'][q]['E'], b['quantiles'][q]['E'], atol=1e-3)
@@ -0,0 +1,33 @@
+import itertools
+import numpy as np
+import pytest
+from CH4MOD import (CH4EmissionBbl, CH4RiceEf, EhvalueD, FEh, RiceRootBiomass, ShootBiomass, TemperatureIndex)
+
+# 每个经验公式的参数取值，包括模型中不会出现的范围（负值、0、超过上限、nan）和分支的边界
+GRIDS = {
+    TemperatureIndex: [(1.0, 2.0, 3.0), (-10.0, 0.0, 29.9, 30.0, 35.0, 40.0, 45.0, np.nan)],
+    ShootBiomass: [(-5.0, 0.0, 60.0, 200.0), (0.01, 0.1), (-1.0, 0.0, 20.0, 2000.0), (0.0, 900.0)],
+    EhvalueD: [(-300.0, 250.0), (-250.0, 0.0), (0.0, 0.1), (-1.0, 0.0, 0.5, 1.0, 3.0, np.nan)],
+    FEh: [(-300.0, -150.0, -149.9, 0.0, 300.0, np.nan)],
+    CH4EmissionBbl: [(0.0, 1.0, 5.0), (-5.0, 0.0, 0.5, 1.0, 25.0, 45.0), (-10.0, 0.0, 0.1, 50.0, 300.0)],
+    CH4RiceEf: [(0.3, 0.55), (-100.0, 0.0, 500.0, 1000.0, 1500.0, 2000.0, np.nan), (-1000.0, 0.0, 100.0, 1000.0)],
+    RiceRootBiomass: [(-1.0, 0.0, 1e-3, 1.0, 500.0, 2000.0, np.nan)],
+}
+
+
+@pytest.mark.parametrize('func', list(GRIDS), ids=lambda f: f.__name__)
+def test_array_matches_scalar(func):
+    # 标量路径返回复数时转换为 float 会报错；nan 的位置也必须一致
+    cases = list(itertools.product(*GRIDS[func]))
+    with np.errstate(all='ignore'):
+        scalar = np.array([func(*case) for case in cases], dtype=float)
+        array = func(*(np.array(values) for values in zip(*cases)))
+    assert array.shape == scalar.shape
+    np.testing.assert_array_equal(array, scalar)
+
+
+def test_fp_is_zero_above_wmax():
+    # 公式探索页面的默认范围中 W 可超过 Wmax；只有 W 为数组时同样走数组路径
+    assert CH4RiceEf(0.55, 1500.0, 1000.0) == 0.0
+    np.testing.assert_array_equal(CH4RiceEf(0.55, np.array([500.0, 1000.0, 1500.0]), 1000.0),
+                                  [CH4RiceEf(0.55, 500.0, 1000.0), 0.0, 0.0])
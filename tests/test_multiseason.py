@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from CH4MOD import CH4Flux_array, CH4Flux_batch
+from MultiSeason import CH4Flux_seasons, main, run_sites
+from conftest import BASE, TAIR_FILE
+
+
+def _rotation(ip=4):
+    return [{'StartDay': 120, 'EndDay': 200, 'WaterRegime': ip, 'GrainYield': BASE['GY'], 'OMN': 800.0,
+             'OMS': 500.0},
+            {'StartDay': 210, 'EndDay': 300, 'WaterRegime': ip, 'GrainYield': BASE['GY'], 'OMN': 400.0,
+             'OMS': 900.0}]
+
+
+@pytest.mark.parametrize('ip', [1, 2, 3, 4, 5])
+def test_single_season_matches_run_py_convention(tair, ip):
+    # doy=False 与 Run.py/BatchRun.py 相同，从气温文件第一行起取生长季天数
+    season = {'StartDay': 160, 'EndDay': 280, 'WaterRegime': ip, 'GrainYield': BASE['GY'], 'OMN': BASE['OMN'],
+              'OMS': BASE['OMS']}
+    out = CH4Flux_seasons([season], BASE['sand'], tair, rng=np.random.default_rng(5), doy=False)
+    ref = CH4Flux_array(160, 280, ip, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'], aggregate=True,
+                        rng=np.random.default_rng(5))
+    for name in ('E', 'Ebl', 'Ep', 'OMN', 'OMS'):
+        value = ref[name] * 10 if name in ('OMN', 'OMS') else ref[name]
+        assert out[name][0, 0] == pytest.approx(value, rel=1e-12), name
+    shifted = CH4Flux_seasons([season], BASE['sand'], np.concatenate([np.full(159, np.nan), tair]),
+                              rng=np.random.default_rng(5))
+    np.testing.assert_allclose(shifted['E'], out['E'], rtol=1e-12)
+
+
+def test_seasons_read_their_own_days(tair):
+    # 默认按日序截取：晚稻使用 StartDay..EndDay 的气温，而不是与早稻相同的第一段
+    out = CH4Flux_seasons(_rotation(), BASE['sand'], tair, carry=0.0)
+    for k, season in enumerate(_rotation()):
+        ref = CH4Flux_array(season['StartDay'], season['EndDay'], 4, BASE['sand'], tair[season['StartDay'] - 1:],
+                            season['OMS'], season['OMN'], season['GrainYield'], aggregate=True)
+        assert out['E'][0, k] == pytest.approx(ref['E'], rel=1e-12)
+    assert out['E'][0, 0] != pytest.approx(out['E'][0, 1], rel=1e-3)
+
+
+def test_several_seasons_need_doy(tair, tmp_path):
+    with pytest.raises(ValueError, match="doy=True"):
+        CH4Flux_seasons(_rotation(), BASE['sand'], tair, doy=False)
+    path = tmp_path / 'rotation.csv'
+    keys = list(_rotation()[0]) + ['SoilSand']
+    rows = [','.join(keys)] + [','.join(str(season.get(key, BASE['sand'])) for key in keys) for season in _rotation()]
+    path.write_text('\n'.join(rows) + '\n')
+    with pytest.raises(SystemExit):
+        main([str(path), '--tair', TAIR_FILE])
+
+
+def test_residual_pools_carry_into_next_season(tair):
+    out = CH4Flux_seasons(_rotation(), BASE['sand'], tair, years=2, carry=0.5)
+    assert out['E'].shape == (1, 4)
+    # 第 4 季（第 2 年晚稻）的投入为本季有机质加上一季残留的一半
+    season = _rotation()[1]
+    ref = CH4Flux_batch(season['StartDay'], season['EndDay'], 4, BASE['sand'],
+                        tair[season['StartDay'] - 1:season['EndDay']],
+                        season['OMS'] + 0.5 * out['OMS'][:, 2], season['OMN'] + 0.5 * out['OMN'][:, 2],
+                        season['GrainYield'], aggregate=True)
+    for name in ('E', 'Ebl', 'Ep', 'OMN', 'OMS'):
+        value = ref[name] * 10 if name in ('OMN', 'OMS') else ref[name]
+        np.testing.assert_allclose(out[name][:, 3], value, rtol=1e-12)
+
+
+def test_without_carry_years_repeat(tair):
+    out = CH4Flux_seasons(_rotation(), BASE['sand'], tair, years=3, carry=0.0)
+    np.testing.assert_allclose(out['E'][:, :2], out['E'][:, 2:4], rtol=1e-12)
+    np.testing.assert_allclose(out['E'][:, :2], out['E'][:, 4:], rtol=1e-12)
+    carried = CH4Flux_seasons(_rotation(), BASE['sand'], tair, years=3, carry=1.0)
+    assert (carried['E'][:, 2:] > out['E'][:, 2:]).all()
+
+
+def test_run_sites_independent_of_workers_and_chunks(tair):
+    rng = np.random.default_rng(0)
+    n = 9
+    rotation = _rotation(ip=2)
+    rotation[0]['OMN'] = rng.uniform(0, 2000, n)
+    sand = rng.uniform(10, 60, n)
+    a = run_sites(rotation, sand, tair, years=2, seed=1, chunk_size=4)
+    b = run_sites(rotation, sand, tair, years=2, seed=1, chunk_size=4, workers=2)
+    for name in a:
+        np.testing.assert_array_equal(a[name], b[name])
@@ -0,0 +1,27 @@
+import json
+import numpy as np
+from CH4MOD import CH4Flux_batch, CH4Flux_day, AGGREGATE_COLUMNS
+from conftest import BASE
+
+
+def test_batch_aggregate_matches_daily_sums(tair):
+    ip = np.array([1, 2, 3, 4, 5])
+    kwargs = dict(rng=None, noise=np.random.default_rng(0).random((1, 121, 2)))
+    daily = CH4Flux_batch(np.full(5, 160), 280, ip, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'],
+                          **kwargs)
+    agg = CH4Flux_batch(np.full(5, 160), 280, ip, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'],
+                        aggregate=True, **kwargs)
+    for name in ('E', 'Ebl', 'Ep'):
+        np.testing.assert_allclose(agg[name], daily[name].sum(axis=1), rtol=1e-12)
+    np.testing.assert_array_equal(agg['PeakE'], daily['E'].max(axis=1))
+
+
+def test_output_spec(tair):
+    out = CH4Flux_day(160, 280, 2, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'], columns=['DAT', 'E'],
+                      dtype=np.float32)
+    assert list(out.columns) == ['DAT', 'E']
+    assert (out.dtypes == np.float32).all()
+    agg = CH4Flux_day(160, 280, 2, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'], aggregate=True)
+    assert list(agg) == AGGREGATE_COLUMNS
+    assert all(type(value) is float for value in agg.values())
+    assert json.loads(json.dumps(agg)) == agg
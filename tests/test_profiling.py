@@ -0,0 +1,18 @@
+import numpy as np
+from CH4MOD import CH4_COLUMNS, CH4Flux_array
+from Profiling import STAGES, StageProfiler
+from conftest import BASE
+
+
+def test_profiled_run_times_every_stage_with_warm_cache(tair):
+    # 缓存中已有驱动变量时，性能分析仍逐日计算并计时 biomass、root 阶段，结果与缓存路径相同
+    args = (160, 280, 2, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'])
+    cached = CH4Flux_array(*args, rng=np.random.default_rng(0))
+    for _ in range(2):
+        profiler = StageProfiler(trace=True)
+        profiled = CH4Flux_array(*args, rng=np.random.default_rng(0), profiler=profiler)
+        assert all(profiler.calls[stage] == 121 for stage in STAGES)
+        assert profiler.seconds['biomass'] > 0 and profiler.seconds['root'] > 0
+        assert len(profiler.states) == 121
+        for name in CH4_COLUMNS:
+            np.testing.assert_array_equal(profiled[name], cached[name], err_msg=name)
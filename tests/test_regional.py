@@ -0,0 +1,48 @@
+import json
+import numpy as np
+import pytest
+from Regional import OUTPUTS, REGIONS_FILE, run_region
+from conftest import Interrupt, interrupt_after
+
+
+@pytest.fixture
+def grid_dir(tmp_path, tair):
+    # 7 x 5 个像元，部分像元不是水稻，3 个行政区；OMS、SoilSand 等取 grid.json 中的统一值
+    path = tmp_path / 'grid'
+    path.mkdir()
+    rng = np.random.default_rng(0)
+    shape = (7, 5)
+    np.save(path / 'tair.npy', tair[np.newaxis, np.newaxis, :130] + rng.normal(0, 1, shape + (1,)))
+    np.save(path / 'OMN.npy', rng.uniform(0, 3000, shape))
+    np.save(path / 'WaterRegime.npy', rng.integers(1, 6, shape))
+    np.save(path / 'mask.npy', rng.random(shape) < 0.8)
+    np.save(path / 'region.npy', rng.integers(0, 3, shape))
+    with open(path / 'grid.json', 'w', encoding='utf-8') as f:
+        json.dump({'defaults': {'GrainYield': 4000, 'SoilSand': 30, 'OMS': 1300, 'StartDay': 160, 'EndDay': 280},
+                   'cell_area': 100.0}, f)
+    return str(path)
+
+
+def test_resume_matches_uninterrupted(grid_dir, tmp_path):
+    full = run_region(grid_dir, str(tmp_path / 'full'), tile_size=2, seed=3, progress=None)
+    out = tmp_path / 'resumed'
+    with pytest.raises(Interrupt):
+        run_region(grid_dir, str(out), tile_size=2, seed=3, progress=interrupt_after(4))
+    resumed = run_region(grid_dir, str(out), tile_size=2, seed=3, progress=None)
+    assert resumed['tiles'] == full['tiles'] - 4
+    for name in OUTPUTS:
+        np.testing.assert_array_equal(np.load(out / f"{name}.npy"), np.load(tmp_path / 'full' / f"{name}.npy"))
+        np.testing.assert_allclose(resumed['totals'][name], full['totals'][name], rtol=1e-12)
+    np.testing.assert_array_equal(resumed['totals']['Cells'], full['totals']['Cells'])
+    assert (out / REGIONS_FILE).read_text().splitlines()[0] == 'Region,Cells,E,Ebl,Ep'
+
+
+def test_totals_match_cells(grid_dir, tmp_path):
+    stats = run_region(grid_dir, str(tmp_path / 'out'), tile_size=3, seed=1, progress=None)
+    mask = np.load(f"{grid_dir}/mask.npy")
+    region = np.load(f"{grid_dir}/region.npy")
+    E = np.load(tmp_path / 'out' / 'E.npy')
+    assert np.isnan(E[~mask]).all() and not np.isnan(E[mask]).any()
+    np.testing.assert_array_equal(stats['totals']['Cells'], np.bincount(region[mask], minlength=3))
+    expected = np.bincount(region[mask], weights=E[mask].astype(float) * 100.0, minlength=3) / 1e6
+    np.testing.assert_allclose(stats['totals']['E'], expected, rtol=1e-6)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from ResultStore import FORMATS, has_parquet, open_result, open_writer, to_bytes, write_result
+
+
+def _chunks():
+    rng = np.random.default_rng(0)
+    return [{'Row': np.arange(lo, lo + n, dtype=np.int64), 'DAT': np.arange(n, dtype=np.int64) + 160,
+             'E': rng.random(n), 'Ep': rng.random(n).astype(np.float32)}
+            for lo, n in ((0, 5), (5, 1), (6, 12))]
+
+
+def _path(tmp_path, fmt):
+    return str(tmp_path / ('result' if fmt == 'npy' else f"result.{fmt}"))
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_chunked_round_trip(tmp_path, fmt):
+    if fmt == 'parquet' and not has_parquet():
+        pytest.skip("pyarrow is not installed")
+    chunks = _chunks()
+    path = _path(tmp_path, fmt)
+    with open_writer(path) as writer:
+        for chunk in chunks:
+            writer.append(chunk)
+    result = open_result(path)
+    assert result.columns == list(chunks[0])
+    for name in chunks[0]:
+        expected = np.concatenate([chunk[name] for chunk in chunks])
+        if fmt in ('txt', 'csv'):
+            # 文本格式读回为 float64，pandas 默认的浮点解析在最后一位上可能有舍入差异
+            np.testing.assert_allclose(result[name].astype(expected.dtype), expected, rtol=1e-14)
+        else:
+            np.testing.assert_array_equal(result[name], expected)
+            assert result[name].dtype == expected.dtype
+    frame = result.to_frame(['Row', 'E'])
+    assert list(frame.columns) == ['Row', 'E'] and len(frame) == 18
+
+
+def test_rewrite_replaces_previous_file(tmp_path):
+    for fmt in ('txt', 'npz'):
+        path = _path(tmp_path, fmt)
+        write_result(_chunks()[0], path)
+        write_result(_chunks()[1], path)
+        assert len(open_result(path)['Row']) == 1
+
+
+def test_mismatched_chunk_columns(tmp_path):
+    with open_writer(_path(tmp_path, 'npz')) as writer:
+        writer.append({'Row': np.arange(2), 'E': np.zeros(2)})
+        with pytest.raises(ValueError):
+            writer.append({'Row': np.arange(2)})
+
+
+@pytest.mark.parametrize('fmt', ['txt', 'csv', 'npz', 'parquet'])
+def test_to_bytes_matches_writer(tmp_path, fmt):
+    if fmt == 'parquet' and not has_parquet():
+        pytest.skip("pyarrow is not installed")
+    chunk = _chunks()[2]
+    path = _path(tmp_path, fmt)
+    with open(path, 'wb') as f:
+        f.write(to_bytes(chunk, fmt))
+    result = open_result(path)
+    for name in chunk:
+        np.testing.assert_allclose(result[name].astype(chunk[name].dtype), chunk[name],
+                                   rtol=1e-14 if fmt in ('txt', 'csv') else 0)
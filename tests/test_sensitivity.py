@@ -0,0 +1,40 @@
+import numpy as np
+from Sensitivity import FACTORS, morris_levels, morris_sample, run_morris, saltelli_sample, scale
+
+
+def test_default_morris_design_covers_every_regime():
+    # run_morris 的默认设计（levels=4）中每种水分模式都出现，且作为被改变的因子时也覆盖全部模式
+    names = list(FACTORS)
+    U, order = morris_sample(len(names), 100, morris_levels(FACTORS), seed=0)
+    regime = scale(U, FACTORS)['WaterRegime']
+    assert set(regime.tolist()) == {1, 2, 3, 4, 5}
+    j = names.index('WaterRegime')
+    X = U.reshape(100, len(names) + 1, len(names))
+    for r in range(100):
+        step = int(np.nonzero(order[r] == j)[0][0])
+        before, after = scale(X[r, step:step + 2], FACTORS)['WaterRegime']
+        assert before != after
+
+
+def test_morris_trajectories_change_one_factor_per_step():
+    levels = morris_levels(FACTORS)
+    U, order = morris_sample(len(FACTORS), 50, levels, seed=1)
+    X = U.reshape(50, len(FACTORS) + 1, len(FACTORS))
+    changed = np.abs(np.diff(X, axis=1)) > 0
+    assert (changed.sum(axis=2) == 1).all()
+    np.testing.assert_array_equal(changed.argmax(axis=2), order)
+    for j, n in enumerate(levels):
+        # 每个因子只取自己网格上的值
+        np.testing.assert_allclose(np.round(X[..., j] * (n - 1)), X[..., j] * (n - 1), atol=1e-12)
+
+
+def test_saltelli_design_covers_every_regime():
+    U = saltelli_sample(len(FACTORS), 256, seed=0)
+    counts = np.bincount(scale(U, FACTORS)['WaterRegime'], minlength=6)[1:]
+    assert (counts > 0.15 * len(U)).all()
+
+
+def test_run_morris_ranks_factors(tair):
+    result = run_morris(160, 280, tair[:121], trajectories=10, workers=1)
+    assert list(result.index) == list(FACTORS)
+    assert (result['mu_star'] >= 0).all() and result.loc['WaterRegime', 'mu_star'] > 0
@@ -0,0 +1,62 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+from CH4MOD import AGGREGATE_COLUMNS, CH4Flux_array
+from Service import make_server, post
+from conftest import BASE
+
+BODY = {'GrainYield': BASE['GY'], 'SoilSand': BASE['sand'], 'OMN': BASE['OMN'], 'OMS': BASE['OMS'],
+        'WaterRegime': 4, 'StartDay': 160, 'EndDay': 280}
+
+
+@pytest.fixture
+def url(tair):
+    server = make_server(port=0, tair=tair, seed=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server.batcher.close()
+
+
+def _expected(tair, body, **kwargs):
+    return CH4Flux_array(body['StartDay'], body['EndDay'], body['WaterRegime'], body['SoilSand'], tair, body['OMS'],
+                         body['OMN'], body['GrainYield'], **kwargs)
+
+
+def test_single_request(url, tair):
+    result = post(url + '/simulate', BODY)
+    assert list(result) == AGGREGATE_COLUMNS
+    expected = _expected(tair, BODY, aggregate=True)
+    for name in AGGREGATE_COLUMNS:
+        assert result[name] == pytest.approx(expected[name], rel=1e-12)
+
+
+def test_daily_columns(url, tair):
+    result = post(url + '/simulate', {**BODY, 'aggregate': False, 'columns': ['DAT', 'E']})
+    assert list(result) == ['DAT', 'E']
+    expected = _expected(tair, BODY)
+    np.testing.assert_allclose(result['E'], expected['E'], rtol=1e-12)
+    assert len(result['DAT']) == 121
+
+
+def test_list_request_is_batched(url, tair):
+    # 一次提交的列表进入同一批次（超过阈值时走 CH4Flux_batch），结果按提交顺序返回
+    bodies = [{**BODY, 'OMN': float(omn)} for omn in np.linspace(0, 3000, 100)]
+    results = post(url + '/simulate', bodies)
+    for body, result in zip(bodies, results):
+        assert result['E'] == pytest.approx(_expected(tair, body, aggregate=True)['E'], rel=1e-12)
+    with urllib.request.urlopen(url + '/metrics') as resp:
+        metrics = json.loads(resp.read())
+    assert metrics['requests'] == 100 and metrics['vectorized_batches'] >= 1 and metrics['batch_max'] > 1
+
+
+def test_bad_request(url):
+    with pytest.raises(urllib.error.HTTPError) as err:
+        post(url + '/simulate', {**BODY, 'WaterRegime': 9})
+    assert err.value.code == 400
+    assert 'WaterRegime' in json.loads(err.value.read())['error']
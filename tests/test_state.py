@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from CH4MOD import CH4_COLUMNS, CH4Flux_array, CH4State
+from conftest import BASE
+
+
+@pytest.mark.parametrize('ip', [2, 3])
+def test_state_resume_matches_uninterrupted(tair, tmp_path, ip):
+    # 前 50 天后保存状态，读回后继续；随机数由同一个 Generator 接着抽取
+    full = CH4Flux_array(160, 280, ip, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'],
+                         rng=np.random.default_rng(3))
+    rng = np.random.default_rng(3)
+    state = CH4State(160, 280, ip, BASE['sand'], BASE['OMS'], BASE['OMN'], BASE['GY'])
+    first = state.step(50, tair[:50], rng=rng)
+    first = {name: values.copy() for name, values in first.items()}
+    state.save(tmp_path / 'state.json')
+    state = CH4State.load(tmp_path / 'state.json')
+    rest = state.step(state.remaining, tair[50:121], rng=rng)
+    for name in CH4_COLUMNS:
+        np.testing.assert_allclose(np.concatenate([first[name], rest[name]]), full[name], rtol=1e-12,
+                                   err_msg=name)
+    agg = CH4Flux_array(160, 280, ip, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'],
+                        rng=np.random.default_rng(3), aggregate=True)
+    for name, value in state.aggregates().items():
+        assert value == pytest.approx(agg[name], rel=1e-12), name
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from BatchRun import simulate_rows
+from CH4MOD import CH4_COLUMNS, CH4Flux_array
+from conftest import BASE
+
+
+@pytest.mark.parametrize('ip', [2, 3])
+def test_generator_makes_runs_reproducible(tair, ip):
+    runs = [CH4Flux_array(160, 280, ip, BASE['sand'], tair, BASE['OMS'], BASE['OMN'], BASE['GY'],
+                          rng=np.random.default_rng(7)) for _ in range(2)]
+    for name in CH4_COLUMNS:
+        np.testing.assert_array_equal(runs[0][name], runs[1][name])
+
+
+def test_simulate_rows_thread_pool_matches_sequential(tair):
+    rng = np.random.default_rng(2)
+    n = 30
+    params = {'GrainYield': rng.uniform(3000, 9000, n), 'SoilSand': rng.uniform(5, 80, n),
+              'OMN': rng.uniform(0, 3000, n), 'OMS': rng.uniform(0, 3000, n),
+              'WaterRegime': rng.integers(1, 6, n), 'StartDay': np.full(n, 160),
+              'EndDay': 160 + rng.integers(80, 121, n)}
+    base = simulate_rows(params, tair, workers=1, chunk_size=7, seed=4)
+    threaded = simulate_rows(params, tair, workers=3, chunk_size=7, seed=4, executor='thread')
+    for name in base:
+        np.testing.assert_array_equal(base[name], threaded[name])